@@ -0,0 +1,435 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from typing import Callable
+
+from expression import (Binary, Call, CommaExpression, Grouping, Literal, Logical, NodePool,
+                        Ternary, Unary, Variable)
+from statement import (AssignmentStatement, Block, ExpressionStatement, FunctionDefinition,
+                       IfStmt, ReturnStmt, Statement, WhileStmt, children)
+from tok.buffer import TYPES
+
+MAGIC = b"APOC"
+VERSION = 3
+
+# magic, version, validation, source mtime in ns, source size, source hash
+SOURCE = struct.Struct("<4sBBQQ32s")
+# followed by the size and crc32 of the body
+BODY = struct.Struct("<QI")
+HEADER = struct.Struct(SOURCE.format + BODY.format[1:])
+VALIDATIONS = ("mtime", "hash")
+
+# Opcodes of the nodes. A node is written after its children, so that a
+# stack machine reads the tree back without recursing.
+(NONE, LITERAL, VARIABLE, BINARY, LOGICAL, UNARY, GROUPING, TERNARY, CALL, COMMA,
+ EXPRESSION_STMT, ASSIGNMENT, BLOCK, IF, WHILE, FUNCTION, RETURN) = range(17)
+
+# Tags of literal values
+NIL, TRUE, FALSE, INT, FLOAT, STR = range(6)
+
+FLOAT_STRUCT = struct.Struct("<d")
+
+
+def dump(statements: list[Statement]) -> bytes:
+    """Encodes statements, without any header"""
+    return Encoder().encode(statements)
+
+
+def load(data: bytes) -> list[Statement]:
+    """Decodes statements encoded by dump(), or raises ValueError"""
+    return Decoder(data).decode()
+
+
+def typecode(values) -> str:
+    """The smallest unsigned array typecode that holds all of values"""
+    largest = max(values, default=0)
+    return next(code for code in "BHIQ" if largest < 1 << 8 * array(code).itemsize)
+
+
+class Encoder:
+    """
+    Writes statements as a stream of opcodes, one byte per node, written
+    after the nodes of its children. The values of the nodes, such as
+    literals, operators and the number of statements in a block, go to a
+    separate stream of operands, with integers as unsigned LEB128 varints.
+
+    The offsets of the nodes and the names they bind or read are stored
+    column-wise ahead of the nodes, in the order the nodes read them, each in
+    an array of the smallest type that fits. Strings, names included, are
+    written once to a table at the start and referred to by index.
+    """
+
+    def __init__(self) -> None:
+        self.out = bytearray()
+        self.opcodes = bytearray()
+        self.strings: dict[str, int] = {}
+        self.offsets: list[int] = []
+        self.names: list[int] = []
+
+    def encode(self, statements: list[Statement]) -> bytes:
+        # (node, whether its children still have to be written)
+        pending = [(statement, True) for statement in reversed(statements)]
+
+        while pending:
+            node, children_pending = pending.pop()
+            if children_pending:
+                pending.append((node, False))
+                pending.extend((child, True) for child in reversed(children(node)))
+            else:
+                self.node(node)
+
+        operands, self.out = self.out, bytearray()
+
+        self.uint(len(self.strings))
+        for string in self.strings:
+            data = string.encode()
+            self.uint(len(data))
+            self.out += data
+
+        for column in (self.offsets, self.names):
+            self.uint(len(column))
+            column = array(typecode(column), column)
+            if sys.byteorder == "big":
+                column.byteswap()
+            self.out += column.typecode.encode()
+            self.out += column.tobytes()
+
+        self.uint(len(operands))
+        return bytes(self.out + operands + self.opcodes)
+
+    def node(self, node) -> None:
+        opcode = self.opcodes.append
+        match node:
+            case None: opcode(NONE)
+            case Literal(value):
+                opcode(LITERAL)
+                self.value(value)
+            case Variable(name):
+                opcode(VARIABLE)
+                self.names.append(self.string(name))
+            case Binary(_, operator, _):
+                opcode(BINARY)
+                self.uint(operator)
+            case Logical(_, operator, _):
+                opcode(LOGICAL)
+                self.uint(operator)
+            case Unary(operator, _):
+                opcode(UNARY)
+                self.uint(operator)
+            case Grouping(): opcode(GROUPING)
+            case Ternary(): opcode(TERNARY)
+            case Call(): opcode(CALL)
+            case CommaExpression(exprs):
+                opcode(COMMA)
+                self.uint(len(exprs))
+            case ExpressionStatement(): opcode(EXPRESSION_STMT)
+            case AssignmentStatement(name, _):
+                opcode(ASSIGNMENT)
+                self.names.append(self.string(name))
+            case Block(statements):
+                opcode(BLOCK)
+                self.uint(len(statements))
+            case IfStmt(): opcode(IF)
+            case WhileStmt(): opcode(WHILE)
+            case FunctionDefinition(name, params, _):
+                opcode(FUNCTION)
+                self.names.append(self.string(name))
+                self.uint(len(params))
+            case ReturnStmt(): opcode(RETURN)
+            case _:
+                raise TypeError(f"Cannot encode {type(node).__name__}")
+
+        if hasattr(node, "offset"):
+            # None is stored as 0
+            self.offsets.append(0 if node.offset is None else node.offset + 1)
+
+    def value(self, value) -> None:
+        # bools first, since they are ints
+        if value is None:
+            self.uint(NIL)
+        elif value is True:
+            self.uint(TRUE)
+        elif value is False:
+            self.uint(FALSE)
+        elif isinstance(value, int):
+            self.uint(INT)
+            # zigzag, so that small negative numbers stay small
+            self.uint(value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            self.uint(FLOAT)
+            self.out += FLOAT_STRUCT.pack(value)
+        elif isinstance(value, str):
+            self.uint(STR)
+            self.uint(self.string(value))
+        else:
+            raise TypeError(f"Cannot encode literal {value!r}")
+
+    def string(self, string: str) -> int:
+        return self.strings.setdefault(string, len(self.strings))
+
+    def uint(self, value: int) -> None:
+        out = self.out
+        while value > 0x7f:
+            out.append(value & 0x7f | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+class Decoder:
+    """
+    Reads back the statements written by an Encoder. Data that is truncated,
+    has bytes left over or otherwise was not written by an Encoder raises
+    ValueError.
+    """
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.pos = 0
+        self.strings: list[str] = []
+
+    def decode(self) -> list[Statement]:
+        try:
+            return self.statements()
+        except (IndexError, StopIteration, struct.error) as e:
+            raise ValueError(f"Truncated data at byte {self.pos}") from e
+
+    def statements(self) -> list[Statement]:
+        data = self.data
+        for _ in range(self.uint()):
+            size = self.uint()
+            self.strings.append(sys.intern(self.read(size).decode()))
+
+        offsets = iter([offset - 1 if offset else None for offset in self.column()])
+        strings = self.strings
+        names = iter([strings[index] for index in self.column()])
+        next_offset, next_name = offsets.__next__, names.__next__
+        operands = self.uint()
+        end = self.pos + operands
+        if end > len(data):
+            raise ValueError(f"Truncated data at byte {self.pos}")
+        opcodes = data[end:]
+
+        # the top level statements are what is left on the stack
+        stack = []
+        pop = stack.pop
+        literal = NodePool().literal
+
+        for opcode in opcodes:
+            if opcode == VARIABLE:
+                node = Variable(next_name(), next_offset())
+            elif opcode == LITERAL:
+                node = literal(self.value())
+            elif opcode == BINARY or opcode == LOGICAL:
+                right, left = pop(), pop()
+                node = (Binary if opcode == BINARY else Logical)(
+                    left, TYPES[self.uint()], right, next_offset())
+            elif opcode == NONE:
+                node = None
+            elif opcode == UNARY:
+                node = Unary(TYPES[self.uint()], pop(), next_offset())
+            elif opcode == GROUPING:
+                node = Grouping(pop())
+            elif opcode == TERNARY:
+                right, condition, left = pop(), pop(), pop()
+                node = Ternary(left, condition, right, next_offset())
+            elif opcode == CALL:
+                args, callee = pop(), pop()
+                node = Call(callee, args, next_offset())
+            elif opcode == COMMA:
+                node = CommaExpression(self.pop(stack, self.uint()))
+            elif opcode == EXPRESSION_STMT:
+                node = ExpressionStatement(pop())
+            elif opcode == ASSIGNMENT:
+                node = AssignmentStatement(next_name(), pop(), next_offset())
+            elif opcode == BLOCK:
+                node = Block(self.pop(stack, self.uint()))
+            elif opcode == IF:
+                else_block, elif_stmt, block, condition = pop(), pop(), pop(), pop()
+                node = IfStmt(condition, block, elif_stmt, else_block)
+            elif opcode == WHILE:
+                else_block, block, condition = pop(), pop(), pop()
+                node = WhileStmt(condition, block, else_block)
+            elif opcode == FUNCTION:
+                name, count = next_name(), self.uint()
+                block = pop()
+                node = FunctionDefinition(name, self.pop(stack, count), block, next_offset())
+            elif opcode == RETURN:
+                node = ReturnStmt(pop(), next_offset())
+            else:
+                raise ValueError(f"Unknown opcode {opcode}")
+
+            stack.append(node)
+
+        # every operand and column has to be read by the nodes that wrote them
+        if self.pos != end or next(offsets, stack) is not stack or next(names, stack) is not stack:
+            raise ValueError(f"Unread data at byte {self.pos}")
+
+        return stack
+
+    def read(self, size: int) -> bytes:
+        data = self.data[self.pos:self.pos + size]
+        if len(data) != size:
+            raise ValueError(f"Truncated data at byte {self.pos}")
+        self.pos += size
+        return data
+
+    def column(self) -> array:
+        count = self.uint()
+        column = array(chr(self.read(1)[0]))
+        column.frombytes(self.read(count * column.itemsize))
+        if sys.byteorder == "big":
+            column.byteswap()
+        return column
+
+    def pop(self, stack: list, count: int) -> list:
+        """Pops the last count nodes off stack, in order"""
+        if not count:
+            return []
+        nodes = stack[-count:]
+        del stack[-count:]
+        return nodes
+
+    def value(self):
+        tag = self.uint()
+        if tag == NIL:
+            return None
+        elif tag == TRUE:
+            return True
+        elif tag == FALSE:
+            return False
+        elif tag == INT:
+            value = self.uint()
+            return value >> 1 if not value & 1 else -(value >> 1) - 1
+        elif tag == FLOAT:
+            (value,) = FLOAT_STRUCT.unpack_from(self.data, self.pos)
+            self.pos += FLOAT_STRUCT.size
+            return value
+        elif tag == STR:
+            return self.strings[self.uint()]
+        raise ValueError(f"Unknown literal tag {tag}")
+
+    def uint(self) -> int:
+        data, pos = self.data, self.pos
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                self.pos = pos
+                return value
+            shift += 7
+
+
+class CompiledCache:
+    """
+    Compiled .apoc files of parsed scripts, so that unchanged scripts are
+    neither scanned nor parsed again.
+
+    A compiled file goes next to its script, or in directory if one is given,
+    under a name derived from the script's absolute path. It starts with a
+    header that records what it was compiled from: the modification time and
+    size of the script, which are cheap to check, or a hash of its source,
+    which also survives the script being touched or checked out again.
+
+    Attributes
+    ----------
+    hits : int
+        Number of scripts loaded from their compiled file
+    misses : int
+        Number of scripts that had to be parsed
+    """
+
+    def __init__(self, directory: str = None, validation: str = "mtime") -> None:
+        if validation not in VALIDATIONS:
+            raise ValueError(f"Unknown validation {validation!r}")
+        self.directory = directory
+        self.validation = validation
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, script: str) -> str:
+        if self.directory is None:
+            return os.path.splitext(script)[0] + ".apoc"
+        name = hashlib.sha256(os.path.abspath(script).encode()).hexdigest()[:32]
+        return os.path.join(self.directory, name + ".apoc")
+
+    def compile(self, script: str, parse: Callable[[], list[Statement]]) -> list[Statement]:
+        """
+        Returns the statements of script, loaded from its compiled file if it
+        is up to date, or else returned by parse() and compiled for next time.
+        """
+        # taken before parse() reads the script, so that a compiled file is
+        # never newer than what it was compiled from
+        header = self.header(script)
+        statements = self.load(script, header)
+
+        if statements is None:
+            self.misses += 1
+            statements = parse()
+            self.store(script, statements, header)
+        else:
+            self.hits += 1
+
+        return statements
+
+    def header(self, script: str) -> bytes:
+        """
+        The header of the compiled file of script as it is now, up to the
+        fields of the body
+        """
+        if self.validation == "hash":
+            with open(script, "rb") as f:
+                digest = hashlib.sha256(f.read()).digest()
+            mtime = size = 0
+        else:
+            stat = os.stat(script)
+            digest, mtime, size = bytes(32), stat.st_mtime_ns, stat.st_size
+        return SOURCE.pack(MAGIC, VERSION, VALIDATIONS.index(self.validation), mtime, size, digest)
+
+    def load(self, script: str, header: bytes) -> list[Statement] | None:
+        """
+        Returns the compiled statements of script if their header matches,
+        and their body is whole and decodes
+        """
+        try:
+            with open(self.path(script), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if len(data) < HEADER.size or data[:SOURCE.size] != header:
+            return None
+
+        size, checksum = BODY.unpack_from(data, SOURCE.size)
+        body = data[HEADER.size:]
+        if len(body) != size or zlib.crc32(body) != checksum:
+            return None
+
+        try:
+            return load(body)
+        except ValueError:
+            return None
+
+    def store(self, script: str, statements: list[Statement], header: bytes) -> str:
+        """Writes the compiled file of script, and returns its path"""
+        body = dump(statements)
+        data = header + BODY.pack(len(body), zlib.crc32(body)) + body
+        path = self.path(script)
+
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+        return path
@@ -0,0 +1,39 @@
+"""
+Benchmarks for the interpreter. Run them from the apollo directory, e.g.
+
+    python -m benchmarks.scanner
+"""
+import time
+
+
+PROGRAM = '''\
+x = 0
+total = 1.5
+name = "apollo"
+def step(a, b):
+    if a < b:
+        return a + b * 2
+    elif a == b:
+        return 0
+    else:
+        return (a - b) / 2
+while x < 10:
+    total = total + step(x, 5)
+    x = x + 1
+x >= 10 and total != None or "unreachable"
+'''
+
+
+def generate_program(size: int) -> str:
+    """Returns roughly size characters of apollo source."""
+    return PROGRAM * max(1, size // len(PROGRAM))
+
+
+def best_of(func, repeat: int = 3) -> float:
+    """Returns the fastest of repeat runs of func, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,51 @@
+"""
+Time to get the statements of a script by scanning and parsing it, and by
+loading them back from its compiled .apoc file.
+"""
+import argparse
+import os
+import pickle
+import tempfile
+
+from apoc import CompiledCache, dump
+from benchmarks import best_of, generate_program
+from parser import Parser
+from scanner import Scanner
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    ns = parser.parse_args()
+
+    code = generate_program(ns.size)
+    statements = Parser(Scanner(code, engine="regex").scan_tokens()).parse()
+    print(f"{len(code):,} characters, {len(dump(statements)):,} bytes compiled, "
+          f"{len(pickle.dumps(statements)):,} bytes pickled")
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, "script.apo")
+        with open(script, "w") as f:
+            f.write(code)
+        compiled = CompiledCache()
+        compiled.compile(script, lambda: statements)
+
+        def parse(engine):
+            with open(script) as f:
+                return Parser(Scanner(f.read(), engine=engine).scan_tokens()).parse()
+
+        timings = [
+            ("parse, char engine", lambda: parse("char")),
+            ("parse, regex engine", lambda: parse("regex")),
+            ("load .apoc", lambda: compiled.compile(script, None)),
+        ]
+        baseline = None
+        for name, func in timings:
+            elapsed = best_of(func, ns.repeat)
+            baseline = baseline or elapsed
+            print(f"{name:>20}: {elapsed:.3f}s ({baseline / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Time to run loop-heavy and call-heavy programs with each interpreter
+backend, parsing excluded. The loop runs on globals, and again on the locals
+of a function.
+"""
+import argparse
+from parser import Parser
+
+from closures import ClosureInterpreter
+from interpreter import Interpreter
+from scanner import Scanner
+from transpiler import PythonInterpreter
+from vm import VM
+
+from benchmarks import best_of
+
+LOOP = """\
+i = 0
+total = 0
+while i < {n}:
+    if i / 2 > 10 and i != 7:
+        total = total + i * 2
+    else:
+        total = total - 1
+    i = i + 1
+"""
+
+LOCALS = """\
+def run():
+    i = 0
+    total = 0
+    while i < {n}:
+        if i / 2 > 10 and i != 7:
+            total = total + i * 2
+        else:
+            total = total - 1
+        i = i + 1
+run()
+"""
+
+CALLS = """\
+def add(a, b):
+    return a + b
+def step(x):
+    return add(x, 1) if x > 0 else add(x, 2)
+i = 0
+while i < {n}:
+    i = step(i)
+"""
+
+BACKENDS = {"tree": Interpreter, "vm": VM, "closure": ClosureInterpreter,
+            "python": PythonInterpreter}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100_000)
+    ns = parser.parse_args()
+
+    for name, program in (("loop", LOOP), ("locals", LOCALS), ("calls", CALLS)):
+        statements = Parser(Scanner(program.format(n=ns.iterations)).scan_tokens()).parse()
+        timings = {backend: best_of(lambda: cls().interpret(statements))
+                   for backend, cls in BACKENDS.items()}
+        print(f"{name}, {ns.iterations:,} iterations:")
+        for backend, timing in timings.items():
+            print(f"  {backend:>6}: {timing * 1000:8.1f} ms  ({timings['tree'] / timing:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Time to run a program whose functions mostly call builtins, with each
+interpreter backend, and the cost of reading a builtin through the globals
+of an Environment, against scopes that raise and catch an exception at each
+level they miss.
+"""
+import argparse
+from parser import Parser
+
+from environment import Environment, global_env
+from exc import NameNotFoundException
+from scanner import Scanner
+
+from benchmarks import best_of
+from benchmarks.backends import BACKENDS
+
+PROGRAM = """\
+def check(word, n):
+    len(word)
+    abs(n)
+    max(n, 1)
+    str(n)
+    return n + 1
+i = 0
+while i < {n}:
+    i = check('apollo', i)
+"""
+# builtins called by each iteration of PROGRAM
+BUILTINS_PER_ITERATION = 4
+
+
+class RaisingEnvironment(Environment):
+    """Looks names up in the enclosing scope once a miss raised and was caught"""
+
+    def __getitem__(self, key):
+        try:
+            return super().__getitem__(key)
+        except NameNotFoundException:
+            if self.enclosing:
+                return self.enclosing.__getitem__(key)
+            raise
+
+    def __missing__(self, key):
+        raise NameNotFoundException(f"name '{key}' is not defined")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100_000)
+    ns = parser.parse_args()
+
+    statements = Parser(Scanner(PROGRAM.format(n=ns.iterations)).scan_tokens()).parse()
+    print(f"builtin calls, {ns.iterations:,} iterations:")
+    for backend, cls in BACKENDS.items():
+        seconds = best_of(lambda: cls().interpret(statements))
+        print(f"  {backend:>6}: {seconds * 1000:8.1f} ms  "
+              f"({ns.iterations * BUILTINS_PER_ITERATION / seconds:>12,.0f} builtins/s)")
+
+    probing = global_env()
+    raising = RaisingEnvironment(enclosing=RaisingEnvironment())
+    raising.enclosing.update(probing.enclosing)
+    keys = ["len"] * 1_000_000
+
+    def lookup(env):
+        for key in keys:
+            env[key]
+
+    baseline = best_of(lambda: lookup(raising))
+    seconds = best_of(lambda: lookup(probing))
+    print(f"builtin lookups: {len(keys) / baseline:>12,.0f}/s raising, "
+          f"{len(keys) / seconds:,.0f}/s probing ({baseline / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Time to the first statement of a script that defines many functions and
+calls one of them, with function bodies parsed eagerly and lazily.
+"""
+import argparse
+import time
+
+from interpreter import Interpreter
+from parser import Parser
+from scanner import Scanner
+
+FUNCTION = '''\
+def f{index}(a, b):
+    total = 0
+    while a < b:
+        if a == b - 1:
+            total = total + a * 2
+        elif a > 100:
+            total = total - (a - b) / 2
+        else:
+            total = total + 1
+        a = a + 1
+    return total
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--functions", type=int, default=2000)
+    ns = parser.parse_args()
+
+    code = "".join(FUNCTION.format(index=index) for index in range(ns.functions))
+    code += "x = f0(0, 10)\n"
+    tokens = Scanner(code, engine="regex").scan_tokens()
+    print(f"{ns.functions:,} functions, {len(tokens):,} tokens")
+
+    baseline = None
+    for lazy in (False, True):
+        start = time.perf_counter()
+        statements = Parser(tokens, lazy=lazy).parse()
+        parsed = time.perf_counter() - start
+        Interpreter().interpret(statements)
+        run = time.perf_counter() - start
+
+        baseline = baseline or parsed
+        print(f"{'lazy' if lazy else 'eager':>5}: first statement after {parsed * 1000:7.1f} ms "
+              f"({baseline / parsed:.1f}x), done after {run * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Time to the first parsed statement and peak RSS when a large script is read
+into a str versus memory-mapped and scanned as bytes.
+
+Every measurement runs in a fresh process so that RSS is not shared.
+"""
+import argparse
+import mmap
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from parser import Parser
+
+from scanner import Scanner
+
+from benchmarks import generate_program
+
+MODES = ("read", "mmap")
+
+
+def first_statement(filename: str, mode: str):
+    start = time.perf_counter()
+
+    with open(filename, "rb" if mode == "mmap" else "r") as f:
+        if mode == "mmap":
+            code = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            code = f.read()
+
+    parser = Parser(Scanner(code, engine="regex").iter_tokens())
+    parser.statement()
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(elapsed, rss)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=500_000_000, help="script size in bytes")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "FILE"), help=argparse.SUPPRESS)
+    ns = parser.parse_args()
+
+    if ns.child:
+        return first_statement(ns.child[1], ns.child[0])
+
+    with tempfile.NamedTemporaryFile("w", suffix=".apo", delete=False) as f:
+        chunk = generate_program(1_000_000)
+        for _ in range(max(1, ns.size // len(chunk))):
+            f.write(chunk)
+
+    try:
+        print(f"{os.path.getsize(f.name):,} bytes")
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.mmap", "--child", mode, f.name],
+                capture_output=True, text=True, check=True,
+            ).stdout.split()
+            elapsed, rss = float(out[0]), int(out[1])
+            print(f"{mode:>5}: first statement after {elapsed * 1000:8.1f} ms, "
+                  f"peak RSS {rss / 2**20:8.1f} MiB")
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Name lookups per second in a name-heavy loop, and the cost of an Environment
+lookup by an interned key versus an equal string that is not interned.
+"""
+import argparse
+
+from interpreter import Interpreter
+from parser import Parser
+from scanner import Scanner
+
+from benchmarks import best_of
+
+LOOP = '''\
+index = 0
+running_total = 0
+previous_value = 0
+while index < {iterations}:
+    current_value = index + previous_value
+    running_total = running_total + current_value - previous_value
+    previous_value = current_value - running_total + running_total
+    index = index + 1
+'''
+# variables read and written by one iteration of LOOP
+NAMES_PER_ITERATION = 16
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100_000)
+    ns = parser.parse_args()
+
+    statements = Parser(Scanner(LOOP.format(iterations=ns.iterations)).scan_tokens()).parse()
+    seconds = best_of(lambda: Interpreter().interpret(statements))
+    print(f"loop: {ns.iterations * NAMES_PER_ITERATION / seconds:>12,.0f} names/s")
+
+    env = Interpreter().env
+    env["running_total"] = 0
+    interned = ["running_total"] * 1_000_000
+    # equal strings that are distinct objects, as sliced out of a source
+    copies = ["".join(["running", "_total"]) for _ in range(1_000_000)]
+
+    def lookup(keys):
+        for key in keys:
+            env[key]
+
+    baseline = best_of(lambda: lookup(copies))
+    seconds = best_of(lambda: lookup(interned))
+    print(f"lookups: {len(copies) / baseline:>12,.0f}/s not interned, "
+          f"{len(interned) / seconds:,.0f}/s interned ({baseline / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Memory held by the statements of a large program once its tokens are freed,
+per node, with tokens scanned into a list and into a TokenBuffer, and with
+equal expressions shared.
+"""
+import argparse
+import gc
+import tracemalloc
+from parser import Parser
+
+from scanner import Scanner
+from statement import walk
+
+from benchmarks import generate_program
+
+
+def retained(code: str, buffer: bool, share: bool = False) -> tuple[int, int, int]:
+    gc.collect()
+    tracemalloc.start()
+    scanner = Scanner(code, engine="regex")
+    tokens = scanner.scan_buffer() if buffer else scanner.scan_tokens()
+    statements = Parser(tokens, share=share).parse()
+    # only the statements are left
+    del scanner, tokens
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    nodes = [node for statement in statements for node in walk(statement)]
+    return size, len(nodes), len(set(map(id, nodes)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000, help="source size in characters")
+    ns = parser.parse_args()
+
+    code = generate_program(ns.size)
+    print(f"{len(code):,} characters")
+
+    for name, buffer, share in (("list", False, False), ("buffer", True, False),
+                                ("shared", False, True)):
+        size, nodes, distinct = retained(code, buffer, share)
+        print(f"{name:>6}: {nodes:,} nodes, {distinct:,} distinct, in {size / 2**20:6.1f} MiB, "
+              f"{size / nodes:5.0f} bytes per node")
+
+
+if __name__ == "__main__":
+    main()
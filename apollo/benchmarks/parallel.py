@@ -0,0 +1,29 @@
+"""Scaling of Scanner.scan_parallel with the number of worker processes."""
+import argparse
+import os
+
+from scanner import Scanner
+
+from benchmarks import best_of, generate_program
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=32_000_000, help="source size in characters")
+    ns = parser.parse_args()
+
+    code = generate_program(ns.size)
+    print(f"{len(code):,} characters")
+
+    sequential = best_of(lambda: Scanner(code).scan_buffer(), repeat=1)
+    print(f"sequential: {sequential:6.2f} s")
+
+    workers = 1
+    while workers <= os.cpu_count():
+        seconds = best_of(lambda: Scanner(code).scan_parallel(workers), repeat=1)
+        print(f"{workers:>3} workers: {seconds:6.2f} s  ({sequential / seconds:.1f}x)")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
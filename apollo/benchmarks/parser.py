@@ -0,0 +1,34 @@
+"""Tokens per second parsed, on the sample program and on expression-heavy code."""
+import argparse
+
+from parser import Parser
+from scanner import Scanner
+
+from benchmarks import best_of, generate_program
+
+EXPRESSIONS = '''\
+total = a * 2 + b / 4 - (c - 1) * -d
+a < b and b >= c or c == None
+pick = a + 1 if a > b else b - 1
+f(a + b, c * d, -e)
+x = 1
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000, help="source size in characters")
+    ns = parser.parse_args()
+
+    sources = {
+        "program": generate_program(ns.size),
+        "expressions": EXPRESSIONS * max(1, ns.size // len(EXPRESSIONS)),
+    }
+    for name, code in sources.items():
+        tokens = Scanner(code, engine="regex").scan_tokens()
+        seconds = best_of(lambda: Parser(tokens).parse())
+        print(f"{name:>12}: {len(tokens) / seconds:>12,.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    main()
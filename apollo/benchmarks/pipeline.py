@@ -0,0 +1,61 @@
+"""
+Time to the first executed statement, total time and peak memory of running
+a large script parsed whole first, and pipelined one statement at a time.
+"""
+import argparse
+import time
+import tracemalloc
+from parser import Parser
+
+from interpreter import Interpreter
+from scanner import Scanner
+
+from benchmarks import generate_program
+
+
+def run(code: str, pipeline: bool) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+
+    def timed(statements):
+        nonlocal first
+        for statement in statements:
+            first = first or time.perf_counter() - start
+            yield statement
+
+    scanner = Scanner(code, engine="regex")
+    if pipeline:
+        statements = Parser(scanner.iter_tokens()).iter_parse()
+    else:
+        statements = Parser(scanner.scan_tokens()).parse()
+    Interpreter().interpret(timed(statements), keep=not pipeline)
+
+    return first, time.perf_counter() - start
+
+
+def peak_memory(code: str, pipeline: bool) -> int:
+    # measured apart, since tracing slows everything down
+    tracemalloc.start()
+    run(code, pipeline)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000, help="source size in characters")
+    ns = parser.parse_args()
+
+    code = generate_program(ns.size)
+    print(f"{len(code):,} characters")
+
+    for pipeline in (False, True):
+        first, total = run(code, pipeline)
+        peak = peak_memory(code, pipeline)
+        print(f"{'pipeline' if pipeline else 'whole':>8}: first statement after {first * 1000:8.2f} ms, "
+              f"done after {total:.2f} s, {peak / 2**20:8.1f} MiB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Cost of a one character edit with IncrementalLexer versus a full rescan."""
+import argparse
+
+from incremental import IncrementalLexer
+from scanner import Scanner
+
+from benchmarks import best_of, generate_program
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000, help="source size in characters")
+    ns = parser.parse_args()
+
+    code = generate_program(ns.size)
+    lexer = IncrementalLexer(code)
+    middle = code.index("x = x + 1", len(code) // 2) + len("x = x + ")
+    print(f"{len(code):,} characters, {len(lexer.tokens):,} tokens")
+
+    full = best_of(lambda: Scanner(code, engine="regex").scan_tokens())
+    # the same line is edited back and forth, once without changing the number of lines
+    same = best_of(lambda: (lexer.edit(middle, 1, "2"), lexer.edit(middle, 1, "1"))) / 2
+    lines = best_of(lambda: (lexer.edit(middle, 0, "\n"), lexer.edit(middle, 1, ""))) / 2
+
+    print(f"full rescan:            {full * 1000:8.2f} ms")
+    print(f"edit:                   {same * 1000:8.2f} ms  ({full / same:.0f}x)")
+    print(f"edit adding a line:     {lines * 1000:8.2f} ms  ({full / lines:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Cost of editing one function of a large script with IncrementalParser
+versus scanning and parsing the whole script again.
+"""
+import argparse
+
+from incremental import IncrementalParser
+from parser import Parser
+from scanner import Scanner
+
+from benchmarks import best_of
+from benchmarks.lazy import FUNCTION
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--functions", type=int, default=2000)
+    ns = parser.parse_args()
+
+    code = "".join(FUNCTION.format(index=index) for index in range(ns.functions))
+    incremental = IncrementalParser(code)
+    middle = code.index("total + 1", len(code) // 2) + len("total + ")
+    print(f"{code.count(chr(10)):,} lines, {len(incremental.statements):,} statements")
+
+    full = best_of(lambda: Parser(Scanner(code, engine="regex").scan_tokens()).parse())
+    before = list(incremental.statements)
+    edit = best_of(lambda: (incremental.edit(middle, 1, "2"), incremental.edit(middle, 1, "1"))) / 2
+    reused = sum(new is old for new, old in zip(incremental.statements, before))
+    # moves every token and statement after the edit, once they are read
+    line = "\n            total = 0"
+    lines = best_of(lambda: (incremental.edit(middle + 1, 0, line),
+                             incremental.edit(middle + 1, len(line), ""))) / 2
+
+    print(f"full scan and parse:    {full * 1000:8.2f} ms")
+    print(f"edit:                   {edit * 1000:8.2f} ms  ({full / edit:.0f}x), "
+          f"{reused:,} statements reused")
+    print(f"edit adding a line:     {lines * 1000:8.2f} ms  ({full / lines:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""Tokens per second of each Scanner engine on a large generated source."""
+import argparse
+
+from scanner import Scanner
+
+from benchmarks import best_of, generate_program
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=4_000_000, help="source size in characters")
+    ns = parser.parse_args()
+
+    code = generate_program(ns.size)
+    count = len(Scanner(code, engine="regex").scan_tokens())
+    print(f"{len(code):,} characters, {count:,} tokens")
+
+    baseline = None
+    for engine in Scanner.ENGINES:
+        seconds = best_of(lambda: Scanner(code, engine=engine).scan_tokens())
+        baseline = baseline or seconds
+        print(f"{engine:>6}: {count / seconds:>12,.0f} tokens/s  ({baseline / seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
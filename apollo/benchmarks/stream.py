@@ -0,0 +1,34 @@
+"""Peak memory of parsing a large source with and without the token stream."""
+import argparse
+import tracemalloc
+from parser import Parser
+
+from scanner import Scanner
+
+from benchmarks import generate_program
+
+
+def peak_memory(code: str, stream: bool) -> int:
+    tracemalloc.start()
+    scanner = Scanner(code, engine="regex")
+    Parser(scanner.iter_tokens() if stream else scanner.scan_tokens()).parse()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000, help="source size in characters")
+    ns = parser.parse_args()
+
+    code = generate_program(ns.size)
+    print(f"{len(code):,} characters")
+
+    for stream in (False, True):
+        peak = peak_memory(code, stream)
+        print(f"{'stream' if stream else 'list':>6}: {peak / 2**20:8.1f} MiB peak")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Cost of building, updating and querying a SymbolIndex over a directory of
+many scripts.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from symbols import SymbolIndex
+
+from benchmarks import PROGRAM, best_of
+
+SCRIPT = PROGRAM.replace("step", "step{index}") + "print(step{index}(1, 2))\n"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    ns = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for index in range(ns.files):
+            with open(os.path.join(directory, f"script{index}.apo"), "w") as f:
+                f.write(SCRIPT.format(index=index))
+
+        start = time.perf_counter()
+        index = SymbolIndex(directory)
+        index.update()
+        build = time.perf_counter() - start
+        size = os.path.getsize(index.path)
+        print(f"{ns.files:,} files, {len(index):,} symbols, "
+              f"index of {size:,} bytes ({size / len(index):.1f} per symbol)")
+
+        unchanged = best_of(lambda: SymbolIndex(directory).update())
+        changed = os.path.join(directory, f"script{ns.files // 2}.apo")
+
+        def edit():
+            with open(changed, "a") as f:
+                f.write("y = 1\n")
+            SymbolIndex(directory).update()
+
+        edited = best_of(edit)
+        load = best_of(lambda: SymbolIndex(directory))
+        cold = best_of(lambda: SymbolIndex(directory).lookup(f"step{ns.files // 2}"))
+        name = f"step{ns.files - 1}"
+        warm = best_of(lambda: [index.lookup(name) for _ in range(1000)]) / 1000
+        common = best_of(lambda: index.lookup("total"))
+
+    print(f"full index:               {build * 1000:8.2f} ms")
+    print(f"update, nothing changed:  {unchanged * 1000:8.2f} ms")
+    print(f"update, one file changed: {edited * 1000:8.2f} ms")
+    print(f"load:                     {load * 1000:8.2f} ms")
+    print(f"load and lookup:          {cold * 1000:8.2f} ms")
+    print(f"lookup:                   {warm * 1000:8.3f} ms")
+    print(f"lookup of {len(index.lookup('total')):,} symbols: "
+          f"{common * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Bytes per token of a list of Tokens versus a TokenBuffer."""
+import argparse
+import tracemalloc
+
+from scanner import Scanner
+
+from benchmarks import PROGRAM, generate_program
+
+
+def retained(scan) -> tuple[int, int]:
+    """Returns the number of tokens scanned and the memory they hold on to"""
+    tracemalloc.start()
+    tokens = scan()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(tokens), size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=1_000_000)
+    ns = parser.parse_args()
+
+    per_program = len(Scanner(PROGRAM, engine="regex").scan_tokens())
+    code = generate_program(len(PROGRAM) * ns.tokens // per_program)
+
+    for name, scan in (
+        ("list", lambda: Scanner(code, engine="regex").scan_tokens()),
+        ("buffer", lambda: Scanner(code).scan_buffer()),
+    ):
+        count, size = retained(scan)
+        print(f"{name:>6}: {count:,} tokens, {size / 2**20:7.1f} MiB, {size / count:6.1f} bytes/token")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+from expression import (Binary, Call, CommaExpression, Expression, Grouping, Literal, Logical,
+                        Ternary, Unary, Variable)
+from resolver import resolve
+from statement import (AssignmentStatement, Block, ExpressionStatement, FunctionDefinition,
+                       IfStmt, ReturnStmt, Statement, WhileStmt)
+from tok.type import TokenType as tt
+
+# Opcodes, each followed by a single operand, 0 when it has none
+(LOAD_CONST, LOAD_NAME, STORE_NAME, LOAD_LOCAL, STORE_LOCAL, LOAD_OUTER, POP_TOP,
+ ADD, SUBTRACT, MULTIPLY, DIVIDE, LESS, LESS_EQUAL, GREATER, GREATER_EQUAL, EQUAL, NOT_EQUAL,
+ NEGATIVE, NOT, BUILD_LIST,
+ JUMP, POP_JUMP_IF_FALSE, JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP,
+ MAKE_FUNCTION, CALL, RETURN, RAISE_RETURN) = range(28)
+
+OPNAMES = ("LOAD_CONST", "LOAD_NAME", "STORE_NAME", "LOAD_LOCAL", "STORE_LOCAL", "LOAD_OUTER",
+           "POP_TOP",
+           "ADD", "SUBTRACT", "MULTIPLY", "DIVIDE", "LESS", "LESS_EQUAL", "GREATER",
+           "GREATER_EQUAL", "EQUAL", "NOT_EQUAL",
+           "NEGATIVE", "NOT", "BUILD_LIST",
+           "JUMP", "POP_JUMP_IF_FALSE", "JUMP_IF_FALSE_OR_POP", "JUMP_IF_TRUE_OR_POP",
+           "MAKE_FUNCTION", "CALL", "RETURN", "RAISE_RETURN")
+
+BINARY = {
+    tt.PLUS: ADD, tt.MINUS: SUBTRACT, tt.STAR: MULTIPLY, tt.SLASH: DIVIDE,
+    tt.LESSER: LESS, tt.LEQUAL: LESS_EQUAL, tt.GREATER: GREATER, tt.GEQUAL: GREATER_EQUAL,
+    tt.EQUAL: EQUAL, tt.NEQUAL: NOT_EQUAL,
+}
+UNARY = {tt.MINUS: NEGATIVE, tt.NOT: NOT}
+
+
+class Code:
+    """
+    Compiled statements: a flat list of instructions, each an opcode followed
+    by its operand, and the tables of constants and names that operands refer
+    to. Binary operators keep their source offset and operator, and calls the
+    offset of their ')', by the index of their instruction, to report errors.
+
+    The code of a function has the names of its local slots, and the depth,
+    slot and name of the locals of enclosing functions it reads.
+    """
+
+    __slots__ = ("name", "instructions", "constants", "names", "locals", "outers",
+                 "operators", "calls")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.instructions: list[int] = []
+        self.constants: list = []
+        self.names: list[str] = []
+        self.locals: list[str] = []
+        self.outers: list[tuple[int, int, str]] = []
+        self.operators: dict[int, tuple[tt, int | None]] = {}
+        self.calls: dict[int, int | None] = {}
+
+    def __repr__(self) -> str:
+        return f"<code {self.name}, {len(self.instructions) // 2} instructions>"
+
+
+class Prototype:
+    """
+    An apollo function compiled to bytecode, a constant of the code that
+    defines it, from which MAKE_FUNCTION makes functions. Its body is only
+    compiled the first time it is called, so that lazy bodies stay unparsed
+    until then.
+    """
+
+    __slots__ = ("definition", "_code")
+
+    def __init__(self, definition: FunctionDefinition) -> None:
+        self.definition = definition
+        self._code = None
+
+    @property
+    def code(self) -> Code:
+        if self._code is None:
+            self._code = Compiler(self.definition.name, function=True).body(self.definition)
+        return self._code
+
+    @property
+    def params(self) -> list[str]:
+        return [param.name for param in self.definition.params]
+
+    def __repr__(self) -> str:
+        return f"<prototype {self.definition.name}>"
+
+
+def compile_statement(statement: Statement) -> Code:
+    """Compiles a top-level statement, whose code returns its result"""
+    return Compiler("<statement>").statement(statement)
+
+
+def compile_expression(expr: Expression) -> Code:
+    """Compiles an expression, whose code returns its value"""
+    compiler = Compiler("<expression>")
+    compiler.expression(expr)
+    compiler.emit(RETURN)
+    return compiler.code
+
+
+def disassemble(code: Code) -> str:
+    """The instructions of code, one per line, with what their operand refers to"""
+    lines = []
+    instructions = code.instructions
+    for index in range(0, len(instructions), 2):
+        op, arg = instructions[index], instructions[index + 1]
+        if op in (LOAD_CONST, MAKE_FUNCTION):
+            detail = f" ({code.constants[arg]!r})"
+        elif op in (LOAD_NAME, STORE_NAME):
+            detail = f" ({code.names[arg]})"
+        elif op in (LOAD_LOCAL, STORE_LOCAL):
+            detail = f" ({code.locals[arg]})"
+        elif op == LOAD_OUTER:
+            detail = f" ({code.outers[arg][2]})"
+        else:
+            detail = ""
+        lines.append(f"{index:4} {OPNAMES[op]:<20} {arg}{detail}")
+    return "\n".join(lines)
+
+
+class Compiler:
+    """
+    Turns statements into a Code. A function body ends with a RETURN of None,
+    and its return statements RETURN their value. At the top level, a return
+    statement raises a ReturnException instead, as in the tree walker.
+    """
+
+    def __init__(self, name: str, function: bool = False) -> None:
+        self.code = Code(name)
+        self.function = function
+        self.constants: dict[tuple[type, object], int] = {}
+        self.names: dict[str, int] = {}
+        self.outers: dict[tuple[int, int], int] = {}
+
+    def statement(self, statement: Statement) -> Code:
+        match statement:
+            case ExpressionStatement(expr):
+                self.expression(expr)
+            case _:
+                self.execute(statement)
+                self.emit(LOAD_CONST, self.constant(None))
+        self.emit(RETURN)
+        return self.code
+
+    def body(self, definition: FunctionDefinition) -> Code:
+        self.code.locals = resolve(definition).names
+        self.execute(definition.block)
+        self.emit(LOAD_CONST, self.constant(None))
+        self.emit(RETURN)
+        return self.code
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        """Appends an instruction and returns its index"""
+        instructions = self.code.instructions
+        instructions += (op, arg)
+        return len(instructions) - 2
+
+    def patch(self, index: int) -> None:
+        """Points the jump at index to the next instruction"""
+        self.code.instructions[index + 1] = len(self.code.instructions)
+
+    def constant(self, value) -> int:
+        # keyed on the type too, as 1, 1.0 and True are equal
+        key = (type(value), value) if not isinstance(value, Prototype) else (Prototype, id(value))
+        index = self.constants.get(key)
+        if index is None:
+            index = self.constants[key] = len(self.code.constants)
+            self.code.constants.append(value)
+        return index
+
+    def name(self, name: str) -> int:
+        index = self.names.get(name)
+        if index is None:
+            index = self.names[name] = len(self.code.names)
+            self.code.names.append(name)
+        return index
+
+    def outer(self, variable: Variable) -> int:
+        key = (variable.depth, variable.slot)
+        index = self.outers.get(key)
+        if index is None:
+            index = self.outers[key] = len(self.code.outers)
+            self.code.outers.append((*key, variable.name))
+        return index
+
+    def store(self, name: str, slot: int | None) -> None:
+        if slot is None:
+            self.emit(STORE_NAME, self.name(name))
+        else:
+            self.emit(STORE_LOCAL, slot)
+
+    def execute(self, statement: Statement) -> None:
+
+        match statement:
+            case ExpressionStatement(expr):
+                self.expression(expr)
+                self.emit(POP_TOP)
+            case AssignmentStatement(name, expr):
+                self.expression(expr)
+                self.store(name, statement.slot)
+            case IfStmt(condition, block, elif_stmt, else_block):
+                self.expression(condition)
+                skip = self.emit(POP_JUMP_IF_FALSE)
+                self.execute(block)
+                if elif_stmt or else_block:
+                    end = self.emit(JUMP)
+                    self.patch(skip)
+                    self.execute(elif_stmt if elif_stmt else else_block)
+                    self.patch(end)
+                else:
+                    self.patch(skip)
+            case Block(statements):
+                for stmt in statements:
+                    self.execute(stmt)
+            case WhileStmt(condition, block, else_block):
+                start = len(self.code.instructions)
+                self.expression(condition)
+                end = self.emit(POP_JUMP_IF_FALSE)
+                self.execute(block)
+                self.emit(JUMP, start)
+                self.patch(end)
+                if else_block:
+                    self.execute(else_block)
+            case FunctionDefinition(name) as func_def:
+                self.emit(MAKE_FUNCTION, self.constant(Prototype(func_def)))
+                self.store(name, func_def.slot)
+            case ReturnStmt(value):
+                if value:
+                    self.expression(value)
+                else:
+                    self.emit(LOAD_CONST, self.constant(None))
+                self.emit(RETURN if self.function else RAISE_RETURN)
+
+    def expression(self, expr: Expression) -> None:
+
+        match expr:
+            case Literal(value):
+                self.emit(LOAD_CONST, self.constant(value))
+            case Variable(name):
+                if expr.slot is None:
+                    self.emit(LOAD_NAME, self.name(name))
+                elif expr.depth == 0:
+                    self.emit(LOAD_LOCAL, expr.slot)
+                else:
+                    self.emit(LOAD_OUTER, self.outer(expr))
+            case Binary(left, operator, right):
+                self.expression(left)
+                self.expression(right)
+                op = BINARY.get(operator)
+                if op is None:
+                    self.emit(POP_TOP)
+                    self.emit(POP_TOP)
+                    self.emit(LOAD_CONST, self.constant(None))
+                else:
+                    self.code.operators[self.emit(op)] = (operator, expr.offset)
+            case Logical(left, operator, right):
+                self.expression(left)
+                if operator == tt.AND or operator == tt.OR:
+                    end = self.emit(JUMP_IF_FALSE_OR_POP if operator == tt.AND else JUMP_IF_TRUE_OR_POP)
+                    self.expression(right)
+                    self.patch(end)
+                else:
+                    self.emit(POP_TOP)
+                    self.expression(right)
+            case Unary(operator, right):
+                self.expression(right)
+                op = UNARY.get(operator)
+                if op is None:
+                    self.emit(POP_TOP)
+                    self.emit(LOAD_CONST, self.constant(None))
+                else:
+                    self.emit(op)
+            case Grouping(expression):
+                self.expression(expression)
+            case Ternary(left, condition, right):
+                self.expression(condition)
+                other = self.emit(POP_JUMP_IF_FALSE)
+                self.expression(left)
+                end = self.emit(JUMP)
+                self.patch(other)
+                self.expression(right)
+                self.patch(end)
+            case CommaExpression(expressions):
+                for e in expressions:
+                    self.expression(e)
+                self.emit(BUILD_LIST, len(expressions))
+            case Call(callee, args):
+                self.expression(callee)
+                if args is None:
+                    count = 0
+                elif isinstance(args, CommaExpression):
+                    for arg in args.expressions:
+                        self.expression(arg)
+                    count = len(args.expressions)
+                else:
+                    self.expression(args)
+                    count = 1
+                self.code.calls[self.emit(CALL, count)] = expr.offset
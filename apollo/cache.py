@@ -0,0 +1,147 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+
+from scanner import Scanner
+from tok import TokenBuffer
+
+MAGIC = b"APTK"
+VERSION = 2
+
+# magic, version, little endian flag, offset typecode, number of tokens
+HEADER = struct.Struct("<4sBB1sQ")
+
+
+class TokenCache:
+    """
+    A directory of scanned token streams, keyed by a hash of their source.
+
+    Each entry holds the columns of a TokenBuffer, but not the source, which
+    the caller has anyway. Entries are written to a temporary file and then
+    renamed, so concurrent processes only ever see whole entries. Reading an
+    entry bumps its modification time, and the least recently used entries
+    are removed once the directory holds more than max_bytes.
+
+    Attributes
+    ----------
+    hits : int
+        Number of sources whose tokens were loaded from the cache
+    misses : int
+        Number of sources that had to be scanned
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 2**20) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def scan(self, code: str | bytes, engine: str = None) -> TokenBuffer:
+        """Returns the tokens of code, from the cache if possible"""
+        key = self.key(code, engine)
+        buffer = self.load(key, code)
+
+        if buffer is None:
+            self.misses += 1
+            buffer = Scanner(code, engine=engine).scan_buffer()
+            self.store(key, buffer)
+        else:
+            self.hits += 1
+
+        return buffer
+
+    def key(self, code: str | bytes, engine: str = None) -> str:
+        """
+        A hash of code and of the engine that scans it. Offsets are counted
+        in characters in str sources and in bytes otherwise, so a str that
+        is not ASCII gets its own entry, apart from its encoded bytes.
+        """
+        # the engine a Scanner picks by default for code
+        engine = Scanner(code, engine=engine).engine
+        if isinstance(code, str):
+            kind = b"str" if not code.isascii() else b"bytes"
+            code = code.encode()
+        else:
+            kind = b"bytes"
+        return hashlib.sha256(b"%s:%s:%s" % (engine.encode(), kind, code)).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".tokens")
+
+    def load(self, key: str, code: str | bytes) -> TokenBuffer | None:
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            # evicted by another process in the meantime
+            pass
+
+        if len(data) < HEADER.size:
+            return None
+
+        magic, version, little, offset, count = HEADER.unpack_from(data)
+        if (magic, version, little) != (MAGIC, VERSION, sys.byteorder == "little"):
+            return None
+
+        buffer = TokenBuffer(code)
+        columns = (buffer.types, buffer.starts, buffer.ends)
+        if buffer.starts.typecode != offset.decode():
+            return None
+
+        if len(data) != HEADER.size + count * sum(column.itemsize for column in columns):
+            return None
+
+        position = HEADER.size
+        for column in columns:
+            size = count * column.itemsize
+            column.frombytes(data[position:position + size])
+            position += size
+
+        return buffer
+
+    def store(self, key: str, buffer: TokenBuffer) -> None:
+        header = HEADER.pack(MAGIC, VERSION, sys.byteorder == "little",
+                             buffer.starts.typecode.encode(), len(buffer))
+
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                for column in (buffer.types, buffer.starts, buffer.ends):
+                    column.tofile(f)
+            os.replace(temp, self.path(key))
+        except BaseException:
+            os.unlink(temp)
+            raise
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tokens"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
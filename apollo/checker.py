@@ -0,0 +1,90 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from parser import Parser
+from typing import Iterable, Iterator, NamedTuple
+
+from exc import UnexpectedCharacter, UnterminatedString, describe
+from scanner import Scanner
+from tok import LineTable
+
+
+class Report(NamedTuple):
+    """Outcome of checking one script"""
+
+    path: str
+    size: int  # in characters
+    statements: int
+    errors: list[str]
+
+
+def find_scripts(directory: str) -> list[str]:
+    """Paths of the .apo scripts under directory, in a stable order"""
+    scripts = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        scripts += (os.path.join(root, name) for name in sorted(files) if name.endswith(".apo"))
+    return scripts
+
+
+def check_file(path: str, engine: str = "regex") -> Report:
+    """
+    Scans and parses the script at path in a single pass, recovering from
+    syntax errors, and reports every one of them.
+
+    A scanning error stops the scanner, so it is the only one reported, and
+    a script that is not UTF-8 is not scanned at all.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            code = f.read()
+    except UnicodeDecodeError as e:
+        return Report(path, 0, 0, [f"Error: {e}"])
+
+    try:
+        tokens = Scanner(code, engine=engine).scan_tokens()
+    except (UnexpectedCharacter, UnterminatedString, IndentationError) as e:
+        return Report(path, len(code), 0, [f"Error: {e}"])
+
+    parser = Parser(tokens, recover=True)
+    statements = parser.parse()
+    lines = LineTable(code)
+    errors = [describe(e.token, str(e), lines) for e in parser.errors]
+    return Report(path, len(code), len(statements) - len(errors), errors)
+
+
+def check_files(paths: Iterable[str], workers: int = None, engine: str = "regex",
+                chunk_size: int = 16) -> Iterator[Report]:
+    """
+    Checks scripts with a pool of worker processes, and yields their reports
+    in the order of paths. A single worker checks them in this process.
+    """
+    check = partial(check_file, engine=engine)
+    if workers == 1:
+        yield from map(check, paths)
+        return
+
+    with ProcessPoolExecutor(workers) as pool:
+        # scripts are small, so they are sent to the workers by the dozen
+        yield from pool.map(check, paths, chunksize=chunk_size)
+
+
+class Throughput:
+    """Running totals of a batch of checks"""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.files = self.chars = self.errors = self.failed = 0
+
+    def add(self, report: Report) -> None:
+        self.files += 1
+        self.chars += report.size
+        self.errors += len(report.errors)
+        self.failed += bool(report.errors)
+
+    def __str__(self) -> str:
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return (f"checked {self.files} files in {elapsed:.2f}s "
+                f"({self.files / elapsed:,.0f} files/s, {self.chars / elapsed / 1e6:.2f}M characters/s): "
+                f"{self.errors} errors in {self.failed} files")
@@ -0,0 +1,310 @@
+from typing import Any, Callable
+
+from environment import UNSET, Frame, global_env
+from exc import NameNotFoundException, ReturnException, RuntimeException
+from expression import (Binary, Call, CommaExpression, Expression, Grouping, Literal, Logical,
+                        Ternary, Unary, Variable)
+from interpreter import BINARY, LEXEMES, Backend
+from resolver import arity_error, resolve
+from statement import (AssignmentStatement, Block, ExpressionStatement, FunctionDefinition,
+                       IfStmt, ReturnStmt, Statement, WhileStmt)
+from tok import Token
+from tok.type import TokenType as tt
+
+MISSING = object()
+
+# A compiled expression takes the frame of the function call it runs in, or
+# that of the top level, and returns its value. A compiled statement returns
+# None, or the value of a return statement it ran in a 1-tuple, so that a
+# returned None is told apart.
+Closure = Callable[[Frame], Any]
+
+
+class Function:
+    """An apollo function run by ClosureInterpreter, and the frame it was defined in"""
+
+    __slots__ = ("definition", "closure")
+
+    def __init__(self, definition: FunctionDefinition, closure: Frame = None) -> None:
+        self.definition = definition
+        self.closure = closure
+
+    def __repr__(self) -> str:
+        return f"<function {self.definition.name}>"
+
+
+def body(definition: FunctionDefinition) -> Closure:
+    """The compiled block of a function, resolved and compiled once and kept on its definition"""
+    if definition.compiled is None:
+        resolve(definition)
+        definition.compiled = statement(definition.block)
+    return definition.compiled
+
+
+def error(e: Exception, expr: Binary) -> RuntimeException:
+    # the offset is read when the error happens, as edits may shift it
+    operator = Token(expr.operator, LEXEMES[expr.operator], None, expr.offset)
+    return RuntimeException(str(e), operator)
+
+
+class ClosureInterpreter(Backend):
+    """
+    Runs statements by first turning every node into a Python closure
+    specialized for it, so that running them involves no dispatch on the
+    type of nodes, as an alternative to Interpreter with the same behavior
+    and interface.
+
+    Top-level statements are compiled every time they run, while function
+    bodies are compiled the first time they are called and kept on their
+    FunctionDefinition, for any later call, from any interpreter.
+    """
+
+    def __init__(self) -> None:
+        self.globals = global_env()
+        # the names of the top level are the globals
+        self.env = self.globals
+        self.frame = Frame([], None, self.globals)
+
+    def execute(self, stmt: Statement):
+        if isinstance(stmt, ExpressionStatement):
+            return self.evaluate(stmt.expr)
+
+        returned = statement(stmt)(self.frame)
+        if returned is not None:
+            raise ReturnException("Return value", None, returned[0])
+
+    def evaluate(self, expr: Expression) -> Any:
+        return expression(expr)(self.frame)
+
+
+def statement(stmt: Statement) -> Closure:
+
+    match stmt:
+        case ExpressionStatement(expr):
+            evaluate = expression(expr)
+
+            def run(frame):
+                evaluate(frame)
+            return run
+
+        case AssignmentStatement(name, expr):
+            evaluate, slot = expression(expr), stmt.slot
+            if slot is None:
+                def assign_global(frame):
+                    frame.globals[name] = evaluate(frame)
+                return assign_global
+
+            def assign(frame):
+                frame.slots[slot] = evaluate(frame)
+            return assign
+
+        case IfStmt(condition, block, elif_stmt, else_block):
+            test, then = expression(condition), statement(block)
+            other = elif_stmt or else_block
+            if other is None:
+                def if_(frame):
+                    if test(frame):
+                        return then(frame)
+                return if_
+
+            otherwise = statement(other)
+
+            def if_else(frame):
+                if test(frame):
+                    return then(frame)
+                return otherwise(frame)
+            return if_else
+
+        case Block(statements):
+            compiled = [statement(s) for s in statements]
+            if len(compiled) == 1:
+                return compiled[0]
+
+            def block(frame):
+                for run in compiled:
+                    returned = run(frame)
+                    if returned is not None:
+                        return returned
+            return block
+
+        case WhileStmt(condition, block, else_block):
+            test, loop = expression(condition), statement(block)
+            otherwise = statement(else_block) if else_block else None
+
+            def while_(frame):
+                while test(frame):
+                    returned = loop(frame)
+                    if returned is not None:
+                        return returned
+                if otherwise is not None:
+                    return otherwise(frame)
+            return while_
+
+        case FunctionDefinition(name) as definition:
+            slot = definition.slot
+            if slot is None:
+                # only top-level functions are globals, they enclose no frame
+                def define_global(frame):
+                    frame.globals[name] = Function(definition)
+                return define_global
+
+            def define(frame):
+                frame.slots[slot] = Function(definition, frame)
+            return define
+
+        case ReturnStmt(value):
+            if not value:
+                return lambda frame: (None,)
+            evaluate = expression(value)
+            return lambda frame: (evaluate(frame),)
+
+    raise TypeError(f"cannot compile {stmt!r}")
+
+
+def expression(expr: Expression) -> Closure:
+
+    match expr:
+        case Literal(value):
+            return lambda frame: value
+
+        case Variable(name):
+            return variable(name, expr.depth, expr.slot)
+
+        case Binary(left, operator, right):
+            return binary(expr, expression(left), operator, expression(right))
+
+        case Logical(left, operator, right):
+            first, second = expression(left), expression(right)
+            if operator == tt.AND:
+                return lambda frame: first(frame) and second(frame)
+            if operator == tt.OR:
+                return lambda frame: first(frame) or second(frame)
+            return lambda frame: (first(frame), second(frame))[1]
+
+        case Unary(operator, right):
+            operand = expression(right)
+            if operator == tt.MINUS:
+                return lambda frame: -operand(frame)
+            if operator == tt.NOT:
+                return lambda frame: not operand(frame)
+            return lambda frame: (operand(frame), None)[1]
+
+        case Grouping(inner):
+            return expression(inner)
+
+        case Ternary(left, condition, right):
+            then, test, otherwise = expression(left), expression(condition), expression(right)
+            return lambda frame: then(frame) if test(frame) else otherwise(frame)
+
+        case CommaExpression(expressions):
+            compiled = [expression(e) for e in expressions]
+            return lambda frame: [evaluate(frame) for evaluate in compiled]
+
+        case Call(callee, args):
+            if args is None:
+                arguments = []
+            elif isinstance(args, CommaExpression):
+                arguments = [expression(arg) for arg in args.expressions]
+            else:
+                arguments = [expression(args)]
+            return call(expr, expression(callee), arguments)
+
+    raise TypeError(f"cannot compile {expr!r}")
+
+
+def variable(name: str, depth: int, slot: int | None) -> Closure:
+    """Reads a local by its slot, in the frame depth functions out, or else a global"""
+    if slot is None:
+        def global_(frame):
+            globals = frame.globals
+            value = globals.get(name, MISSING)
+            if value is MISSING:
+                value = globals.enclosing.get(name, MISSING)
+                if value is MISSING:
+                    raise NameNotFoundException(f"name '{name}' is not defined")
+            return value
+        return global_
+
+    if depth == 0:
+        def local(frame):
+            value = frame.slots[slot]
+            if value is UNSET:
+                raise NameNotFoundException(f"name '{name}' is not defined")
+            return value
+        return local
+
+    def outer(frame):
+        for _ in range(depth):
+            frame = frame.enclosing
+        value = frame.slots[slot]
+        if value is UNSET:
+            raise NameNotFoundException(f"name '{name}' is not defined")
+        return value
+    return outer
+
+
+def binary(expr: Binary, left: Closure, operator: tt, right: Closure) -> Closure:
+    """
+    The most common operators are written out, the others go through their
+    function. Operands are evaluated before the try, so that an error of a
+    call in an operand is not reported at this operator.
+    """
+    op = BINARY[operator]
+    if op is None:
+        return lambda frame: (left(frame), right(frame), None)[2]
+
+    if operator == tt.PLUS:
+        def add(frame):
+            a, b = left(frame), right(frame)
+            try:
+                return a + b
+            except TypeError as e:
+                raise error(e, expr)
+        return add
+
+    if operator == tt.MINUS:
+        def subtract(frame):
+            a, b = left(frame), right(frame)
+            try:
+                return a - b
+            except TypeError as e:
+                raise error(e, expr)
+        return subtract
+
+    if operator == tt.LESSER:
+        def less(frame):
+            a, b = left(frame), right(frame)
+            try:
+                return a < b
+            except TypeError as e:
+                raise error(e, expr)
+        return less
+
+    def apply(frame):
+        a, b = left(frame), right(frame)
+        try:
+            return op(a, b)
+        except (TypeError, ZeroDivisionError) as e:
+            raise error(e, expr)
+    return apply
+
+
+def call(expr: Call, callee: Closure, arguments: list[Closure]) -> Closure:
+    """Calls to apollo functions evaluate to their return value, other calls to None"""
+
+    def invoke(frame):
+        function = callee(frame)
+        args = [evaluate(frame) for evaluate in arguments]
+        if type(function) is not Function:
+            function(*args)
+            return None
+
+        definition = function.definition
+        if len(args) != len(definition.params):
+            raise arity_error(definition, len(args), expr.offset)
+        run = body(definition)
+        slots = [UNSET] * len(definition.scope)
+        slots[:len(args)] = args
+        returned = run(Frame(slots, function.closure, frame.globals))
+        return returned[0] if returned is not None else None
+    return invoke
@@ -4,34 +4,60 @@ import builtins
 
 from exc import NameNotFoundException
 
+# The value of a local variable before it is first assigned
+UNSET = object()
+
+MISSING = object()
+
+get = dict.get
+
 
 class Environment(dict):
+    """
+    Names and their values, in a scope enclosed by another one, where names
+    that are not in this scope are looked up.
+
+    Reading a name of this scope is a plain dict lookup, as __getitem__ is
+    not overridden. Only a miss calls __missing__, which probes the enclosing
+    scopes in turn without raising along the way, so that reading a builtin
+    from the globals costs one more dict probe. Only a name that no scope
+    has raises a NameNotFoundException.
+    """
+
     def __init__(self, enclosing: Environment = None):
         super().__init__()
         self.enclosing = enclosing
 
-    def __setitem__(self, key, value) -> None:
-        if self.enclosing:
-            self.enclosing.__setitem__(key, value)
-        else:
-            return super().__setitem__(key, value)
-
-    def __getitem__(self, key):
-        try:
-            return super().__getitem__(key)
-        except NameNotFoundException:
-            if self.enclosing:
-                return self.enclosing.__getitem__(key)
-            else:
-                raise
-
     def __missing__(self, key):
+        env = self.enclosing
+        while env is not None:
+            value = get(env, key, MISSING)
+            if value is not MISSING:
+                return value
+            env = env.enclosing
         raise NameNotFoundException(f"name '{key}' is not defined")
 
 
+class Frame:
+    """
+    The local variables of a function call, by the slot the resolver gave
+    them, see resolver.Scope. enclosing is the frame of the call that
+    defined the function, where the names of enclosing functions live, and
+    globals the environment of the names of the top level.
+    """
+
+    __slots__ = ("slots", "enclosing", "globals")
+
+    def __init__(self, slots: list, enclosing: Frame | None, globals: Environment) -> None:
+        self.slots = slots
+        self.enclosing = enclosing
+        self.globals = globals
+
+
 def global_env():
+    """An empty environment for the names of the top level, enclosed by the builtins"""
     env = Environment()
     for name in dir(builtins):
         if not name.startswith("__"):
             env[name] = getattr(builtins, name)
-    return env
+    return Environment(enclosing=env)
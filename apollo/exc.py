@@ -1,3 +1,4 @@
+from tok import LineTable, TokenType
 from tok.tok import Token
 
 
@@ -31,3 +32,16 @@ class ReturnException(ApolloException):
     def __init__(self, msg, token, value):
         super().__init__(msg, token)
         self.value = value
+
+
+def describe(token: Token, msg: str, lines: LineTable = None) -> str:
+    """Formats an error at token, with its column if the lines of its source are given"""
+    if token.offset is not None and lines is not None:
+        where = "line {}, column {}".format(*lines.position(token.offset))
+    else:
+        # tokens only know their offset
+        where = f"offset {token.offset}"
+
+    if token.type == TokenType.EOF:
+        return f"[{where}] Error at end: {msg}"
+    return f"[{where}] Error at {token.type} {token.lexeme}: {msg}"
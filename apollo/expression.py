@@ -1,69 +1,141 @@
 from __future__ import annotations
 
 import abc
+import sys
 from dataclasses import dataclass, field
 from typing import Any
 
-from tok import Token
+from tok import TokenType
+
+# Nodes store the type of their operator or keyword token, and its offset in
+# the source, instead of the token itself, so that the tokens can be freed
+# once parsed. Offsets do not take part in comparisons, like those of tokens.
 
 
 class Expression(abc.ABC):
-    pass
+    __slots__ = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class Binary(Expression):
     left: Expression
-    operator: Token
+    operator: TokenType
     right: Expression
+    offset: int | None = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Ternary(Expression):
-    """Ternary expressions, basically only 'a if x else b'"""
+    """Ternary expressions, basically only 'a if x else b', at the offset of 'if'"""
 
     left: Expression
-    if_: Token
     condition: Expression
-    else_: Token
     right: Expression
+    offset: int | None = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Unary(Expression):
-    operator: Token
+    operator: TokenType
     right: Expression
+    offset: int | None = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Grouping(Expression):
     expression: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Expression):
     value: Any
 
 
-@dataclass
+@dataclass(slots=True)
 class Variable(Expression):
-    name: Token
+    # interned, as looked up in environments
+    name: str
+    offset: int | None = field(default=None, compare=False)
+    # set by the resolver in function bodies: the number of functions out
+    # from the reference to the one the name is local to, and its slot there,
+    # or None for a global
+    depth: int = field(default=0, compare=False, repr=False)
+    slot: int | None = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.name = sys.intern(self.name)
 
 
-@dataclass
+@dataclass(slots=True)
 class Logical(Expression):
     left: Expression
-    operator: Token
+    operator: TokenType
     right: Expression
+    offset: int | None = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class Call(Expression):
+    """A call, at the offset of its closing parenthesis"""
+
     callee: Expression
-    paren: Token
-    arguments: CommaExpression | None = None
+    arguments: Expression | CommaExpression | None = None
+    offset: int | None = field(default=None, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class CommaExpression:
     expressions: list[Expression]
+
+
+class NodePool:
+    """
+    Hands out a single node for equal expressions of a program.
+
+    Literals are always pooled, one per constant value and type, since they
+    have no offset. When share is True, every other expression is
+    hash-consed: as its children were pooled first, an expression is the same
+    as an earlier one if it has the same operator or name and the very same
+    children, and the earlier node is returned instead. Structurally equal
+    expressions are then the same object, so identity is a cheap equality
+    key, but a shared node keeps the offset of its first occurrence.
+
+    Expressions are only shared within a function body, as the resolver
+    gives the variables of each function slots of their own, see function().
+    """
+
+    def __init__(self, share: bool = False) -> None:
+        self.share = share
+        self.constants: dict[tuple, Literal] = {}
+        self.nodes: dict[tuple, Expression | CommaExpression] = {}
+
+    def literal(self, value: Any) -> Literal:
+        # by type too, as 1, 1.0 and True are equal
+        key = (type(value), value)
+        literal = self.constants.get(key)
+        if literal is None:
+            literal = self.constants[key] = Literal(value)
+        return literal
+
+    def function(self) -> NodePool:
+        """A pool for the body of a function, that only shares the constants with this one"""
+        pool = NodePool(self.share)
+        pool.constants = self.constants
+        return pool
+
+    def intern(self, node: Expression | CommaExpression) -> Expression | CommaExpression:
+        if not self.share:
+            return node
+
+        match node:
+            case Binary(left, operator, right) | Logical(left, operator, right):
+                key = (type(node), operator, id(left), id(right))
+            case Unary(operator, right): key = (Unary, operator, id(right))
+            case Variable(name): key = (Variable, name)
+            case Grouping(expr): key = (Grouping, id(expr))
+            case Ternary(left, condition, right): key = (Ternary, id(left), id(condition), id(right))
+            case Call(callee, args): key = (Call, id(callee), id(args))
+            case CommaExpression(exprs): key = (CommaExpression, *map(id, exprs))
+            case _: return node
+
+        return self.nodes.setdefault(key, node)
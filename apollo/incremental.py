@@ -0,0 +1,300 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from operator import attrgetter, itemgetter
+from parser import Parser
+from typing import Any, Callable, Iterable, NamedTuple
+
+from scanner import make_token, tokenize
+from statement import Statement, walk
+from tok import Token
+from tok import TokenType as tt
+
+position = attrgetter("pos")
+offset_of = attrgetter("offset")
+
+
+class Restart(NamedTuple):
+    """Scanner state at the start of a line, from which tokenize can resume"""
+
+    pos: int
+    indents: tuple[int, ...]
+
+
+def shift_token(token: Token, delta: int) -> Token:
+    token.offset += delta
+    return token
+
+
+def shift_restart(restart: Restart, delta: int) -> Restart:
+    return restart._replace(pos=restart.pos + delta)
+
+
+def shift_statement(statement: Statement, delta: int) -> Statement:
+    for node in walk(statement):
+        if getattr(node, "offset", None) is not None:
+            node.offset += delta
+    return statement
+
+
+def shift_span(span: tuple[int, int], delta: int) -> tuple[int, int]:
+    return span[0] + delta, span[1] + delta
+
+
+class Shifted(Sequence):
+    """
+    A list of items located in a source, such as tokens, where the items
+    after an edit are only moved by it when they are read.
+
+    Items before the gap are up to date. An item from the gap on is behind by
+    total - bases[i], by which it is shifted the first time it is read.
+    splice() first moves the gap to the edit, bringing up to date or marking
+    as such the items in between, so a series of edits close to each other
+    leaves the other items alone, however many there are.
+    """
+
+    def __init__(self, shift: Callable[[Any, int], Any], items: Iterable = ()) -> None:
+        self.shift = shift
+        self.items = list(items)
+        self.bases = [0] * len(self.items)
+        self.gap = len(self.items)
+        self.total = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __getitem__(self, index: int):
+        item = self.items[index]
+        if index < 0:
+            index += len(self.items)
+        if index >= self.gap:
+            delta = self.total - self.bases[index]
+            if delta:
+                item = self.items[index] = self.shift(item, delta)
+                self.bases[index] = self.total
+        return item
+
+    def move(self, index: int) -> None:
+        """Moves the gap to index"""
+        items, bases, total = self.items, self.bases, self.total
+        for i in range(self.gap, index):
+            if total != bases[i]:
+                items[i] = self.shift(items[i], total - bases[i])
+        for i in range(index, self.gap):
+            bases[i] = total
+        self.gap = index
+
+    def splice(self, start: int, stop: int, items: list, delta: int = 0) -> None:
+        """
+        Replaces the items from start to stop with items, which are up to
+        date, and shifts the ones after them by delta.
+        """
+        self.move(start)
+        self.items[start:stop] = items
+        self.bases[start:stop] = [0] * len(items)
+        self.gap = start + len(items)
+        self.total += delta
+
+
+class IncrementalLexer:
+    """
+    Keeps the tokens of a source up to date as it is edited, without
+    scanning it all over again.
+
+    The state of the scanner is recorded after every NEWLINE token. An edit
+    is rescanned from the last line that starts before it, until a NEWLINE
+    past the edit leaves the scanner in the same state as a NEWLINE of the
+    old source, from where the old tokens are reused. Those are kept as is,
+    and their offsets, like the positions of the states after the edit, are
+    only updated when they are read, see Shifted. An edit thus costs the
+    lines it rescans, not the size of the source.
+
+    The resulting tokens are always the same as those of a full scan.
+
+    After each edit, changed holds the index of the first token that was
+    replaced, and the indices where the replaced tokens ended before and
+    after the edit. Tokens outside of that range are the same objects as
+    before.
+    """
+
+    def __init__(self, code: str) -> None:
+        self.code = code
+        self.tokens = Shifted(shift_token)
+        self.restarts = Shifted(shift_restart)
+        self.changed = (0, 0, 0)
+        self.rescan()
+
+    def rescan(self) -> Shifted:
+        start, old = Restart(0, (0,)), len(self.tokens)
+        tokens, restarts, _ = self.scan(start)
+        self.tokens = Shifted(shift_token, tokens)
+        self.restarts = Shifted(shift_restart, [start] + restarts)
+        self.changed = (0, old, len(tokens))
+        return self.tokens
+
+    def edit(self, offset: int, removed: int, inserted: str) -> Shifted:
+        """
+        Replaces `removed` characters at offset with inserted, and returns
+        the updated tokens.
+        """
+        self.code = self.code[:offset] + inserted + self.code[offset + removed:]
+
+        if not self.restarts:
+            # the previous edit left the source unscannable
+            return self.rescan()
+
+        restarts, tokens = self.restarts, self.tokens
+        first = bisect_right(restarts, offset, key=position) - 1
+        # the tokens of a line are the ones from its start on
+        start = bisect_left(tokens, restarts[first].pos, key=offset_of)
+        chars = len(inserted) - removed
+
+        try:
+            scanned, new, resync = self.scan(restarts[first], offset + len(inserted), chars)
+        except Exception:
+            self.tokens, self.restarts = Shifted(shift_token), Shifted(shift_restart)
+            raise
+
+        if resync is None:
+            self.changed = (start, len(tokens), start + len(scanned))
+            tokens.splice(start, len(tokens), scanned)
+            restarts.splice(first + 1, len(restarts), new)
+            return tokens
+
+        # The last new restart is the old one, shifted
+        end = bisect_left(tokens, restarts[resync].pos, start, key=offset_of)
+        new.pop()
+        self.changed = (start, end, start + len(scanned))
+        tokens.splice(start, end, scanned, chars)
+        restarts.splice(first + 1, resync, new, chars)
+        return tokens
+
+    def scan(self, restart: Restart, edited: int = None, chars: int = 0):
+        """
+        Scans the source from restart. When edited is given, stops at the
+        first NEWLINE at or after it that leaves the scanner in the state of
+        an old restart shifted by `chars`.
+
+        Returns the tokens, the restarts after each NEWLINE and the index of
+        the matching old restart, or None if the scan reached the end.
+        """
+        code = self.code
+        indents = list(restart.indents)
+        tokens = []
+        restarts = []
+
+        for type, start, end in tokenize(code, restart.pos, indents,
+                                         after_newline=restart.pos > 0):
+            tokens.append(make_token(code, type, start, end))
+
+            if type is tt.NEWLINE:
+                state = Restart(end, tuple(indents))
+                restarts.append(state)
+
+                if edited is not None and end >= edited:
+                    # the start of the source is not after a NEWLINE, so
+                    # never resynchronize on it
+                    old = bisect_left(self.restarts, end - chars, 1, key=position)
+                    if (old < len(self.restarts) and self.restarts[old].pos == end - chars
+                            and self.restarts[old].indents == state.indents):
+                        return tokens, restarts, old
+
+        return tokens, restarts, None
+
+
+class IncrementalParser:
+    """
+    Keeps the statements of a source up to date as it is edited, parsing
+    again only the top-level statements that an edit touches.
+
+    Tokens come from an IncrementalLexer, and the span of tokens of every
+    top-level statement is recorded. An edit is parsed from the start of the
+    first statement whose tokens were replaced, until the parser lands on the
+    start of an old statement past the edit, and the new statements are
+    spliced in. The other statements are kept as the same objects, so that
+    anything keyed on their identity stays valid, and the offsets of those
+    after the edit are shifted in place when they are read, like their
+    tokens, see Shifted. Their spans are shifted by the tokens the edit
+    added in the same way.
+
+    The resulting statements are always the same as those of a full parse.
+    After each edit, reparsed is the range of the statements that are new.
+    """
+
+    def __init__(self, code: str) -> None:
+        self.lexer = IncrementalLexer(code)
+        self.statements = Shifted(shift_statement)
+        # start and end index of the tokens of each statement, or None if
+        # the last edit could not be parsed
+        self.spans: Shifted | None = Shifted(shift_span)
+        self.reparsed = range(0)
+        self.reparse()
+
+    @property
+    def code(self) -> str:
+        return self.lexer.code
+
+    def reparse(self) -> Shifted:
+        self.spans = None
+        statements, spans, _ = self.parse(0)
+        self.statements = Shifted(shift_statement, statements)
+        self.spans = Shifted(shift_span, spans)
+        self.reparsed = range(len(statements))
+        return self.statements
+
+    def edit(self, offset: int, removed: int, inserted: str) -> Shifted:
+        """
+        Replaces `removed` characters at offset with inserted, and returns
+        the updated statements.
+        """
+        try:
+            self.lexer.edit(offset, removed, inserted)
+            if self.spans is None:
+                # the previous edit left the source unparsable
+                return self.reparse()
+
+            start, old_end, new_end = self.lexer.changed
+            spans, shift = self.spans, new_end - old_end
+
+            # the first statement that ends after the first replaced token
+            first = bisect_right(spans, start, key=itemgetter(1))
+            if first == len(spans):
+                # the DEDENTs that close the last statement are not in its
+                # span, and what follows it may continue its block
+                first = max(len(spans) - 1, 0)
+            pos = spans[first][0] if spans else 0
+            statements, new, resync = self.parse(
+                pos, spans, bisect_left(spans, old_end, first, key=itemgetter(0)), shift)
+        except Exception:
+            self.spans = None
+            raise
+
+        self.statements.splice(first, resync, statements, len(inserted) - removed)
+        spans.splice(first, resync, new, shift)
+        self.reparsed = range(first, first + len(statements))
+        return self.statements
+
+    def parse(self, pos: int, spans: Shifted = None, old: int = 0, shift: int = 0):
+        """
+        Parses top-level statements from the token at pos. When the spans of
+        the old statements are given, stops at the first one from old on
+        that the parser lands on, once shifted.
+
+        Returns the statements, their spans and the index of the matching
+        old statement, which is past the old ones if the parse reached the end.
+        """
+        parser = Parser(self.lexer.tokens)
+        parser.current = pos
+        statements, new = [], []
+        count = len(spans) if spans is not None else 0
+
+        while not parser.end:
+            while old < count and spans[old][0] + shift < parser.current:
+                old += 1
+            if old < count and spans[old][0] + shift == parser.current:
+                return statements, new, old
+
+            start = parser.current
+            statements.append(parser.toplevel())
+            new.append((start, parser.current))
+
+        return statements, new, count
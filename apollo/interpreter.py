@@ -1,27 +1,60 @@
 
-from token import NUMBER
-from typing import Any
+import abc
+import operator
+from typing import Any, Iterable
 
-from environment import Environment, global_env
+from environment import UNSET, Frame, global_env
 from exc import NameNotFoundException, ReturnException, RuntimeException
 from expression import (Binary, Call, CommaExpression, Expression, Grouping,
                         Literal, Logical, Ternary, Unary, Variable)
+from resolver import arity_error, resolve
 from statement import (AssignmentStatement, Block, ElifStmt, ElseBlock,
                        ExpressionStatement, FunctionDefinition, IfStmt, ReturnStmt, Statement, WhileStmt)
+from scanner import OPERATORS
+from tok import Token
 from tok.type import TokenType as tt
 
-
-class Interpreter:
-
-    def __init__(self) -> None:
-        self.globals = global_env()
-        self.env = Environment(enclosing=self.globals)
-
-    def interpret(self, statements: list[Statement]):
+# Operator implementations indexed by token type, None where there is none
+BINARY = [None] * (max(tt) + 1)
+BINARY[tt.MINUS] = operator.sub
+BINARY[tt.SLASH] = operator.truediv
+BINARY[tt.STAR] = operator.mul
+BINARY[tt.PLUS] = operator.add
+BINARY[tt.GREATER] = operator.gt
+BINARY[tt.GEQUAL] = operator.ge
+BINARY[tt.LESSER] = operator.lt
+BINARY[tt.LEQUAL] = operator.le
+BINARY[tt.EQUAL] = operator.eq
+BINARY[tt.NEQUAL] = operator.ne
+
+UNARY = [None] * (max(tt) + 1)
+UNARY[tt.MINUS] = operator.neg
+UNARY[tt.NOT] = operator.not_
+
+# Nodes only keep the type of their operator, errors report its text
+LEXEMES = {type: text for text, type in OPERATORS.items()}
+
+
+class Backend(abc.ABC):
+    """
+    The interface of the ways to run statements, which only differ in how
+    they execute each one: Interpreter, vm.VM, closures.ClosureInterpreter
+    and transpiler.PythonInterpreter.
+    """
+
+    def interpret(self, statements: Iterable[Statement], keep: bool = True):
+        """
+        Executes statements in order, and returns their results. statements
+        may be a generator such as Parser.iter_parse(), in which case each one
+        runs as soon as it is parsed. When keep is False, results are dropped
+        as they are produced, and None is returned.
+        """
         results = []
         for stmt in statements:
             try:
                 res = self.execute(stmt)
+                if not keep:
+                    continue
                 if isinstance(res, list):
                     results.extend(res)
                 else:
@@ -30,14 +63,39 @@ class Interpreter:
                 results.append(None)
                 print(e)
                 raise
-        return results
+        return results if keep else None
+
+    @abc.abstractmethod
+    def execute(self, stmt: Statement):
+        """Runs stmt, and returns the value of an expression statement"""
+
+
+class Interpreter(Backend):
+    """
+    Runs statements by walking their nodes.
+
+    Names of the top level are globals, and the parameters and names a
+    function assigns are local to each of its calls, in a Frame of slots
+    given by the resolver. frame is that of the call being run, or None at
+    the top level.
+    """
+
+    def __init__(self) -> None:
+        self.globals = global_env()
+        # the names of the top level are the globals
+        self.env = self.globals
+        self.frame: Frame | None = None
 
     def execute(self, statement: Statement):
 
         match statement:
             case ExpressionStatement() as stmt: return self.evaluate(stmt.expr)
             case AssignmentStatement(name, expr):
-                self.env[name.lexeme] = self.evaluate(expr)
+                value = self.evaluate(expr)
+                if statement.slot is None:
+                    self.globals[name] = value
+                else:
+                    self.frame.slots[statement.slot] = value
             case IfStmt(condition, block, elif_stmt, else_block):
                 if self.evaluate(condition):
                     self.execute(block)
@@ -55,14 +113,17 @@ class Interpreter:
                     if else_block:
                         self.execute(else_block)
             case FunctionDefinition(name, params, block) as func_def:
-                function = Function(func_def)
-                self.env[func_def.name.lexeme] = function
-            case ReturnStmt(keyword, value):
+                function = Function(func_def, self.frame)
+                if func_def.slot is None:
+                    self.globals[name] = function
+                else:
+                    self.frame.slots[func_def.slot] = function
+            case ReturnStmt(value):
 
                 if value:
                     value = self.evaluate(value)
 
-                raise ReturnException("Return value", keyword, value)
+                raise ReturnException("Return value", None, value)
 
 
     def evaluate(self, expr: Expression) -> Any:
@@ -74,26 +135,36 @@ class Interpreter:
             case Literal() as expr: return self.literal(expr)
             case Grouping() as expr: return self.grouping(expr)
             case Ternary() as expr: return self.ternary(expr)
-            case Variable() as expr: return self.env[expr.name.lexeme]
+            case Variable() as expr: return self.variable(expr)
             case CommaExpression() as expr: return [self.evaluate(e) for e in expr.expressions]
-            case Call(callee, _, args):
+            case Call(callee, args):
                 try:
-                    self.call(callee, args)
+                    self.call(callee, args, expr.offset)
                 except ReturnException as e:
                     return e.value
 
 
+    def variable(self, expr: Variable):
+        if expr.slot is None:
+            return self.globals[expr.name]
+
+        frame = self.frame
+        for _ in range(expr.depth):
+            frame = frame.enclosing
+        value = frame.slots[expr.slot]
+        if value is UNSET:
+            raise NameNotFoundException(f"name '{expr.name}' is not defined")
+        return value
+
     def literal(self, expr: Literal):
         return expr.value
 
     def unary(self, expr: Unary):
         right = self.evaluate(expr.right)
 
-        match expr.operator.type:
-            case tt.MINUS:
-                return -right
-            case tt.NOT:
-                return not bool(right)
+        op = UNARY[expr.operator]
+        if op is not None:
+            return op(right)
 
     def ternary(self, expr: Ternary):
         return self.evaluate(expr.left) if self.evaluate(expr.condition) else self.evaluate(expr.right)
@@ -105,58 +176,64 @@ class Interpreter:
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
 
+        op = BINARY[expr.operator]
+        if op is None:
+            return None
+
         try:
-            match expr.operator.type:
-                case tt.MINUS: return left - right
-                case tt.SLASH: return left / right
-                case tt.STAR: return left * right
-                case tt.PLUS: return left + right
-                case tt.GREATER: return left > right
-                case tt.GEQUAL: return left >= right
-                case tt.LESSER: return left < right
-                case tt.LEQUAL: return left <= right
-                case tt.EQUAL: return left == right
-                case tt.NEQUAL: return left != right
+            return op(left, right)
         except (TypeError, ZeroDivisionError) as e:
-            raise RuntimeException(str(e), expr.operator)
+            operator = Token(expr.operator, LEXEMES[expr.operator], None, expr.offset)
+            raise RuntimeException(str(e), operator)
 
     def logical(self, expr: Logical):
         left = self.evaluate(expr.left)
 
-        if expr.operator.type == tt.AND:
+        if expr.operator == tt.AND:
 
             if not left: return left
 
-        elif expr.operator.type == tt.OR:
+        elif expr.operator == tt.OR:
 
             if left: return left
 
         return self.evaluate(expr.right)
 
-    def call(self, callee, args: list[Expression] | Expression | None) -> Any:
-        from functools import partial
-
+    def call(self, callee, args: list[Expression] | Expression | None,
+             offset: int | None = None) -> Any:
         callee = self.evaluate(callee)
 
-        if isinstance(callee, Function):
-            callee = partial(callee, self)
-
         if isinstance(args, Expression):
-            return callee(self.evaluate(args))
+            args = [self.evaluate(args)]
         elif args == None:
-            return callee()
+            args = []
         elif isinstance(args, CommaExpression):
             args = [self.evaluate(arg) for arg in args.expressions]
-            return callee(*args)
+
+        if isinstance(callee, Function):
+            if len(args) != len(callee.definition.params):
+                raise arity_error(callee.definition, len(args), offset)
+            return callee(self, *args)
+        return callee(*args)
 
 
 class Function:
-    def __init__(self, definition: FunctionDefinition):
+    """
+    An apollo function, along with the frame it was defined in, where it
+    finds the names of the functions it is nested in.
+    """
+
+    def __init__(self, definition: FunctionDefinition, closure: Frame = None):
         self.definition = definition
+        self.closure = closure
 
     def __call__(self, interpreter: Interpreter, *args) -> Any:
-        env = Environment(enclosing=interpreter.globals)
-        for i, arg in enumerate(args):
-            env[self.definition.params[i].name.lexeme] = arg
+        scope = resolve(self.definition)
+        slots = [UNSET] * len(scope)
+        slots[:len(args)] = args
 
-        interpreter.execute(self.definition.block)
+        frame, interpreter.frame = interpreter.frame, Frame(slots, self.closure, interpreter.globals)
+        try:
+            interpreter.execute(self.definition.block)
+        finally:
+            interpreter.frame = frame
@@ -2,14 +2,28 @@
 
 
 import argparse
+import mmap
+import os
 import sys
-from parser import Parser
+from parser import Parser, StackParser
 
-from exc import ParseException, RuntimeException
+from apoc import VALIDATIONS, CompiledCache
+from cache import TokenCache
+from checker import Throughput, check_files, find_scripts
+from closures import ClosureInterpreter
+from exc import (ParseException, RuntimeException, UnexpectedCharacter, UnterminatedString,
+                 describe)
 from interpreter import Interpreter
 from scanner import Scanner
-from tok import TokenType as tt
+from symbols import KINDS, SymbolIndex
+from tok import LineTable
 from tok.tok import Token
+from transpiler import PythonInterpreter, build
+from vm import VM
+
+# Interpreters that run parsed statements
+BACKENDS = {"tree": Interpreter, "vm": VM, "closure": ClosureInterpreter,
+            "python": PythonInterpreter}
 
 
 class Apollo:
@@ -21,26 +35,259 @@ class Apollo:
     ----------
     error : bool
         True if an error was encountered during execution
+    engine : str
+        Scanner engine used to tokenize the code
+    stream : bool
+        True to parse tokens as they are scanned instead of scanning the
+        whole source first
+    mmap : bool
+        True to memory-map files and scan their bytes instead of reading them
+        into a str
+    cache : TokenCache | None
+        Cache of the tokens of previously scanned sources
+    stack : bool
+        True to parse with a StackParser, which handles any nesting depth
+    lazy : bool
+        True to parse function bodies the first time they run
+    check : bool
+        True to parse lazy function bodies anyway, to report their errors
+    share : bool
+        True to parse equal expressions into a single node
+    pipeline : bool
+        True to run each top-level statement as soon as it is parsed, from
+        streamed tokens, without keeping results
+    compiled : CompiledCache | None
+        Compiled .apoc files of previously parsed scripts
+    backend : str
+        Name of the interpreter that runs the statements, see BACKENDS
+    lines : LineTable | None
+        Lines of the source being run, to report errors with their column
+    script : str | None
+        Script being run, whose lines are read to report errors when it was
+        loaded from its compiled file
     """
 
-    def __init__(self) -> None:
+    def __init__(self, engine: str = "char", stream: bool = False, mmap: bool = False,
+                 cache: TokenCache = None, stack: bool = False, lazy: bool = False,
+                 check: bool = False, compiled: CompiledCache = None,
+                 pipeline: bool = False, share: bool = False, backend: str = "tree") -> None:
         self.error = False
         self.runtime_error = False
-        self.interpreter = Interpreter()
+        self.engine = engine
+        self.stream = stream
+        self.mmap = mmap
+        self.cache = cache
+        self.stack = stack
+        self.lazy = lazy
+        self.check = check
+        self.compiled = compiled
+        self.pipeline = pipeline
+        self.share = share
+        self.lines = None
+        self.script = None
+        self.backend = backend
+        self.interpreter = BACKENDS[backend]()
 
     def entrypoint(self):
 
+        if sys.argv[1:2] == ["compile"]:
+            return self.compile_command(sys.argv[2:])
+        if sys.argv[1:2] == ["check"]:
+            return self.check_command(sys.argv[2:])
+        if sys.argv[1:2] == ["build"]:
+            return self.build_command(sys.argv[2:])
+        if sys.argv[1:2] == ["index"]:
+            return self.index_command(sys.argv[2:])
+        if sys.argv[1:2] == ["lookup"]:
+            return self.lookup_command(sys.argv[2:])
+
         parser = argparse.ArgumentParser()
 
         parser.add_argument("script", nargs="?")
+        parser.add_argument("--engine", choices=Scanner.ENGINES, default=self.engine)
+        parser.add_argument("--stream", action="store_true", default=self.stream,
+                            help="parse tokens as soon as they are scanned")
+        parser.add_argument("--mmap", action="store_true", default=self.mmap,
+                            help="memory-map the script instead of reading it")
+        parser.add_argument("--cache", metavar="DIR",
+                            help="reuse the tokens of unchanged scripts from DIR")
+        parser.add_argument("--stack", action="store_true", default=self.stack,
+                            help="parse with an explicit stack, for deeply nested code")
+        parser.add_argument("--lazy", action="store_true", default=self.lazy,
+                            help="parse function bodies when they are first called")
+        parser.add_argument("--check", action="store_true", default=self.check,
+                            help="with --lazy, still report syntax errors in every function")
+        parser.add_argument("--compiled", action="store_true",
+                            help="load the script from its compiled .apoc file when up to date")
+        parser.add_argument("--compiled-dir", metavar="DIR",
+                            help="like --compiled, with the .apoc files in DIR")
+        parser.add_argument("--validate", choices=VALIDATIONS, default="mtime",
+                            help="how a compiled file is checked against its script")
+        parser.add_argument("--pipeline", action="store_true", default=self.pipeline,
+                            help="run each top-level statement as soon as it is parsed")
+        parser.add_argument("--share", action="store_true", default=self.share,
+                            help="parse equal expressions into a single node, to save memory")
+        parser.add_argument("--backend", choices=BACKENDS, default=self.backend,
+                            help="run the tree of statements, or compile it to bytecode for a "
+                                 "VM, to Python closures or to Python code")
 
         ns = parser.parse_args()
+        self.engine = ns.engine
+        self.stream = ns.stream
+        self.mmap = ns.mmap
+        self.stack = ns.stack
+        self.lazy = ns.lazy
+        self.check = ns.check
+        self.pipeline = ns.pipeline
+        self.share = ns.share
+        if ns.backend != self.backend:
+            self.backend = ns.backend
+            self.interpreter = BACKENDS[ns.backend]()
+        if ns.cache:
+            self.cache = TokenCache(ns.cache)
+        if ns.compiled or ns.compiled_dir:
+            self.compiled = CompiledCache(ns.compiled_dir, ns.validate)
 
         if ns.script:
             self.run_file(ns.script)
         else:
             self.repl()
 
+    def compile_command(self, args):
+
+        parser = argparse.ArgumentParser(prog="apollo compile",
+                                         description="compile every .apo script under DIR")
+        parser.add_argument("directory", metavar="DIR")
+        parser.add_argument("--out", metavar="DIR",
+                            help="write the .apoc files to DIR instead of next to the scripts")
+        parser.add_argument("--validate", choices=VALIDATIONS, default="mtime")
+        ns = parser.parse_args(args)
+
+        compiled = CompiledCache(ns.out, ns.validate)
+        count = 0
+        for script in find_scripts(ns.directory):
+            header = compiled.header(script)
+            try:
+                with open(script, "r", encoding="utf-8") as f:
+                    code = f.read()
+            except UnicodeDecodeError as e:
+                print(f"{script}: Error: {e}")
+                self.error = True
+                continue
+
+            self.script, self.lines = script, LineTable(code)
+            try:
+                statements = self.parse(code, eager=True)
+            except ParseException as e:
+                print(f"{script}: ", end="")
+                self.report(e.token, str(e))
+                continue
+            except (UnexpectedCharacter, UnterminatedString, IndentationError) as e:
+                print(f"{script}: Error: {e}")
+                self.error = True
+                continue
+
+            compiled.store(script, statements, header)
+            count += 1
+
+        print(f"compiled {count} file{'' if count == 1 else 's'}")
+        if self.error:
+            sys.exit(1)
+
+    def check_command(self, args):
+
+        parser = argparse.ArgumentParser(prog="apollo check",
+                                         description="report every syntax error of the .apo "
+                                                     "scripts under each DIR")
+        parser.add_argument("directories", metavar="DIR", nargs="+")
+        parser.add_argument("--jobs", type=int, help="number of worker processes")
+        parser.add_argument("--engine", choices=Scanner.ENGINES, default="regex")
+        ns = parser.parse_args(args)
+
+        paths = [script for directory in ns.directories for script in find_scripts(directory)]
+        throughput = Throughput()
+        for report in check_files(paths, ns.jobs, ns.engine):
+            throughput.add(report)
+            for error in report.errors:
+                print(f"{report.path}: {error}")
+
+        print(throughput, file=sys.stderr)
+        if throughput.errors:
+            sys.exit(1)
+
+    def build_command(self, args):
+
+        parser = argparse.ArgumentParser(prog="apollo build",
+                                         description="transpile a script to a Python module")
+        parser.add_argument("script", metavar="FILE")
+        parser.add_argument("--out", metavar="FILE",
+                            help="module to write, FILE with a .py extension by default")
+        ns = parser.parse_args(args)
+
+        out = ns.out or os.path.splitext(ns.script)[0] + ".py"
+        try:
+            with open(ns.script, "r") as f:
+                code = f.read()
+        except FileNotFoundError:
+            print(f"file {ns.script} was not found", file=sys.stderr)
+            sys.exit(2)
+
+        self.script, self.lines = ns.script, LineTable(code)
+        try:
+            statements = self.parse(code, eager=True)
+        except ParseException as e:
+            self.report(e.token, str(e))
+            sys.exit(1)
+
+        with open(out, "w") as f:
+            f.write(build(statements, os.path.basename(ns.script)))
+        print(f"built {out}")
+
+    def index_command(self, args):
+
+        parser = argparse.ArgumentParser(prog="apollo index",
+                                         description="index the symbols of the .apo scripts "
+                                                     "under DIR, parsing only the changed ones")
+        parser.add_argument("directory", metavar="DIR")
+        parser.add_argument("--index", metavar="FILE",
+                            help="index file, DIR/.apollo-index by default")
+        parser.add_argument("--validate", choices=VALIDATIONS, default="mtime",
+                            help="how indexed files are checked against the scripts")
+        parser.add_argument("--jobs", type=int, help="number of worker processes")
+        ns = parser.parse_args(args)
+
+        index = SymbolIndex(ns.directory, ns.index, ns.validate)
+        parsed = index.update(ns.jobs)
+        print(f"indexed {len(index)} symbols in {len(index.files)} files "
+              f"({parsed} parsed)")
+
+    def lookup_command(self, args):
+
+        parser = argparse.ArgumentParser(prog="apollo lookup",
+                                         description="find where NAME is defined, bound or called "
+                                                     "in the index of DIR")
+        parser.add_argument("name", metavar="NAME")
+        parser.add_argument("directory", metavar="DIR", nargs="?", default=".")
+        parser.add_argument("--index", metavar="FILE",
+                            help="index file, DIR/.apollo-index by default")
+        parser.add_argument("--kind", choices=KINDS)
+        parser.add_argument("--update", action="store_true",
+                            help="bring the index up to date first")
+        ns = parser.parse_args(args)
+
+        index = SymbolIndex(ns.directory, ns.index)
+        if not ns.update and not os.path.exists(index.path):
+            print(f"{index.path} was not found, run apollo index first", file=sys.stderr)
+            sys.exit(2)
+        if ns.update:
+            index.update()
+        symbols = index.lookup(ns.name, ns.kind)
+        for symbol in symbols:
+            scope = f" in {symbol.scope}" if symbol.scope else ""
+            print(f"{symbol.path}:{symbol.line}:{symbol.column}: {symbol.kind}{scope}")
+        if not symbols:
+            sys.exit(1)
+
     def repl(self):
 
         while True:
@@ -56,9 +303,15 @@ class Apollo:
 
     def run_file(self, filename):
 
+        self.script = filename
         try:
-            with open(filename, "r") as f:
-                self.run(f.read())
+            if self.compiled:
+                self.run_compiled_file(filename)
+            elif self.mmap:
+                self.run_mapped_file(filename)
+            else:
+                with open(filename, "r") as f:
+                    self.run(f.read())
         except FileNotFoundError:
             print(f"file {filename} was not found", file=sys.stderr)
             sys.exit(2)
@@ -67,22 +320,88 @@ class Apollo:
             self.runtime_error = True
             raise
 
-    def run(self, code: str):
+    def run_mapped_file(self, filename):
+
+        with open(filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                code = b""
+            else:
+                # The map is not closed explicitly: it has to stay open for
+                # as long as tokens refer to it, e.g. to report errors.
+                code = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.run(code)
+
+    def run_compiled_file(self, filename):
+
+        def parse():
+            with open(filename, "r") as f:
+                code = f.read()
+            self.lines = LineTable(code)
+            # lazy bodies would be parsed anyway to be compiled
+            return self.parse(code, eager=True)
+
+        # lines are only read from the script if an error is reported
+        self.lines = None
+        try:
+            statements = self.compiled.compile(filename, parse)
+        except ParseException as e:
+            self.report(e.token, str(e))
+            return
+
+        self.interpreter.interpret(statements)
+
+    def run(self, code: str | bytes):
+
+        self.lines = LineTable(code)
+        if self.pipeline:
+            return self.run_pipeline(code)
 
         try:
-            scanner = Scanner(code)
-            tokens = scanner.scan_tokens()
-            parser = Parser(tokens)
-            statements = parser.parse()
+            statements = self.parse(code)
             results = self.interpreter.interpret(statements)
 
         except ParseException as e:
             self.report(e.token, str(e))
 
+    def run_pipeline(self, code: str | bytes):
+
+        # streamed tokens are not kept, so function bodies are never lazy
+        parser = (StackParser if self.stack else Parser)(self.scan(code), share=self.share)
+        try:
+            self.interpreter.interpret(parser.iter_parse(), keep=False)
+        except ParseException as e:
+            # the statements before the error have already run
+            self.report(e.token, str(e))
+
+    def parse(self, code: str | bytes, eager: bool = False):
+
+        parser = (StackParser if self.stack else Parser)(self.scan(code),
+                                                         lazy=self.lazy and not eager,
+                                                         share=self.share)
+        statements = parser.parse()
+        if self.check:
+            parser.parse_bodies(statements)
+        return statements
+
+    def scan(self, code: str | bytes):
+
+        # Only the regex engine can scan bytes
+        engine = self.engine if isinstance(code, str) else None
+        if self.cache:
+            return self.cache.scan(code, engine)
+
+        scanner = Scanner(code, engine=engine)
+        if self.stream or self.pipeline:
+            return scanner.iter_tokens()
+        return scanner.scan_tokens()
+
     def report(self, token: Token, msg):
-        match token.type:
-            case tt.EOF: print(f"[line {token.line}] Error at end: {msg}")
-            case _: print(f"[line {token.line}] Error at {token.type} {token.lexeme}: {msg}")
+        if self.lines is None and self.script is not None and token.offset is not None:
+            with open(self.script, "r") as f:
+                self.lines = LineTable(f.read())
+
+        print(describe(token, msg, self.lines))
         self.error = True
 
 if __name__ == "__main__":
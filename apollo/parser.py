@@ -5,8 +5,8 @@ from expression import (
     CommaExpression,
     Expression,
     Grouping,
-    Literal,
     Logical,
+    NodePool,
     Ternary,
     Unary,
     Variable,
@@ -17,32 +17,103 @@ from statement import (
     ExpressionStatement,
     FunctionDefinition,
     IfStmt,
+    LazyBlock,
     Statement,
     WhileStmt,
     ReturnStmt,
 )
+import copy
+from collections.abc import Generator, Sequence
+from typing import Iterable
+
+from tok import TokenBuffer, TokenStream, bitset
 from tok import TokenType as tt
 from tok.tok import Token
 from tok.type import TokenType
 
+# Binding powers of infix operators, from the loosest to the tightest
+OR, AND, COMMA, TERNARY, EQUALITY, COMPARISON, TERM, FACTOR = range(1, 9)
+
+POWERS = {
+    tt.OR: OR, tt.AND: AND, tt.COMMA: COMMA, tt.IF: TERNARY,
+    tt.NEQUAL: EQUALITY, tt.EQUAL: EQUALITY,
+    tt.GREATER: COMPARISON, tt.GEQUAL: COMPARISON, tt.LESSER: COMPARISON, tt.LEQUAL: COMPARISON,
+    tt.MINUS: TERM, tt.PLUS: TERM,
+    tt.SLASH: FACTOR, tt.STAR: FACTOR,
+}
+# Binding power indexed by token type, 0 for those that are not infix operators
+BINDING = [POWERS.get(type, 0) for type in range(max(tt) + 1)]
+
+# Bitsets of the token types looked for with match_any()
+UNARY = bitset(tt.BANG, tt.MINUS)
+LITERAL = bitset(tt.NUMBER, tt.STRING)
+SYNC = bitset(tt.CLASS, tt.DEF, tt.FOR, tt.IF, tt.WHILE, tt.RETURN)
+BLOCKS = bitset(tt.INDENT, tt.DEDENT)
+
 
 class Parser:
-    def __init__(self, tokens: list[Token]) -> None:
+    """
+    Builds statements out of tokens.
+
+    tokens is either a sequence such as a list or a TokenBuffer, or any other
+    iterable such as Scanner.iter_tokens(), which is then read lazily through
+    a TokenStream.
+
+    When lazy is True, function bodies are only skipped over, and left in a
+    LazyBlock that parses them the first time the function runs. Their syntax
+    errors are then raised by parse_bodies(), or when they run. Streamed
+    tokens are not kept around, so their function bodies are always parsed.
+
+    When recover is True, parse() does not stop at the first syntax error. It
+    records it in errors, leaves None in place of the statement, and carries
+    on from the next statement that sync() finds, so that a single pass
+    reports every error along with the statements that could be parsed.
+
+    Expressions are built through a NodePool, so that equal literals are a
+    single node. When share is True, so are all equal expressions, see
+    NodePool.
+    """
+
+    def __init__(self, tokens: Sequence[Token] | Iterable[Token], lazy: bool = False,
+                 recover: bool = False, share: bool = False) -> None:
+        if not isinstance(tokens, Sequence):
+            tokens = TokenStream(tokens)
+            lazy = False
         self.tokens = tokens
         self.current = 0
+        self.lazy = lazy
+        self.recover = recover
+        self.errors: list[ParseException] = []
+        self.pool = NodePool(share)
 
     def parse(self) -> list[Statement]:
-        statements = []
+        return list(self.iter_parse())
 
+    def iter_parse(self) -> Generator[Statement, None, None]:
+        """
+        Yields top-level statements as soon as each one is parsed, so that
+        they can run before the rest of the source is even scanned.
+        """
+        stream = isinstance(self.tokens, TokenStream)
         while not self.end:
+            if self.errors and self.match_any(BLOCKS):
+                # left over from a block whose statement was abandoned
+                continue
+            if stream:
+                # nodes are only shared within a statement, to keep memory flat
+                self.pool = NodePool(self.pool.share)
             try:
-                statements.append(self.statement())
-            except ParseException:
-                statements.append(None)
+                statement = self.toplevel()
+            except ParseException as e:
                 self.sync()
-                raise
+                if not self.recover:
+                    raise
+                self.errors.append(e)
+                statement = None
+            yield statement
 
-        return statements
+    def toplevel(self) -> Statement:
+        return self.statement()
 
     def statement(self):
 
@@ -63,12 +134,12 @@ class Parser:
         keyword = self.previous
 
         if self.match(tt.NEWLINE):
-            return ReturnStmt(keyword, None)
+            return ReturnStmt(None, keyword.offset)
 
         value = self.expression()
         self.consume(tt.NEWLINE, "Expect newline after return")
 
-        return ReturnStmt(keyword, value)
+        return ReturnStmt(value, keyword.offset)
 
     def function(self):
         name = self.consume(tt.IDENTIFIER, "Expect function name")
@@ -77,8 +148,8 @@ class Parser:
         params = []
         if not self.check(tt.RPAREN):
             while True:
-                param = Variable(self.consume(tt.IDENTIFIER, "Expect parameter name"))
-                params.append(param)
+                param = self.consume(tt.IDENTIFIER, "Expect parameter name")
+                params.append(Variable(param.lexeme, param.offset))
 
                 if not self.match(tt.COMMA):
                     break
@@ -86,9 +157,16 @@ class Parser:
         self.consume(tt.RPAREN, "Expect ')' after parameters")
         self.consume(tt.COLON, "Expect ':' after function signature")
 
-        block = self.block()
+        if self.lazy:
+            block = self.skip_block()
+        else:
+            pool, self.pool = self.pool, self.pool.function()
+            try:
+                block = self.block()
+            finally:
+                self.pool = pool
 
-        return FunctionDefinition(name, params, block)
+        return FunctionDefinition(name.lexeme, params, block, name.offset)
 
     def while_stmt(self):
         condition = self.disjunction()
@@ -111,7 +189,7 @@ class Parser:
 
         if not self.end:
             self.consume(tt.NEWLINE, "Expect newline after assignment")
-        return AssignmentStatement(name, expr)
+        return AssignmentStatement(name.lexeme, expr, name.offset)
 
     def if_stmt(self):
         condition = self.disjunction()
@@ -144,119 +222,145 @@ class Parser:
 
         return Block(statements)
 
+    def skip_block(self) -> LazyBlock:
+        """Skips a block by matching its INDENT with its DEDENT"""
+        start = self.current
+        self.consume(tt.NEWLINE, "Expect newline to start block")
+        self.consume(tt.INDENT, "Expected block to be indented")
+
+        tokens, index, depth = self.tokens, self.current, 1
+        # a TokenBuffer is walked through its types, without making tokens
+        types = tokens.types if isinstance(tokens, TokenBuffer) else None
+
+        while depth:
+            type = tokens[index].type if types is None else types[index]
+            if type == tt.DEDENT:
+                depth -= 1
+            elif type == tt.INDENT:
+                depth += 1
+            elif type == tt.EOF:
+                raise ParseException("Expect end of block", tokens[index])
+            index += 1
+
+        self.current = index
+        return LazyBlock(self, start, index)
+
+    def parse_block(self, start: int) -> Block:
+        """Parses the block at start, left aside by skip_block()"""
+        parser = copy.copy(self)
+        parser.current = start
+        parser.pool = self.pool.function()
+        return parser.block()
+
+    def parse_bodies(self, statements: list[Statement]) -> None:
+        """
+        Parses the function bodies skipped among statements, and the ones
+        skipped inside them, so that their syntax errors are raised now.
+        """
+        pending = list(statements)
+
+        while pending:
+            match pending.pop():
+                case FunctionDefinition(_, _, block):
+                    # reading the statements of a LazyBlock parses them
+                    pending.extend(block.statements)
+                case Block(statements):
+                    pending.extend(statements)
+                case IfStmt(_, block, elif_stmt, else_block):
+                    pending.extend(node for node in (block, elif_stmt, else_block) if node)
+                case WhileStmt(_, block, else_block):
+                    pending.extend(node for node in (block, else_block) if node)
+
     def expr_stmt(self):
         expr = self.disjunction()
         if not self.end:
             self.consume(tt.NEWLINE, "Syntax error")
         return ExpressionStatement(expr)
 
-    def disjunction(self):
-        expr = self.conjunction()
-
-        while self.match(tt.OR):
-            operator = self.previous
-            right = self.conjunction()
-            expr = Logical(expr, operator, right)
-
-        return expr
-
-    def conjunction(self):
-        expr = self.expression()
-
-        while self.match(tt.AND):
-            operator = self.previous
-            right = self.expression()
-            expr = Logical(expr, operator, right)
-
-        return expr
+    def disjunction(self) -> Expression:
+        return self.precedence(OR)
 
     def expression(self) -> Expression:
-        expr = self.ternary()
-
-        exprs = []
-        while self.match(tt.COMMA):
-            exprs.append(self.ternary())
-
-        if exprs:
-            exprs.insert(0, expr)
-            return CommaExpression(exprs)
-        else:
-            return expr
-
-    def ternary(self) -> Expression:
-        expr = self.equality()
-
-        if self.match(tt.IF):
-            if_ = self.previous
-            condition = self.equality()
-
-            if self.match(tt.ELSE):
-                else_ = self.previous
-                right = self.equality()
-                expr = Ternary(expr, if_, condition, else_, right)
-
-        return expr
-
-    def left_assoc(self, higher_precedence, *types):
-        expr = higher_precedence()
-
-        while self.match(*types):
-            operator = self.previous
-            right = higher_precedence()
-
-            expr = Binary(expr, operator, right)
-
-        return expr
-
-    def equality(self) -> Expression:
-        return self.left_assoc(self.comparison, tt.NEQUAL, tt.EQUAL)
-
-    def comparison(self):
-        return self.left_assoc(self.term, tt.GREATER, tt.GEQUAL, tt.LESSER, tt.LEQUAL)
-
-    def term(self) -> Expression:
-        return self.left_assoc(self.factor, tt.MINUS, tt.PLUS)
+        return self.precedence(COMMA)
 
-    def factor(self) -> Expression:
-        return self.left_assoc(self.unary, tt.SLASH, tt.STAR)
+    def precedence(self, power: int) -> Expression:
+        """
+        Parses an expression whose operators all bind at least as tightly as
+        power, climbing up the BINDING table in a single loop.
 
-    def unary(self):
+        Binary operators are left associative. Commas collect their operands,
+        which may be ternaries, in a single CommaExpression. A ternary only
+        ever follows an operand made of equality or tighter operators, and
+        binds at most once: 'a if b' without an else leaves just a.
+        """
+        expr = self.prefix()
+        # whether expr is made of equality or tighter operators only
+        tight = True
+
+        while True:
+            operator = self.peek()
+            binding = BINDING[operator.type]
+            if binding < power:
+                return expr
+
+            if binding == TERNARY:
+                if not tight:
+                    return expr
+
+                self.advance()
+                condition = self.precedence(EQUALITY)
+                if self.match(tt.ELSE):
+                    right = self.precedence(EQUALITY)
+                    expr = self.pool.intern(Ternary(expr, condition, right, operator.offset))
+                tight = False
+                continue
 
-        if self.match(tt.BANG, tt.MINUS):
+            self.advance()
+            if binding == COMMA:
+                exprs = [expr, self.precedence(TERNARY)]
+                while self.match(tt.COMMA):
+                    exprs.append(self.precedence(TERNARY))
+                expr = self.pool.intern(CommaExpression(exprs))
+                tight = False
+            elif binding < COMMA:
+                # or takes and operands, and takes comma operands
+                right = self.precedence(binding + 1)
+                expr = self.pool.intern(Logical(expr, operator.type, right, operator.offset))
+                tight = False
+            else:
+                right = self.precedence(binding + 1)
+                expr = self.pool.intern(Binary(expr, operator.type, right, operator.offset))
+
+    def prefix(self) -> Expression:
+        if self.match_any(UNARY):
             operator = self.previous
-            right = self.unary()
+            return self.pool.intern(Unary(operator.type, self.prefix(), operator.offset))
 
-            return Unary(operator, right)
-
-        return self.call()
-
-    def call(self) -> Expression:
         expr = self.primary()
 
-        while self.match(tt.LPAREN):
+        # a single call, directly on a primary
+        if self.match(tt.LPAREN):
             args = self.expression() if not self.check(tt.RPAREN) else None
-
             paren = self.consume(tt.RPAREN, "Expect ')' after arguments.")
-
-            return Call(expr, paren, args)
+            return self.pool.intern(Call(expr, args, paren.offset))
 
         return expr
 
     def primary(self):
         if self.match(tt.FALSE):
-            return Literal(False)
+            return self.pool.literal(False)
         elif self.match(tt.TRUE):
-            return Literal(True)
+            return self.pool.literal(True)
         elif self.match(tt.NONE):
-            return Literal(None)
-        elif self.match(tt.NUMBER, tt.STRING):
-            return Literal(self.previous.literal)
+            return self.pool.literal(None)
+        elif self.match_any(LITERAL):
+            return self.pool.literal(self.previous.literal)
         elif self.match(tt.LPAREN):
             expr = self.expression()
             self.consume(tt.RPAREN, "Expect ')' after expression.")
-            return Grouping(expr)
+            return self.pool.intern(Grouping(expr))
         elif self.match(tt.IDENTIFIER):
-            return Variable(self.previous)
+            return self.pool.intern(Variable(self.previous.lexeme, self.previous.offset))
 
         raise ParseException("Expression expected.", self.peek())
 
@@ -270,6 +374,16 @@ class Parser:
 
         return False
 
+    def match_any(self, types: int) -> bool:
+        """
+        Same as match, for a bitset of types built once with bitset().
+        """
+        if 1 << self.peek().type & types:
+            self.advance()
+            return True
+
+        return False
+
     def sync(self):
         self.advance()
 
@@ -277,7 +391,7 @@ class Parser:
             if self.previous.type == tt.NEWLINE:
                 return
 
-            if self.match(tt.CLASS, tt.DEF, tt.FOR, tt.IF, tt.WHILE, tt.RETURN):
+            if self.match_any(SYNC):
                 return
 
             self.advance()
@@ -316,3 +430,226 @@ class Parser:
     @property
     def previous(self):
         return self.tokens[self.current - 1]
+
+
+class StackParser(Parser):
+    """
+    A Parser for arbitrarily nested code, that builds the same statements in
+    constant Python stack.
+
+    Its rules are generators that yield the rules they need instead of
+    calling them, and receive what those return. run() keeps the pending
+    rules on an explicit stack, so nesting only costs memory, not frames.
+    """
+
+    def toplevel(self) -> Statement:
+        return self.run(self.statement())
+
+    def parse_block(self, start: int) -> Block:
+        parser = copy.copy(self)
+        parser.current = start
+        parser.pool = self.pool.function()
+        return parser.run(parser.block())
+
+    def run(self, rule: Generator) -> Statement | Expression:
+        """
+        Runs rule, and the rules it yields, and returns what it returns. An
+        error raised by a rule is thrown into the rule that yielded it, as it
+        would propagate through calls, so that rules can clean up in finally
+        blocks.
+        """
+        stack = [rule]
+        value = error = None
+
+        while stack:
+            try:
+                if error is None:
+                    rule = stack[-1].send(value)
+                else:
+                    rule = stack[-1].throw(error)
+            except StopIteration as stop:
+                stack.pop()
+                value, error = stop.value, None
+            except Exception as e:
+                stack.pop()
+                if not stack:
+                    raise
+                error = e
+            else:
+                stack.append(rule)
+                value = error = None
+
+        return value
+
+    def statement(self):
+
+        if self.check(tt.IDENTIFIER) and self.check(tt.ASSIGN, lookahead=True):
+            return (yield self.assignment())
+        elif self.match(tt.IF):
+            return (yield self.if_stmt())
+        elif self.match(tt.WHILE):
+            return (yield self.while_stmt())
+        elif self.match(tt.DEF):
+            return (yield self.function())
+        elif self.match(tt.RETURN):
+            return (yield self.return_stmt())
+
+        return (yield self.expr_stmt())
+
+    def return_stmt(self):
+        keyword = self.previous
+
+        if self.match(tt.NEWLINE):
+            return ReturnStmt(None, keyword.offset)
+
+        value = yield self.expression()
+        self.consume(tt.NEWLINE, "Expect newline after return")
+
+        return ReturnStmt(value, keyword.offset)
+
+    def function(self):
+        name = self.consume(tt.IDENTIFIER, "Expect function name")
+        self.consume(tt.LPAREN, "Expect '(' after function name")
+
+        params = []
+        if not self.check(tt.RPAREN):
+            while True:
+                param = self.consume(tt.IDENTIFIER, "Expect parameter name")
+                params.append(Variable(param.lexeme, param.offset))
+
+                if not self.match(tt.COMMA):
+                    break
+
+        self.consume(tt.RPAREN, "Expect ')' after parameters")
+        self.consume(tt.COLON, "Expect ':' after function signature")
+
+        if self.lazy:
+            block = self.skip_block()
+        else:
+            pool, self.pool = self.pool, self.pool.function()
+            try:
+                block = yield self.block()
+            finally:
+                self.pool = pool
+
+        return FunctionDefinition(name.lexeme, params, block, name.offset)
+
+    def while_stmt(self):
+        condition = yield self.disjunction()
+
+        self.consume(tt.COLON, "expect ':' after while condition")
+
+        block = yield self.block()
+
+        else_block = None
+        if self.match(tt.ELSE):
+            else_block = yield self.else_block()
+
+        return WhileStmt(condition, block, else_block)
+
+    def assignment(self):
+        name = self.consume(tt.IDENTIFIER, "expect var name")
+
+        if self.match(tt.ASSIGN):
+            expr = yield self.expression()
+
+        if not self.end:
+            self.consume(tt.NEWLINE, "Expect newline after assignment")
+        return AssignmentStatement(name.lexeme, expr, name.offset)
+
+    def if_stmt(self):
+        condition = yield self.disjunction()
+
+        self.consume(tt.COLON, "expected ':' after if condition")
+
+        block = yield self.block()
+
+        if self.match(tt.ELIF):
+            elif_stmt = yield self.if_stmt()
+            return IfStmt(condition, block, elif_stmt=elif_stmt)
+        elif self.match(tt.ELSE):
+
+            else_block = yield self.else_block()
+            return IfStmt(condition, block, else_block=else_block)
+        else:
+            return IfStmt(condition, block)
+
+    def else_block(self):
+        self.consume(tt.COLON, "expected ':' after if condition")
+        return (yield self.block())
+
+    def block(self):
+        self.consume(tt.NEWLINE, "Expect newline to start block")
+        self.consume(tt.INDENT, "Expected block to be indented")
+
+        statements = []
+        while not self.match(tt.DEDENT):
+            statements.append((yield self.statement()))
+
+        return Block(statements)
+
+    def expr_stmt(self):
+        expr = yield self.disjunction()
+        if not self.end:
+            self.consume(tt.NEWLINE, "Syntax error")
+        return ExpressionStatement(expr)
+
+    def precedence(self, power: int):
+        expr = yield self.prefix()
+        tight = True
+
+        while True:
+            operator = self.peek()
+            binding = BINDING[operator.type]
+            if binding < power:
+                return expr
+
+            if binding == TERNARY:
+                if not tight:
+                    return expr
+
+                self.advance()
+                condition = yield self.precedence(EQUALITY)
+                if self.match(tt.ELSE):
+                    right = yield self.precedence(EQUALITY)
+                    expr = self.pool.intern(Ternary(expr, condition, right, operator.offset))
+                tight = False
+                continue
+
+            self.advance()
+            if binding == COMMA:
+                exprs = [expr, (yield self.precedence(TERNARY))]
+                while self.match(tt.COMMA):
+                    exprs.append((yield self.precedence(TERNARY)))
+                expr = self.pool.intern(CommaExpression(exprs))
+                tight = False
+            elif binding < COMMA:
+                right = yield self.precedence(binding + 1)
+                expr = self.pool.intern(Logical(expr, operator.type, right, operator.offset))
+                tight = False
+            else:
+                right = yield self.precedence(binding + 1)
+                expr = self.pool.intern(Binary(expr, operator.type, right, operator.offset))
+
+    def prefix(self):
+        if self.match_any(UNARY):
+            operator = self.previous
+            right = yield self.prefix()
+            return self.pool.intern(Unary(operator.type, right, operator.offset))
+
+        expr = yield self.primary()
+
+        if self.match(tt.LPAREN):
+            args = (yield self.expression()) if not self.check(tt.RPAREN) else None
+            paren = self.consume(tt.RPAREN, "Expect ')' after arguments.")
+            return self.pool.intern(Call(expr, args, paren.offset))
+
+        return expr
+
+    def primary(self):
+        if self.match(tt.LPAREN):
+            expr = yield self.expression()
+            self.consume(tt.RPAREN, "Expect ')' after expression.")
+            return self.pool.intern(Grouping(expr))
+
+        return super().primary()
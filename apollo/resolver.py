@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from exc import RuntimeException
+from expression import Variable
+from statement import AssignmentStatement, Block, FunctionDefinition, Statement, children
+from tok import Token
+from tok.type import TokenType as tt
+
+
+class Scope:
+    """
+    The local variables of a function, each in a slot of its frames, and the
+    scope of the function it is defined in.
+
+    The locals of a function are its parameters, in the first slots, and the
+    names it assigns or defines anywhere in its body, outside of nested
+    functions. Any other name is looked up in the enclosing functions, then
+    in the globals and the builtins.
+    """
+
+    __slots__ = ("names", "slots", "enclosing")
+
+    def __init__(self, names: list[str], enclosing: Scope | None = None) -> None:
+        self.names = names
+        self.slots = {name: slot for slot, name in enumerate(names)}
+        self.enclosing = enclosing
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def lookup(self, name: str) -> tuple[int, int] | None:
+        """The depth and slot of name, or None if it is not local to any function"""
+        scope, depth = self, 0
+        while scope is not None:
+            slot = scope.slots.get(name)
+            if slot is not None:
+                return depth, slot
+            scope, depth = scope.enclosing, depth + 1
+        return None
+
+
+def stored(block: Block) -> list[str]:
+    """
+    Names assigned or defined by the statements of block, outside of nested
+    functions, in source order
+    """
+    names = {}
+    pending = [block]
+    while pending:
+        node = pending.pop()
+        match node:
+            case AssignmentStatement(name) | FunctionDefinition(name):
+                names[name] = None
+                continue
+            case Statement():
+                # pushed in reverse so that they are popped in source order
+                pending.extend(child for child in reversed(children(node))
+                               if isinstance(child, Statement))
+    return list(names)
+
+
+def resolve(definition: FunctionDefinition) -> Scope:
+    """
+    Gives every name of the body of definition its depth and slot, the first
+    time it is called, and returns its scope.
+
+    Functions defined in the body are only given their enclosing scope, and
+    are resolved in turn when they are first called, so that lazy bodies are
+    parsed no sooner than before. Top-level statements are never resolved:
+    their names are all globals.
+    """
+    if definition.scope is not None:
+        return definition.scope
+
+    # arguments go to the first slots, in order
+    params = [param.name for param in definition.params]
+    names = params + [name for name in stored(definition.block) if name not in params]
+    scope = Scope(names, definition.enclosing)
+
+    pending = [definition.block]
+    while pending:
+        node = pending.pop()
+        match node:
+            case FunctionDefinition(name):
+                node.slot = scope.slots[name]
+                node.enclosing = scope
+                continue
+            case AssignmentStatement(name):
+                node.slot = scope.slots[name]
+            case Variable(name):
+                location = scope.lookup(name)
+                node.depth, node.slot = location if location is not None else (0, None)
+        pending.extend(child for child in children(node) if child is not None)
+
+    definition.scope = scope
+    return scope
+
+
+def arity_error(definition: FunctionDefinition, given: int, offset: int | None) -> RuntimeException:
+    """The error of a call to definition with a wrong number of arguments, at its ')'"""
+    expected = len(definition.params)
+    message = (f"{definition.name}() takes {expected} argument{'s' if expected != 1 else ''} "
+               f"but {given} {'were' if given != 1 else 'was'} given")
+    return RuntimeException(message, Token(tt.RPAREN, ")", None, offset))
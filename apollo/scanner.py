@@ -1,5 +1,11 @@
+import os
+import re
+import sys
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
 from exc import UnexpectedCharacter, UnterminatedString
-from tok import Token
+from tok import LazyToken, Token, TokenBuffer
 from tok import TokenType as tt
 
 EOL = '\n'
@@ -27,14 +33,317 @@ KEYWORDS = {
     "import": tt.IMPORT,
 }
 
+OPERATORS = {
+    "(": tt.LPAREN,
+    ")": tt.RPAREN,
+    "{": tt.LBRACE,
+    "}": tt.RBRACE,
+    "[": tt.LBRACK,
+    "]": tt.RBRACK,
+    ",": tt.COMMA,
+    ".": tt.DOT,
+    "+": tt.PLUS,
+    "-": tt.MINUS,
+    "*": tt.STAR,
+    "/": tt.SLASH,
+    "%": tt.PERCENT,
+    ";": tt.SCOLON,
+    ":": tt.COLON,
+    "!": tt.BANG,
+    "!=": tt.NEQUAL,
+    "=": tt.ASSIGN,
+    "==": tt.EQUAL,
+    "<": tt.LESSER,
+    "<=": tt.LEQUAL,
+    ">": tt.GREATER,
+    ">=": tt.GEQUAL,
+}
+
+# Whitespace inside a line is folded into the match of the lexeme that follows
+# it, so that every match yields a token. The groups are numbered in the order
+# tokenize tests them. Comments run to the end of the input, exactly like
+# Scanner.scan_token does. IDENTIFIER is filled in per source type.
+TOKEN_REGEX = r"""
+    [ \t\r]*
+    (?:
+        (IDENTIFIER)                     # 1 keyword or identifier
+      | ([!=<>]=?|[-+*/%(){}\[\],.;:])   # 2 operator
+      | (\d+(?:\.\d+)?)                  # 3 number
+      | (\n)                             # 4 newline
+      | ("[^"]*"|'[^']*')                # 5 string
+      | (\#[\s\S]*|$)                    # 6 comment or end of input
+      | (["'])                           # 7 unterminated string
+      | (.)                              # 8 unexpected character
+    )
+"""
+
+# [^\W\d_] also accepts numeric characters that are not digits, such as ², at
+# the start of an identifier, where the char engine wants str.isalpha(), so
+# non-ASCII identifiers are checked, see check_identifier.
+TOKEN_PATTERN = re.compile(TOKEN_REGEX.replace("IDENTIFIER", r"[^\W\d_]\w*"), re.VERBOSE)
+
+# bytes patterns only know ASCII letters, so any non-ASCII byte of a UTF-8
+# sequence is accepted in identifiers, which are then checked once decoded,
+# see check_identifier.
+BYTES_TOKEN_PATTERN = re.compile(
+    TOKEN_REGEX.replace("IDENTIFIER", r"[A-Za-z\x80-\xff][\w\x80-\xff]*").encode(), re.VERBOSE)
+
+IDENTIFIER_PATTERN = re.compile(r"[^\W\d_]\w*")
+
+BYTES_KEYWORDS = {text.encode(): type for text, type in KEYWORDS.items()}
+
+BYTES_OPERATORS = {text.encode(): type for text, type in OPERATORS.items()}
+
+NAME, OPERATOR, NUMBER, NEWLINE, STRING, END, UNTERMINATED = range(1, 8)
+
+# Strings and comments, the only places where a newline does not end a line.
+# Unterminated strings and comments both run to the end of the source.
+SPAN_PATTERN = re.compile(r"""
+    "[^"]*"? | '[^']*'? | \#[\s\S]*
+""", re.VERBOSE)
+
+BYTES_SPAN_PATTERN = re.compile(SPAN_PATTERN.pattern.encode(), re.VERBOSE)
+
+
+def line_of(code: str | bytes, offset: int, first: int = 1) -> int:
+    """
+    The line of offset in code, which starts on line first. Tokens have no
+    line, so it is only counted for the message of a scanning error.
+    """
+    if isinstance(code, str):
+        return code.count(EOL, 0, offset) + first
+    if not isinstance(code, bytes):
+        # an mmap has no count
+        code = bytes(code[:offset])
+    return code.count(b"\n", 0, offset) + first
+
+
+def indentation(indents: list[int], leading: int, start: int, code: str | bytes,
+                first: int = 1):
+    """
+    Updates the indentation stack for a line starting with leading spaces,
+    and returns the INDENT or DEDENT tokens it takes to get there.
+    """
+    if leading > indents[-1]:
+        indents.append(leading)
+        return [(tt.INDENT, start - leading, start)]
+
+    tokens = []
+    while indents[-1] > leading:
+        indents.pop()
+        tokens.append((tt.DEDENT, start, start))
+
+    if indents[-1] != leading:
+        raise IndentationError("Unindent does not match any outer indentation level "
+                               f"at line {line_of(code, start, first)}.")
+
+    return tokens
+
+
+def tokenize(code: str | bytes, pos: int = 0, indents: list[int] = None,
+             after_newline: bool = False, deferred: bool = False, first: int = 1):
+    """
+    Yields (type, start, end) tuples for every token of code[pos:], one regex
+    match per lexeme. Lines are not counted.
+
+    The indentation rules mirror Scanner.scan_token: spaces are only counted
+    at the start of a line, and INDENT/DEDENT tokens are emitted right before
+    the first token that follows a NEWLINE. An INDENT spans its width in
+    spaces, ending where the token that triggered it starts.
+
+    Scanning can resume in the middle of a source: pass the indentation
+    stack and whether the last token was a NEWLINE.
+
+    code may also be any bytes-like object, such as an mmap, in which case it
+    is scanned as UTF-8 without being decoded. first is the line code starts
+    on, when it is a chunk of a larger source, for the messages of errors.
+
+    With deferred, the indentation stack is left alone: every line start is
+    reported as a (None, start, leading spaces) tuple instead, and no DEDENT
+    is emitted before the EOF.
+    """
+    if indents is None:
+        indents = [0]
+
+    if isinstance(code, str):
+        pattern, keywords, operators, space = TOKEN_PATTERN, KEYWORDS, OPERATORS, " "
+    else:
+        pattern, keywords, operators, space = (
+            BYTES_TOKEN_PATTERN, BYTES_KEYWORDS, BYTES_OPERATORS, b" ")
+
+    identifier, newline = tt.IDENTIFIER, tt.NEWLINE
+
+    for m in pattern.finditer(code, pos):
+        kind = m.lastindex
+        start, pos = m.span(kind)
+
+        if kind == NAME:
+            name = m.group(kind)
+            type = keywords.get(name, identifier)
+            if not name.isascii():
+                check_identifier(name, line_of(code, start, first))
+        elif kind == OPERATOR:
+            type = operators[m.group(kind)]
+        elif kind == NUMBER:
+            type = tt.NUMBER
+        elif kind == NEWLINE:
+            type = newline
+        elif kind == STRING:
+            type = tt.STRING
+        elif kind == END:
+            # the closing tokens go where a trailing comment starts
+            pos = start
+            break
+        elif kind == UNTERMINATED:
+            raise UnterminatedString(
+                f"String started on line {line_of(code, start, first)} is unterminated on line "
+                f"{line_of(code, len(code), first)}.")
+        else:
+            char = m.group(kind)
+            if not isinstance(char, str):
+                char = char.decode(errors="replace")
+            raise UnexpectedCharacter(f"Unexpected character {char} at line {line_of(code, start, first)}.")
+
+        if after_newline:
+            leading = m.group()[:start - m.start()].count(space)
+            if deferred:
+                yield None, start, leading
+            elif leading != indents[-1]:
+                yield from indentation(indents, leading, start, code, first)
+
+        yield type, start, pos
+
+        after_newline = type is newline
+
+    if not deferred:
+        for indent in indents:
+            if indent > 0:
+                yield tt.DEDENT, pos, pos
+
+    yield tt.EOF, pos, pos
+
+
+def check_identifier(name: str | bytes, line: int) -> None:
+    """
+    Raises for a non-ASCII identifier that the char engine would not scan
+    whole, at the first character it would stop at, as it would: one that
+    does not start with a letter, or matched in bytes but not by the str
+    pattern.
+    """
+    text = name if isinstance(name, str) else name.decode(errors="replace")
+    match = IDENTIFIER_PATTERN.match(text) if text[0].isalpha() else None
+    end = match.end() if match else 0
+    if end < len(text):
+        raise UnexpectedCharacter(f"Unexpected character {text[end]} at line {line}.")
+
+
+def make_token(code: str, type: tt, start: int, end: int) -> Token:
+    """Builds the Token for a (type, start, end) tuple of tokenize"""
+    if type is tt.STRING:
+        text = code[start:end]
+        return Token(type, text, text[1:-1], offset=start)
+    elif type is tt.NUMBER:
+        text = code[start:end]
+        return Token(type, text, float(text) if "." in text else int(text), offset=start)
+    elif type is tt.INDENT:
+        return Token(type, " " * (end - start), offset=start)
+    elif type is tt.IDENTIFIER:
+        return Token(type, sys.intern(code[start:end]), offset=start)
+    elif start == end:
+        return Token(type, offset=start)
+    return Token(type, code[start:end], offset=start)
+
+
+def split_lines(code: str | bytes, parts: int) -> list[int]:
+    """
+    Returns the offsets at which code can be cut into about `parts` chunks of
+    whole lines, so that no cut falls inside a string or after a comment.
+    The first offset is always 0.
+    """
+    spans = (SPAN_PATTERN if isinstance(code, str) else BYTES_SPAN_PATTERN).finditer(code)
+    eol = EOL if isinstance(code, str) else b"\n"
+    size = max(1, len(code) // parts)
+    span = next(spans, None)
+    cuts = [0]
+
+    target = size
+    while target < len(code):
+        newline = code.find(eol, target)
+        if newline < 0:
+            break
+
+        while span is not None and span.end() <= newline:
+            span = next(spans, None)
+
+        if span is not None and span.start() < newline:
+            # inside a string or a comment, try again after it
+            target = span.end()
+            continue
+
+        if newline + 1 < len(code):
+            cuts.append(newline + 1)
+        target = max(newline + 1, cuts[-1] + size)
+
+    return cuts
+
+
+def scan_chunk(chunk: str | bytes, base: int, line: int, after_newline: bool, offset: str):
+    """
+    Scans a chunk of lines, starting on line, for Scanner.scan_parallel.
+    Returns TokenBuffer columns without INDENT, DEDENT or EOF tokens, a
+    (token index, start, leading spaces) mark for the first token of every
+    line that is not indented like the line before, and the offset the chunk
+    ends on.
+    """
+    types, starts, ends = array("B"), array(offset), array(offset)
+    marks = []
+    previous = None
+
+    for type, start, end in tokenize(chunk, after_newline=after_newline, deferred=True,
+                                     first=line):
+        if type is None:
+            if end != previous:
+                marks.append((len(types), base + start, end))
+                previous = end
+            continue
+
+        types.append(type)
+        starts.append(base + start)
+        ends.append(base + end)
+
+    # drop the EOF
+    types.pop()
+    ends.pop()
+    end = starts.pop()
+
+    return types, starts, ends, marks, end
+
 
 class Scanner:
-    def __init__(self, code: str) -> None:
+    """
+    Turns source code into a list of tokens.
+
+    Two engines produce the same tokens: "char" dispatches on one character at
+    a time, "regex" matches whole lexemes with TOKEN_PATTERN. The regex engine
+    can also scan UTF-8 bytes, such as an mmap of a file, and then yields
+    LazyTokens that decode their lexemes only when asked to. It is the
+    default for bytes, the char engine is the default for str.
+    """
+
+    ENGINES = ("char", "regex")
+
+    def __init__(self, code: str | bytes, engine: str = None) -> None:
+        if engine is None:
+            engine = "char" if isinstance(code, str) else "regex"
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown scanner engine {engine!r}")
+        if engine == "char" and not isinstance(code, str):
+            raise ValueError("The char engine can only scan str")
         self.code = code
+        self.engine = engine
         self.tokens : list[Token] = []
         self.start = 0
         self.current = 0
-        self.line = 1
         self.leading_spaces = 0
         self.indents = [0]
 
@@ -71,12 +380,12 @@ class Scanner:
             case '\r' | '\t' : ...
             case '\n':
                 self.add_token(tt.NEWLINE)
-                self.line += 1
                 self.leading_spaces = 0
             case '"' | "'" as quote: self.add_token(tt.STRING, self.string(quote))
             case c if c.isdecimal(): self.add_token(tt.NUMBER, self.number())
             case c if c.isalpha(): self.add_token(self.keyword_identifier())
-            case _: raise UnexpectedCharacter(f"Unexpected character {c} at line {self.line}.")
+            case _: raise UnexpectedCharacter(
+                f"Unexpected character {c} at line {line_of(self.code, self.start)}.")
 
     def match(self, expected):
         """Returns True if the next char is equal to expected"""
@@ -87,15 +396,13 @@ class Scanner:
         return False
 
     def string(self, quote):
-        start_line = self.line
         while (char := self.peek()) and char != quote:
-            if char == EOL:
-                self.line += 1
             self.advance()
 
         if self.end:
             raise UnterminatedString(
-                f"String started on line {start_line} is unterminated on line {self.line}.")
+                f"String started on line {line_of(self.code, self.start)} is unterminated "
+                f"on line {line_of(self.code, self.current)}.")
 
         self.advance()
 
@@ -135,9 +442,9 @@ class Scanner:
         if self.tokens:
             return self.tokens[-1]
 
-    def peek_next(self) -> None | str:
+    def peek_next(self) -> str:
         idx = self.current + 1
-        return None if idx >= len(self.code) else self.code[idx]
+        return "" if idx >= len(self.code) else self.code[idx]
 
     def advance(self):
         c = self.code[self.current]
@@ -146,12 +453,14 @@ class Scanner:
 
     def add_token(self, type, literal=None):
         text = self.code[self.start: self.current]
+        if type is tt.IDENTIFIER:
+            text = sys.intern(text)
 
         # Figure out the indentation
         if self.previous and self.previous.type == tt.NEWLINE:
             self.resolve_indentation_level()
 
-        self.tokens.append(Token(type, self.line, text, literal))
+        self.tokens.append(Token(type, text, literal, offset=self.start))
 
 
     def resolve_indentation_level(self):
@@ -159,32 +468,140 @@ class Scanner:
         if self.indents[-1] == self.leading_spaces:
             return
         elif self.indents[-1] < self.leading_spaces:
-            self.tokens.append(Token(tt.INDENT, self.line, " "*self.leading_spaces))
+            self.tokens.append(Token(tt.INDENT, " "*self.leading_spaces,
+                                     offset=self.start - self.leading_spaces))
             self.indents.append(self.leading_spaces)
             return
 
         while self.indents[-1] > self.leading_spaces:
             self.indents.pop()
-            self.tokens.append(Token(tt.DEDENT, self.line))
+            self.tokens.append(Token(tt.DEDENT, offset=self.start))
 
         if self.indents[-1] != self.leading_spaces:
-            raise IndentationError
+            raise IndentationError("Unindent does not match any outer indentation level "
+                                   f"at line {line_of(self.code, self.start)}.")
 
 
         self.leading_spaces = 0
 
     def scan_tokens(self):
+        if self.engine == "regex":
+            self.tokens.extend(self.regex_tokens())
+            return self.tokens
+
         while not self.end:
             self.start = self.current
             self.scan_token()
 
+        self.add_closing_tokens()
+        return self.tokens
+
+    def iter_tokens(self):
+        """
+        Yields the tokens as they are scanned instead of collecting them, so
+        that a Parser can consume them while the rest of the source is
+        still being scanned. Only the last token is kept around.
+        """
+        if self.engine == "regex":
+            yield from self.regex_tokens()
+            return
+
+        seen = 0
+        while not self.end:
+            self.start = self.current
+            self.scan_token()
+            yield from self.tokens[seen:]
+            del self.tokens[:-1]
+            seen = len(self.tokens)
+
+        self.add_closing_tokens()
+        yield from self.tokens[seen:]
+        del self.tokens[:-1]
+
+    def add_closing_tokens(self):
+        # the closing tokens go where a trailing comment starts
+        end = self.start if self.code.startswith("#", self.start) else self.current
+
         for indent in self.indents:
             if indent > 0:
-                self.tokens.append(Token(tt.DEDENT, self.line))
+                self.tokens.append(Token(tt.DEDENT, offset=end))
 
-        self.tokens.append(Token(tt.EOF, self.line))
-        return self.tokens
+        self.tokens.append(Token(tt.EOF, offset=end))
 
     @property
     def end(self):
         return self.current >= len(self.code)
+
+    def regex_tokens(self):
+        code = self.code
+
+        if not isinstance(code, str):
+            for type, start, end in tokenize(code, indents=self.indents):
+                yield LazyToken(type, code, start, end)
+
+            self.current = len(code)
+            return
+
+        for type, start, end in tokenize(code, indents=self.indents):
+            yield make_token(code, type, start, end)
+
+        self.current = len(code)
+
+    def scan_buffer(self) -> TokenBuffer:
+        """
+        Scans the source into a compact TokenBuffer instead of a list of
+        tokens. The char engine scans a list first, whose tokens are then
+        stored in the buffer.
+        """
+        buffer = TokenBuffer(self.code)
+        if self.engine == "char":
+            buffer.extend((token.type, token.offset, token.offset + len(token.lexeme or ""))
+                          for token in self.scan_tokens())
+            return buffer
+        buffer.extend(tokenize(self.code, indents=self.indents))
+        self.current = len(self.code)
+        return buffer
+
+    def scan_parallel(self, workers: int = None, chunk_size: int = 1 << 20) -> TokenBuffer:
+        """
+        Scans the source into a TokenBuffer with a pool of worker processes.
+
+        The source is cut into chunks of whole lines that the workers scan
+        independently. The indentation of the first token of each line is
+        then resolved here, in order, to insert the INDENT and DEDENT tokens
+        at chunk seams.
+        """
+        code = self.code
+        workers = workers or os.cpu_count()
+        cuts = split_lines(code, max(1, min(workers * 4, len(code) // chunk_size)))
+        if workers == 1 or len(cuts) == 1:
+            return self.scan_buffer()
+
+        buffer = TokenBuffer(code)
+        offset = buffer.starts.typecode
+        eol = EOL if isinstance(code, str) else b"\n"
+
+        with ProcessPoolExecutor(workers) as pool:
+            futures = []
+            line = 1
+            for start, end in zip(cuts, cuts[1:] + [len(code)]):
+                chunk = code[start:end]
+                futures.append(pool.submit(scan_chunk, chunk, start, line, start > 0, offset))
+                line += chunk.count(eol)
+
+            for future in futures:
+                types, starts, ends, marks, end = future.result()
+                first = 0
+                for index, start, leading in marks:
+                    buffer.extend_columns(types[first:index], starts[first:index], ends[first:index])
+                    first = index
+                    if leading != self.indents[-1]:
+                        buffer.extend(indentation(self.indents, leading, start, code))
+
+                buffer.extend_columns(types[first:], starts[first:], ends[first:])
+
+        buffer.extend((tt.DEDENT, end, end) for indent in self.indents if indent > 0)
+        buffer.extend([(tt.EOF, end, end)])
+
+        self.current = len(code)
+        return buffer
@@ -1,33 +1,46 @@
 from __future__ import annotations
 
 import abc
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import TYPE_CHECKING, Callable, Iterator
 
-from expression import Expression
-from tok import Token
+from expression import (Binary, Call, CommaExpression, Expression, Grouping, Logical, Ternary,
+                        Unary, Variable)
+
+if TYPE_CHECKING:
+    from resolver import Scope
 
 
 class Statement(abc.ABC):
-    pass
+    __slots__ = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class ExpressionStatement(Statement):
     expr: Expression
 
 
-@dataclass
+@dataclass(slots=True)
 class AssignmentStatement(Statement):
-    name: Token
+    # interned, as stored in environments
+    name: str
     expr: Expression
+    offset: int | None = field(default=None, compare=False)
+    # the local slot of name, set by the resolver, or None for a global
+    slot: int | None = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.name = sys.intern(self.name)
 
 
-@dataclass
+@dataclass(slots=True)
 class Block(Statement):
     statements: list[Statement]
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt(Statement):
     condition: Expression
     block: Block
@@ -35,26 +48,94 @@ class IfStmt(Statement):
     else_block: None | ElseBlock = None
 
 
+class LazyBlock(Block):
+    """
+    A function body that has not been parsed yet, see Parser(lazy=True). Its
+    tokens go from start, the NEWLINE before it, to end, after its DEDENT.
+    The statements are parsed the first time they are read.
+    """
+
+    def __init__(self, parser, start: int, end: int) -> None:
+        self.parser = parser
+        self.start = start
+        self.end = end
+
+    @cached_property
+    def statements(self) -> list[Statement]:
+        return self.parser.parse_block(self.start).statements
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Block):
+            return NotImplemented
+        return self.statements == other.statements
+
+    def __repr__(self) -> str:
+        return f"LazyBlock(start={self.start}, end={self.end})"
+
+
 ElifStmt = IfStmt
 
 ElseBlock = Block
 
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt(Statement):
     condition: Expression
     block: Block
     else_block: None | ElseBlock = None
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionDefinition(Statement):
-    name: Token
-    params: list[Token]
+    # interned, as stored in environments
+    name: str
+    params: list[Variable]
     block: Block
+    offset: int | None = field(default=None, compare=False)
+    # the block compiled by the closure backend the first time it ran
+    compiled: Callable | None = field(default=None, compare=False, repr=False)
+    # set by the resolver: the local slot of name, or None for a global, the
+    # scope of the function it is defined in, and its own once it was resolved
+    slot: int | None = field(default=None, compare=False, repr=False)
+    enclosing: Scope | None = field(default=None, compare=False, repr=False)
+    scope: Scope | None = field(default=None, compare=False, repr=False)
 
+    def __post_init__(self) -> None:
+        self.name = sys.intern(self.name)
 
-@dataclass
+
+@dataclass(slots=True)
 class ReturnStmt(Statement):
-    keyword: Token
+    """A return statement, at the offset of 'return'"""
+
     value: Expression | None = None
+    offset: int | None = field(default=None, compare=False)
+
+
+def children(node) -> list:
+    """The nodes directly under node, in source order, None where one is missing"""
+    match node:
+        case Binary(left, _, right) | Logical(left, _, right): return [left, right]
+        case Unary(_, right): return [right]
+        case Grouping(expr) | ExpressionStatement(expr) | AssignmentStatement(_, expr):
+            return [expr]
+        case Ternary(left, condition, right): return [left, condition, right]
+        case Call(callee, args): return [callee, args]
+        case CommaExpression(exprs): return exprs
+        case Block(statements): return statements
+        case IfStmt(condition, block, elif_stmt, else_block):
+            return [condition, block, elif_stmt, else_block]
+        case WhileStmt(condition, block, else_block): return [condition, block, else_block]
+        case FunctionDefinition(_, params, block): return [*params, block]
+        case ReturnStmt(value): return [value]
+    return []
+
+
+def walk(node) -> Iterator:
+    """Yields node and every node under it, without recursing"""
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        if node is not None:
+            yield node
+            pending.extend(children(node))
@@ -0,0 +1,341 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from parser import Parser
+from typing import NamedTuple
+
+from apoc import typecode
+from checker import find_scripts
+from exc import UnexpectedCharacter, UnterminatedString
+from expression import Call, Variable
+from scanner import Scanner
+from statement import AssignmentStatement, FunctionDefinition, children
+from tok import LineTable
+
+MAGIC = b"APSX"
+VERSION = 1
+
+# magic, version, little endian, number of strings, files and symbols
+HEADER = struct.Struct("<4sBBIII")
+# path, mtime in ns, size and hash of every indexed file
+FILE = struct.Struct("<IQQ32s")
+
+KINDS = ("function", "parameter", "assignment", "call")
+FUNCTION, PARAMETER, ASSIGNMENT, CALL = range(len(KINDS))
+
+INDEX_NAME = ".apollo-index"
+
+
+class Symbol(NamedTuple):
+    """A name defined, bound or called in a script"""
+
+    kind: str
+    name: str
+    path: str
+    line: int
+    column: int
+    scope: str | None  # dotted name of the enclosing function
+
+
+class Source(NamedTuple):
+    """An indexed file, as it was when it was indexed"""
+
+    mtime: int  # in ns
+    size: int
+    digest: bytes  # sha256 of its bytes
+    symbols: list[tuple]  # (kind, name, line, column, scope)
+
+
+def collect(code: str, engine: str = "regex") -> list[tuple]:
+    """
+    The (kind, name, line, column, scope) of every symbol of code, in
+    source order. Syntax errors are skipped over, so a script that does not
+    parse still has its other statements indexed, but a script that does not
+    scan has no symbols.
+    """
+    try:
+        tokens = Scanner(code, engine=engine).scan_tokens()
+    except (UnexpectedCharacter, UnterminatedString, IndentationError):
+        return []
+
+    lines = LineTable(code)
+    symbols = []
+
+    def add(kind, name, offset, scope):
+        line, column = lines.position(offset)
+        symbols.append((kind, name, line, column, scope))
+
+    # nodes are pushed in reverse so that they are popped in source order
+    stack = [(statement, None) for statement in reversed(Parser(tokens, recover=True).parse())]
+    while stack:
+        node, scope = stack.pop()
+        if node is None:
+            continue
+
+        match node:
+            case FunctionDefinition(name, params, block):
+                add(FUNCTION, name, node.offset, scope)
+                scope = f"{scope}.{name}" if scope else name
+                for param in params:
+                    add(PARAMETER, param.name, param.offset, scope)
+                stack.append((block, scope))
+                continue
+            case AssignmentStatement(name):
+                add(ASSIGNMENT, name, node.offset, scope)
+            case Call(Variable(name) as callee):
+                add(CALL, name, callee.offset, scope)
+
+        stack.extend((child, scope) for child in reversed(children(node)))
+
+    return symbols
+
+
+def index_file(path: str, engine: str = "regex") -> Source:
+    """The Source of the script at path, with no symbols if it is not UTF-8"""
+    with open(path, "rb") as f:
+        data = f.read()
+        stat = os.fstat(f.fileno())
+    try:
+        symbols = collect(data.decode(), engine)
+    except UnicodeDecodeError:
+        symbols = []
+    return Source(stat.st_mtime_ns, len(data), hashlib.sha256(data).digest(), symbols)
+
+
+class SymbolIndex:
+    """
+    Persistent index of the functions, parameters, assignments and calls of
+    the .apo scripts under a directory, by name.
+
+    The index is a single file. It starts with a sorted table of the strings
+    it refers to, then the mtime, size and hash of every file, then the
+    symbols sorted by name, stored column-wise in arrays of the smallest type
+    that fits. A lookup only has to load the arrays and binary search the
+    column of names, without building anything for the other symbols.
+
+    update() parses again only the files whose size or mtime changed, or
+    every file whose hash changed with the "hash" validation, and drops the
+    files that were removed. A file that was touched but not changed is not
+    parsed again.
+    """
+
+    def __init__(self, directory: str, path: str = None, validation: str = "mtime") -> None:
+        self.directory = directory
+        self.path = path if path is not None else os.path.join(directory, INDEX_NAME)
+        self.validation = validation
+        self.strings: list[str] = []
+        self.files: list[str] = []  # paths relative to directory
+        self.stats: list[tuple[int, int, bytes]] = []  # mtime, size and hash of each file
+        self.sources: dict[str, Source] = {}
+        self.columns: tuple[array, ...] = tuple(array("B") for _ in range(6))
+        self.parsed = 0
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.columns[0])
+
+    def load(self) -> bool:
+        """Reads the index file, and returns False if it is missing or unreadable"""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+
+        try:
+            self.decode(data)
+        except (struct.error, ValueError, UnicodeDecodeError, IndexError):
+            self.strings, self.files, self.stats, self.sources = [], [], [], {}
+            self.columns = tuple(array("B") for _ in range(6))
+            return False
+        return True
+
+    def decode(self, data: bytes) -> None:
+        magic, version, little, strings, files, symbols = HEADER.unpack_from(data)
+        if (magic, version, little) != (MAGIC, VERSION, sys.byteorder == "little"):
+            raise ValueError("not an index of this version")
+        position = HEADER.size
+
+        codes = data[position:position + 6].decode()
+        position += 6
+        lengths = array(codes[0])
+        lengths.frombytes(data[position:position + strings * lengths.itemsize])
+        position += strings * lengths.itemsize
+        table = []
+        for length in lengths:
+            table.append(data[position:position + length].decode())
+            position += length
+
+        # the sources are only decoded by update()
+        self.sources = {}
+        self.files = []
+        self.stats = []
+        for _ in range(files):
+            path, mtime, size, digest = FILE.unpack_from(data, position)
+            position += FILE.size
+            self.files.append(table[path])
+            self.stats.append((mtime, size, digest))
+
+        columns = []
+        for code in codes[1:] + "B":
+            column = array(code)
+            column.frombytes(data[position:position + symbols * column.itemsize])
+            position += symbols * column.itemsize
+            columns.append(column)
+        # the kinds are last, as they are always bytes
+        self.columns = (columns[-1], *columns[:-1])
+        if position != len(data) or any(len(column) != symbols for column in self.columns):
+            raise ValueError("truncated index")
+        self.strings = table
+
+    def lookup(self, name: str, kind: str = None) -> list[Symbol]:
+        """The symbols called name, of the given kind if any, by file and position"""
+        strings = self.strings
+        index = bisect_left(strings, name)
+        if index == len(strings) or strings[index] != name:
+            return []
+
+        kinds, names, files, lines, columns, scopes = self.columns
+        start, end = bisect_left(names, index), bisect_right(names, index)
+        wanted = KINDS.index(kind) if kind is not None else None
+        return [
+            Symbol(KINDS[kinds[i]], name, os.path.join(self.directory, self.files[files[i]]),
+                   lines[i], columns[i], strings[scopes[i] - 1] if scopes[i] else None)
+            for i in range(start, end)
+            if wanted is None or kinds[i] == wanted
+        ]
+
+    def definitions(self, name: str) -> list[Symbol]:
+        return self.lookup(name, "function")
+
+    def calls(self, name: str) -> list[Symbol]:
+        return self.lookup(name, "call")
+
+    def update(self, workers: int = 1, engine: str = "regex") -> int:
+        """
+        Brings the index up to date with the scripts under the directory,
+        writes it if anything changed and returns the number of files that
+        were parsed again.
+        """
+        known = dict(zip(self.files, self.stats))
+        # find_scripts joins the directory to every path
+        prefix = len(os.path.join(self.directory, ""))
+        scripts, touched, changed = [], {}, []
+
+        for script in find_scripts(self.directory):
+            relative = script[prefix:]
+            scripts.append(relative)
+            old = known.get(relative)
+            stat = os.stat(script)
+            if (old is not None and self.validation == "mtime"
+                    and (stat.st_mtime_ns, stat.st_size) == old[:2]):
+                continue
+
+            if old is not None:
+                with open(script, "rb") as f:
+                    digest = hashlib.sha256(f.read()).digest()
+                if digest == old[2]:
+                    if stat.st_mtime_ns != old[0]:
+                        touched[relative] = stat.st_mtime_ns
+                    continue
+            changed.append(relative)
+
+        self.parsed = len(changed)
+        if (not changed and not touched and len(scripts) == len(known)
+                and os.path.exists(self.path)):
+            return 0
+
+        paths = [os.path.join(self.directory, relative) for relative in changed]
+        if workers != 1 and len(paths) > 1:
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(index_file, paths, [engine] * len(paths), chunksize=16))
+        else:
+            results = [index_file(path, engine) for path in paths]
+
+        self.unpack()
+        sources = dict(zip(changed, results))
+        for relative in scripts:
+            if relative in touched:
+                sources[relative] = self.sources[relative]._replace(mtime=touched[relative])
+            elif relative not in sources:
+                sources[relative] = self.sources[relative]
+
+        self.sources = dict(sorted(sources.items()))
+        self.pack()
+        self.store()
+        return self.parsed
+
+    def unpack(self) -> None:
+        """Rebuilds the sources, with their symbols, from the columns"""
+        if self.sources or not self.files:
+            return
+
+        symbols = [[] for _ in self.files]
+        strings = self.strings
+        for kind, name, file, line, column, scope in zip(*self.columns):
+            symbols[file].append((kind, strings[name], line, column,
+                                  strings[scope - 1] if scope else None))
+
+        self.sources = {
+            path: Source(*stat, sorted(found, key=lambda symbol: symbol[2:4]))
+            for path, stat, found in zip(self.files, self.stats, symbols)
+        }
+
+    def pack(self) -> None:
+        """Rebuilds the string table and the columns from the sources"""
+        strings = set(self.sources)
+        for source in self.sources.values():
+            for _, name, _, _, scope in source.symbols:
+                strings.add(name)
+                if scope is not None:
+                    strings.add(scope)
+        self.strings = sorted(strings)
+        number = {string: i for i, string in enumerate(self.strings)}
+
+        self.files = list(self.sources)
+        self.stats = [source[:3] for source in self.sources.values()]
+        rows = sorted(
+            (number[name], file, line, column, kind, number[scope] + 1 if scope is not None else 0)
+            for file, source in enumerate(self.sources.values())
+            for kind, name, line, column, scope in source.symbols
+        )
+        names, files, lines, columns, kinds, scopes = zip(*rows) if rows else ((),) * 6
+        self.columns = tuple(
+            array("B" if values is kinds else typecode(values), values)
+            for values in (kinds, names, files, lines, columns, scopes)
+        )
+
+    def encode(self) -> bytes:
+        encoded = [string.encode() for string in self.strings]
+        lengths = [len(string) for string in encoded]
+        kinds, *columns = self.columns
+        number = {string: i for i, string in enumerate(self.strings)}
+
+        parts = [
+            HEADER.pack(MAGIC, VERSION, sys.byteorder == "little",
+                        len(self.strings), len(self.files), len(kinds)),
+            (typecode(lengths) + "".join(column.typecode for column in columns)).encode(),
+            array(typecode(lengths), lengths).tobytes(),
+            *encoded,
+            *(FILE.pack(number[path], *stat) for path, stat in zip(self.files, self.stats)),
+            *(column.tobytes() for column in columns),
+            kinds.tobytes(),
+        ]
+        return b"".join(parts)
+
+    def store(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.encode())
+            os.replace(temp, self.path)
+        except BaseException:
+            os.unlink(temp)
+            raise
+
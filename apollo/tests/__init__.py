@@ -1,6 +1,8 @@
 import os
+from parser import Parser
 
 import pytest
+from scanner import Scanner
 
 
 @pytest.fixture(scope="function")
@@ -8,3 +10,7 @@ def change_test_dir(request):
     os.chdir(request.fspath.dirname)
     yield
     os.chdir(request.config.invocation_dir)
+
+
+def parse(code, lazy=False):
+    return Parser(Scanner(code).scan_tokens(), lazy=lazy).parse()
@@ -0,0 +1,142 @@
+import os
+import struct
+
+import pytest
+
+from apoc import HEADER, VARIABLE, CompiledCache, dump, load
+from parser import StackParser
+from scanner import Scanner
+from tests import parse
+
+CODE = """\
+x = -3 + 2.5 if True else 'ab'
+def f(a, b):
+    if a == b:
+        return (a, b)
+    elif !a:
+        return
+    while a < 10:
+        a = a + 1
+    else:
+        print(a)
+f(1, None)
+"""
+
+
+
+def test_round_trip():
+
+    statements = parse(CODE)
+
+    assert load(dump(statements)) == statements
+
+
+def test_offsets_preserved():
+
+    assignment, function = load(dump(parse(CODE)))[:2]
+
+    assert (assignment.name, function.name) == ("x", "f")
+    assert assignment.offset == 0 and function.offset == CODE.index("f(a")
+    assert function.params[1].offset == CODE.index("b)")
+
+
+def test_deep_tree():
+
+    code = "x = " + "(" * 10000 + "1" + ")" * 10000 + "\n"
+    data = dump(StackParser(Scanner(code).scan_tokens()).parse())
+
+    # comparing the trees themselves would recurse
+    assert dump(load(data)) == data
+
+
+@pytest.mark.parametrize("validation", ["mtime", "hash"])
+def test_hit_and_miss(tmp_path, validation):
+
+    script = tmp_path / "script.apo"
+    script.write_text(CODE)
+    calls = []
+
+    def parser():
+        calls.append(script.read_text())
+        return parse(calls[-1])
+
+    compiled = CompiledCache(validation=validation)
+    first = compiled.compile(str(script), parser)
+    second = CompiledCache(validation=validation).compile(str(script), parser)
+
+    script.write_text(CODE + "f(2, 2)\n")
+    os.utime(script, ns=(1, 1))
+    third = compiled.compile(str(script), parser)
+
+    assert len(calls) == 2
+    assert first == second == parse(CODE)
+    assert third == parse(CODE + "f(2, 2)\n")
+    assert os.path.exists(tmp_path / "script.apoc")
+
+
+def test_directory(tmp_path):
+
+    script = tmp_path / "script.apo"
+    script.write_text(CODE)
+    compiled = CompiledCache(str(tmp_path / "out"))
+    compiled.compile(str(script), lambda: parse(CODE))
+
+    assert compiled.path(str(script)).startswith(str(tmp_path / "out"))
+    assert compiled.load(str(script), compiled.header(str(script))) == parse(CODE)
+
+
+def test_version_mismatch(tmp_path):
+
+    script = tmp_path / "script.apo"
+    script.write_text(CODE)
+    compiled = CompiledCache()
+    path = compiled.store(str(script), parse(CODE), compiled.header(str(script)))
+
+    with open(path, "r+b") as f:
+        f.seek(4)
+        f.write(struct.pack("B", 0))
+
+    assert compiled.load(str(script), compiled.header(str(script))) is None
+    assert HEADER.size == os.path.getsize(path) - len(dump(parse(CODE)))
+
+
+@pytest.mark.parametrize("cut", [1, 20, 100])
+def test_truncated_file(tmp_path, cut):
+
+    script = tmp_path / "script.apo"
+    script.write_text(CODE)
+    compiled = CompiledCache()
+    path = compiled.store(str(script), parse(CODE), compiled.header(str(script)))
+
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - cut)
+
+    assert compiled.load(str(script), compiled.header(str(script))) is None
+
+
+def test_corrupt_file(tmp_path):
+
+    script = tmp_path / "script.apo"
+    script.write_text(CODE)
+    compiled = CompiledCache()
+    path = compiled.store(str(script), parse(CODE), compiled.header(str(script)))
+
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(struct.pack("B", 0xff))
+
+    assert compiled.load(str(script), compiled.header(str(script))) is None
+
+
+@pytest.mark.parametrize("data", [dump(parse(CODE))[:-40], dump(parse(CODE))[:40],
+                                  dump(parse(CODE)) + bytes([VARIABLE]), dump(parse(CODE)) + bytes([0x80])])
+def test_malformed_data(data):
+
+    with pytest.raises(ValueError):
+        load(data)
+
+
+def test_unknown_validation():
+
+    with pytest.raises(ValueError):
+        CompiledCache(validation="size")
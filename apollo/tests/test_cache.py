@@ -0,0 +1,82 @@
+import os
+
+from cache import TokenCache
+from scanner import Scanner
+
+CODE = "def f(a):\n    return a + 1.5\nf('x')\n"
+
+
+def test_hit_and_miss(tmp_path):
+
+    cache = TokenCache(str(tmp_path))
+
+    first = cache.scan(CODE)
+    second = TokenCache(str(tmp_path)).scan(CODE)
+    cache.scan(CODE + "f(2)\n")
+
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert list(first) == list(second) == Scanner(CODE).scan_tokens()
+
+
+def test_bytes_source(tmp_path):
+
+    cache = TokenCache(str(tmp_path))
+    cache.scan(CODE, "regex")
+
+    assert list(cache.scan(CODE.encode())) == Scanner(CODE).scan_tokens()
+    assert cache.hits == 1
+
+
+def test_non_ascii_source(tmp_path):
+
+    code = "é = 'ü'\nf(é)\n"
+    cache = TokenCache(str(tmp_path))
+    cache.scan(code, "regex")
+
+    assert list(cache.scan(code.encode())) == Scanner(code.encode()).scan_tokens()
+    assert list(cache.scan(code, "regex")) == Scanner(code).scan_tokens()
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_engines(tmp_path):
+
+    cache = TokenCache(str(tmp_path))
+
+    assert list(cache.scan(CODE, "char")) == list(cache.scan(CODE, "regex"))
+    assert cache.key(CODE, "char") != cache.key(CODE, "regex")
+    assert cache.misses == 2
+
+
+def test_corrupt_entry(tmp_path):
+
+    cache = TokenCache(str(tmp_path))
+    with open(cache.path(cache.key(CODE)), "wb") as f:
+        f.write(b"APTK")
+
+    assert list(cache.scan(CODE)) == Scanner(CODE).scan_tokens()
+    assert cache.misses == 1
+
+
+def test_eviction(tmp_path):
+
+    cache = TokenCache(str(tmp_path), max_bytes=0)
+    cache.scan(CODE)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_least_recently_used(tmp_path):
+
+    sources = [CODE * i for i in range(1, 4)]
+    cache = TokenCache(str(tmp_path))
+    for i, code in enumerate(sources):
+        cache.scan(code)
+        os.utime(cache.path(cache.key(code)), (i, i))
+
+    cache.scan(sources[0])
+    cache.max_bytes = sum(
+        os.path.getsize(cache.path(cache.key(code))) for code in sources[::2])
+    cache.evict()
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        os.path.basename(cache.path(cache.key(code))) for code in sources[::2])
@@ -0,0 +1,63 @@
+from checker import check_file, check_files, find_scripts
+
+VALID = "def f(a):\n    return a\nf(1)\n"
+INVALID = "x = = 1\ny = (2\nz = 3\n"
+
+
+def write_scripts(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "valid.apo").write_text(VALID)
+    (tmp_path / "sub" / "invalid.apo").write_text(INVALID)
+    (tmp_path / "sub" / "scan.apo").write_text("x = $\n")
+    (tmp_path / "notes.txt").write_text(INVALID)
+    return find_scripts(str(tmp_path))
+
+
+def test_find_scripts(tmp_path):
+
+    scripts = write_scripts(tmp_path)
+
+    assert scripts == [str(tmp_path / "valid.apo"), str(tmp_path / "sub" / "invalid.apo"),
+                       str(tmp_path / "sub" / "scan.apo")]
+
+
+def test_check_file(tmp_path):
+
+    path = tmp_path / "invalid.apo"
+    path.write_text(INVALID)
+
+    report = check_file(str(path))
+
+    assert report.statements == 1
+    assert report.errors == [
+        "[line 1, column 5] Error at TokenType.ASSIGN =: Expression expected.",
+        "[line 2, column 7] Error at TokenType.NEWLINE \n: Expect ')' after expression.",
+    ]
+
+
+def test_check_files(tmp_path):
+
+    scripts = write_scripts(tmp_path)
+
+    pooled = list(check_files(scripts, workers=2))
+
+    assert pooled == list(check_files(scripts, workers=1, engine="char"))
+    assert [len(report.errors) for report in pooled] == [0, 2, 1]
+    assert pooled[2].errors == ["Error: Unexpected character $ at line 1."]
+
+
+def test_check_files_bad_scripts(tmp_path):
+
+    (tmp_path / "a.apo").write_text(VALID)
+    (tmp_path / "b.apo").write_text("if a:\n    b = 1\n  c = 2\n")
+    (tmp_path / "c.apo").write_bytes(b"x = '\xff'\n")
+    (tmp_path / "d.apo").write_text(VALID)
+    scripts = find_scripts(str(tmp_path))
+
+    for engine in ("char", "regex"):
+        reports = list(check_files(scripts, workers=1, engine=engine))
+
+        assert [len(report.errors) for report in reports] == [0, 1, 1, 0]
+        assert reports[1].errors == ["Error: Unindent does not match any outer indentation level at line 3."]
+        assert reports[2].errors[0].startswith("Error: 'utf-8' codec can't decode byte 0xff")
+        assert reports[3].statements == 2
@@ -0,0 +1,50 @@
+import pytest
+from closures import ClosureInterpreter
+from exc import RuntimeException
+from tests import parse
+from tok import TokenType as tt
+
+
+
+def test_body_cached_on_definition():
+    statements = parse("def f(a):\n    return a + 1\nx = f(1)\n", lazy=True)
+    definition = statements[0]
+
+    interpreter = ClosureInterpreter()
+    interpreter.interpret(statements[:1])
+    assert definition.compiled is None
+    assert "statements" not in definition.block.__dict__
+
+    interpreter.interpret(statements[1:])
+    compiled = definition.compiled
+    assert compiled is not None and interpreter.globals["x"] == 2
+
+    other = ClosureInterpreter()
+    other.interpret(statements)
+    assert definition.compiled is compiled and other.globals["x"] == 2
+
+
+def test_return_none_from_loop():
+    code = "def f(n):\n    while n:\n        return\n    return 1\nx = f(1)\ny = f(0)\n"
+    interpreter = ClosureInterpreter()
+
+    interpreter.interpret(parse(code))
+
+    assert interpreter.globals["x"] is None and interpreter.globals["y"] == 1
+
+
+def test_runtime_error_offset():
+    code = "x = 1\ny = (x + 1) / (x - 1)\n"
+
+    with pytest.raises(RuntimeException) as e:
+        ClosureInterpreter().interpret(parse(code))
+
+    assert e.value.token.type == tt.SLASH
+    assert e.value.token.offset == code.index("/")
+
+
+def test_builtin_error_in_operand():
+
+    # the TypeError of len is not reported at the operator
+    with pytest.raises(TypeError):
+        ClosureInterpreter().interpret(parse("x = len(1) + 1\n"))
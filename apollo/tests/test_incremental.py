@@ -0,0 +1,191 @@
+import random
+from parser import Parser
+
+import pytest
+from exc import ParseException, UnterminatedString
+from incremental import IncrementalLexer, IncrementalParser, Shifted
+from scanner import Scanner
+from statement import walk
+from tok import LineTable
+
+CODE = """x = 1
+def f(a):
+    if a:
+        return 'multi
+line'
+    return a
+f(x)
+"""
+
+
+@pytest.mark.parametrize(
+    "offset, removed, inserted",
+    [
+        (0, 0, "y = 2\n"),
+        (4, 1, "42"),
+        (CODE.index("    return a"), 0, "    "),
+        (CODE.index("if"), 0, "if a:\n        "),
+        (CODE.index("return a"), 4, ""),
+        (CODE.index("multi"), 5, "many\nmore"),
+        (CODE.index("line'"), 5, "'"),
+        (len(CODE), 0, "# comment\nf(2)"),
+        (0, len(CODE), ""),
+    ],
+)
+def test_edit(offset, removed, inserted):
+
+    lexer = IncrementalLexer(CODE)
+    expected_code = CODE[:offset] + inserted + CODE[offset + removed:]
+
+    tokens = list(lexer.edit(offset, removed, inserted))
+
+    assert lexer.code == expected_code
+    expected = Scanner(expected_code).scan_tokens()
+    assert tokens == expected
+    assert [token.offset for token in tokens] == [token.offset for token in expected]
+
+
+def test_edit_reuses_tokens():
+
+    lexer = IncrementalLexer(CODE)
+    last = lexer.tokens[-2]
+    offset = last.offset
+
+    lexer.edit(0, 0, "\n\n")
+
+    assert lexer.tokens[-2] is last
+    assert last.offset == offset + 2
+    assert LineTable(lexer.code).line(last.offset) == 9
+
+
+def test_random_edits():
+
+    rng = random.Random(7)
+    lexer = IncrementalLexer(CODE * 4)
+    pieces = ["\n", "    ", "x", " + 1", "'", "if a:\n", "#", ""]
+
+    for _ in range(300):
+        offset = rng.randrange(len(lexer.code) + 1)
+        removed = rng.randrange(min(4, len(lexer.code) - offset) + 1)
+        inserted = rng.choice(pieces)
+        code = lexer.code[:offset] + inserted + lexer.code[offset + removed:]
+        try:
+            expected = Scanner(code).scan_tokens()
+        except (UnterminatedString, IndentationError):
+            with pytest.raises((UnterminatedString, IndentationError)):
+                lexer.edit(offset, removed, inserted)
+            continue
+
+        tokens = list(lexer.edit(offset, removed, inserted))
+
+        assert tokens == expected
+        assert [token.offset for token in tokens] == [token.offset for token in expected]
+
+
+def test_shifted():
+
+    shifted = Shifted(lambda item, delta: item + delta, range(0, 100, 10))
+
+    shifted.splice(2, 4, [21, 22], 5)
+    shifted.splice(8, 9, [], -1)
+
+    assert shifted.items[-1] == 90
+    assert list(shifted) == [0, 10, 21, 22, 45, 55, 65, 75, 94]
+    shifted.splice(1, 1, [7], 1)
+    assert list(shifted) == [0, 7, 11, 22, 23, 46, 56, 66, 76, 95]
+
+
+def test_unscannable_edit():
+
+    lexer = IncrementalLexer(CODE)
+
+    with pytest.raises(UnterminatedString):
+        lexer.edit(len(CODE), 0, "'")
+
+    assert list(lexer.edit(len(CODE), 0, "'")) == Scanner(CODE + "''").scan_tokens()
+
+
+@pytest.mark.parametrize(
+    "offset, removed, inserted",
+    [
+        (0, 0, "y = 2\n"),
+        (4, 1, "42"),
+        (CODE.index("f(x)"), 1, "g"),
+        (CODE.index("return a"), 0, "a = 2\n    "),
+        (CODE.index("multi"), 5, "many\nmore"),
+        (CODE.index("f(x)"), 0, "def g():\n    return\n"),
+        (len(CODE), 0, "f(2)\n"),
+        (0, len(CODE), ""),
+    ],
+)
+def test_reparse(offset, removed, inserted):
+
+    incremental = IncrementalParser(CODE)
+    expected_code = CODE[:offset] + inserted + CODE[offset + removed:]
+
+    statements = list(incremental.edit(offset, removed, inserted))
+
+    assert statements == Parser(Scanner(expected_code).scan_tokens()).parse()
+
+
+@pytest.mark.parametrize("inserted", ["y", "    y = 1\n", "y\n", "else:\n    y\n"])
+def test_reparse_after_block_at_end(inserted):
+    code = "while x < 3:\n    x = x + 1\n"
+    incremental = IncrementalParser(code)
+
+    statements = list(incremental.edit(len(code), 0, inserted))
+
+    assert statements == Parser(Scanner(code + inserted).scan_tokens()).parse()
+
+
+def offsets(statements):
+    return [[node.offset for node in walk(statement) if hasattr(node, "offset")]
+            for statement in statements]
+
+
+def test_random_reparse():
+
+    rng = random.Random(11)
+    incremental = IncrementalParser(CODE * 4)
+    pieces = ["\n", "    ", "y", " + 1", "(", "if a:\n    ", "def g():\n", "return 2\n", "'", ""]
+
+    for _ in range(300):
+        offset = rng.randrange(len(incremental.code) + 1)
+        removed = rng.randrange(min(6, len(incremental.code) - offset) + 1)
+        inserted = rng.choice(pieces)
+        code = incremental.code[:offset] + inserted + incremental.code[offset + removed:]
+        try:
+            expected = Parser(Scanner(code).scan_tokens()).parse()
+        except (ParseException, UnterminatedString, IndentationError):
+            with pytest.raises((ParseException, UnterminatedString, IndentationError)):
+                incremental.edit(offset, removed, inserted)
+            continue
+
+        statements = list(incremental.edit(offset, removed, inserted))
+
+        assert statements == expected
+        assert offsets(statements) == offsets(expected)
+
+
+def test_reparse_reuses_statements():
+
+    incremental = IncrementalParser(CODE)
+    first, function, call = incremental.statements
+
+    incremental.edit(CODE.index("return a"), 0, "a = 2\n    ")
+
+    assert incremental.reparsed == range(1, 2)
+    assert incremental.statements[0] is first and incremental.statements[2] is call
+    assert incremental.statements[1] is not function
+    assert call.expr.offset == incremental.code.index("f(x)") + 3
+
+
+def test_unparsable_edit():
+
+    incremental = IncrementalParser(CODE)
+
+    with pytest.raises(ParseException):
+        incremental.edit(len(CODE), 0, "f(")
+
+    assert list(incremental.edit(len(CODE), 2, "")) == Parser(Scanner(CODE).scan_tokens()).parse()
+    assert incremental.reparsed == range(3)
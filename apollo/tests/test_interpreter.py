@@ -1,5 +1,7 @@
 import pytest
-from exc import NameNotFoundException, RuntimeException
+from closures import ClosureInterpreter
+from environment import Environment, global_env
+from exc import NameNotFoundException, ParseException, RuntimeException
 from expression import (
     Binary,
     Call,
@@ -11,7 +13,9 @@ from expression import (
     Unary,
     Variable,
 )
-from interpreter import Interpreter
+from interpreter import Backend, Interpreter
+from parser import Parser
+from scanner import Scanner
 from statement import (
     AssignmentStatement,
     Block,
@@ -23,8 +27,25 @@ from statement import (
     ReturnStmt,
     WhileStmt,
 )
+from tests import parse
 from tok import Token
 from tok import TokenType as tt
+from transpiler import PythonInterpreter
+from vm import VM
+
+
+@pytest.fixture(params=[Interpreter, VM, ClosureInterpreter, PythonInterpreter],
+                ids=["tree", "vm", "closure", "python"])
+def backend(request):
+    return request.param
+
+
+def test_backend_is_abstract(backend):
+
+    assert issubclass(backend, Backend)
+    with pytest.raises(TypeError):
+        Backend()
+
 
 
 @pytest.mark.parametrize(
@@ -38,8 +59,8 @@ from tok import TokenType as tt
         (ExpressionStatement(Literal(None)), None),
     ],
 )
-def test_literal(statement, result):
-    interpreter = Interpreter()
+def test_literal(statement, result, backend):
+    interpreter = backend()
     assert interpreter.interpret([statement]) == [result]
 
 
@@ -50,9 +71,7 @@ def test_literal(statement, result):
             ExpressionStatement(
                 Ternary(
                     left=Literal(1),
-                    if_=Token(tt.IF, 1, "if"),
                     condition=Literal(True),
-                    else_=Token(tt.ELSE, 1, "else"),
                     right=Literal(5),
                 )
             ),
@@ -62,9 +81,7 @@ def test_literal(statement, result):
             ExpressionStatement(
                 Ternary(
                     left=Literal(1),
-                    if_=Token(tt.IF, 1, "if"),
                     condition=Literal(False),
-                    else_=Token(tt.ELSE, 1, "else"),
                     right=Literal(5),
                 )
             ),
@@ -72,26 +89,26 @@ def test_literal(statement, result):
         ),
     ],
 )
-def test_ternary(statement, result):
-    interpreter = Interpreter()
+def test_ternary(statement, result, backend):
+    interpreter = backend()
     assert interpreter.interpret([statement]) == [result]
 
 
-def test_grouping():
+def test_grouping(backend):
 
     expr = ExpressionStatement(
         Binary(
             left=Literal(10),
-            operator=Token(tt.STAR, 1, "*"),
+            operator=tt.STAR,
             right=Grouping(
                 Binary(
-                    left=Literal(1), operator=Token(tt.PLUS, 1, "+"), right=Literal(5)
+                    left=Literal(1), operator=tt.PLUS, right=Literal(5)
                 )
             ),
         )
     )
 
-    interpreter = Interpreter()
+    interpreter = backend()
     assert interpreter.interpret([expr]) == [60]
 
 
@@ -101,7 +118,7 @@ def test_grouping():
         (
             ExpressionStatement(
                 Binary(
-                    left=Literal(1), operator=Token(tt.PLUS, 1, "+"), right=Literal(5)
+                    left=Literal(1), operator=tt.PLUS, right=Literal(5)
                 )
             ),
             6,
@@ -109,7 +126,7 @@ def test_grouping():
         (
             ExpressionStatement(
                 Binary(
-                    left=Literal(5), operator=Token(tt.MINUS, 1, "-"), right=Literal(1)
+                    left=Literal(5), operator=tt.MINUS, right=Literal(1)
                 )
             ),
             4,
@@ -117,7 +134,7 @@ def test_grouping():
         (
             ExpressionStatement(
                 Binary(
-                    left=Literal(5), operator=Token(tt.STAR, 1, "*"), right=Literal(2)
+                    left=Literal(5), operator=tt.STAR, right=Literal(2)
                 )
             ),
             10,
@@ -125,7 +142,7 @@ def test_grouping():
         (
             ExpressionStatement(
                 Binary(
-                    left=Literal(1), operator=Token(tt.SLASH, 1, "/"), right=Literal(2)
+                    left=Literal(1), operator=tt.SLASH, right=Literal(2)
                 )
             ),
             0.5,
@@ -134,7 +151,7 @@ def test_grouping():
             ExpressionStatement(
                 Binary(
                     left=Literal(1),
-                    operator=Token(tt.GREATER, 1, ">"),
+                    operator=tt.GREATER,
                     right=Literal(0),
                 )
             ),
@@ -143,7 +160,7 @@ def test_grouping():
         (
             ExpressionStatement(
                 Binary(
-                    left=Literal(1), operator=Token(tt.LESSER, 1, "<"), right=Literal(0)
+                    left=Literal(1), operator=tt.LESSER, right=Literal(0)
                 )
             ),
             False,
@@ -152,7 +169,7 @@ def test_grouping():
             ExpressionStatement(
                 Binary(
                     left=Literal(1),
-                    operator=Token(tt.LEQUAL, 1, "<="),
+                    operator=tt.LEQUAL,
                     right=Literal(1),
                 )
             ),
@@ -162,7 +179,7 @@ def test_grouping():
             ExpressionStatement(
                 Binary(
                     left=Literal(1),
-                    operator=Token(tt.LEQUAL, 1, "<="),
+                    operator=tt.LEQUAL,
                     right=Literal(0),
                 )
             ),
@@ -172,7 +189,7 @@ def test_grouping():
             ExpressionStatement(
                 Binary(
                     left=Literal(2),
-                    operator=Token(tt.GEQUAL, 1, ">="),
+                    operator=tt.GEQUAL,
                     right=Literal(1),
                 )
             ),
@@ -182,7 +199,7 @@ def test_grouping():
             ExpressionStatement(
                 Binary(
                     left=Literal(1),
-                    operator=Token(tt.GEQUAL, 1, ">="),
+                    operator=tt.GEQUAL,
                     right=Literal(1),
                 )
             ),
@@ -191,7 +208,7 @@ def test_grouping():
         (
             ExpressionStatement(
                 Binary(
-                    left=Literal(1), operator=Token(tt.EQUAL, 1, "=="), right=Literal(1)
+                    left=Literal(1), operator=tt.EQUAL, right=Literal(1)
                 )
             ),
             True,
@@ -199,7 +216,7 @@ def test_grouping():
         (
             ExpressionStatement(
                 Binary(
-                    left=Literal(1), operator=Token(tt.EQUAL, 1, "=="), right=Literal(2)
+                    left=Literal(1), operator=tt.EQUAL, right=Literal(2)
                 )
             ),
             False,
@@ -208,7 +225,7 @@ def test_grouping():
             ExpressionStatement(
                 Binary(
                     left=Literal(1),
-                    operator=Token(tt.NEQUAL, 1, "!="),
+                    operator=tt.NEQUAL,
                     right=Literal(1),
                 )
             ),
@@ -218,7 +235,7 @@ def test_grouping():
             ExpressionStatement(
                 Binary(
                     left=Literal(1),
-                    operator=Token(tt.NEQUAL, 1, "!="),
+                    operator=tt.NEQUAL,
                     right=Literal(2),
                 )
             ),
@@ -226,8 +243,8 @@ def test_grouping():
         ),
     ],
 )
-def test_binary(expression, result):
-    interpreter = Interpreter()
+def test_binary(expression, result, backend):
+    interpreter = backend()
     assert interpreter.interpret([expression]) == [result]
 
 
@@ -236,84 +253,84 @@ def test_binary(expression, result):
     [
         (
             ExpressionStatement(
-                Unary(operator=Token(tt.NOT, 1, "not"), right=Literal(True))
+                Unary(operator=tt.NOT, right=Literal(True))
             ),
             False,
         ),
         (
             ExpressionStatement(
-                Unary(operator=Token(tt.MINUS, 1, "-"), right=Literal(1))
+                Unary(operator=tt.MINUS, right=Literal(1))
             ),
             -1,
         ),
     ],
 )
-def test_unary(expression, result):
-    interpreter = Interpreter()
+def test_unary(expression, result, backend):
+    interpreter = backend()
     assert interpreter.interpret([expression]) == [result]
 
 
-def test_type_error():
+def test_type_error(backend):
 
     expr = ExpressionStatement(
-        Binary(left=Literal(1), operator=Token(tt.PLUS, 1, "+"), right=Literal("hello"))
+        Binary(left=Literal(1), operator=tt.PLUS, right=Literal("hello"))
     )
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     with pytest.raises(RuntimeException) as e:
         interpreter.interpret([expr])
         assert "TypeError" in e
 
 
-def test_div_zero():
+def test_div_zero(backend):
 
     expr = ExpressionStatement(
-        Binary(left=Literal(1), operator=Token(tt.SLASH, 1, "/"), right=Literal(0))
+        Binary(left=Literal(1), operator=tt.SLASH, right=Literal(0))
     )
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     with pytest.raises(RuntimeException) as e:
         interpreter.interpret([expr])
         assert "ZeroDivisionError" in e
 
 
-def test_assignment():
+def test_assignment(backend):
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
-    statements = [AssignmentStatement(Token(tt.IDENTIFIER, 1, "a"), Literal(1))]
+    statements = [AssignmentStatement("a", Literal(1))]
 
     interpreter.interpret(statements)
 
     assert interpreter.env["a"] == 1
 
 
-def test_variable():
+def test_variable(backend):
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     interpreter.env["b"] = 1
 
-    statements = [ExpressionStatement(Variable(Token(tt.IDENTIFIER, 2, "b")))]
+    statements = [ExpressionStatement(Variable("b"))]
 
     assert interpreter.interpret(statements) == [1]
 
 
-def test_name_not_found():
+def test_name_not_found(backend):
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
-    statements = [ExpressionStatement(Variable(Token(tt.IDENTIFIER, 1, "b")))]
+    statements = [ExpressionStatement(Variable("b"))]
 
     with pytest.raises(NameNotFoundException):
         interpreter.interpret(statements)
 
 
-def test_if_stmt():
+def test_if_stmt(backend):
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     statements = [
         IfStmt(
@@ -321,8 +338,8 @@ def test_if_stmt():
             Block(
                 [
                     AssignmentStatement(
-                        Token(tt.IDENTIFIER, 2, lexeme="a"),
-                        Binary(Literal(1), Token(tt.PLUS, 2, "+"), Literal(1)),
+                        "a",
+                        Binary(Literal(1), tt.PLUS, Literal(1)),
                     )
                 ]
             ),
@@ -334,17 +351,17 @@ def test_if_stmt():
     assert interpreter.env["a"] == 2
 
 
-def test_if_stmt_multiple_stmt_block():
+def test_if_stmt_multiple_stmt_block(backend):
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     statements = [
         IfStmt(
             Literal(True),
             Block(
                 [
-                    AssignmentStatement(Token(tt.IDENTIFIER, 2, "a"), Literal(1)),
-                    AssignmentStatement(Token(tt.IDENTIFIER, 2, "b"), Literal(10)),
+                    AssignmentStatement("a", Literal(1)),
+                    AssignmentStatement("b", Literal(10)),
                 ]
             ),
         )
@@ -358,17 +375,17 @@ def test_if_stmt_multiple_stmt_block():
 @pytest.mark.parametrize(
     "if_cond, elif_cond, expected", [(True, False, 1), (False, True, 2)]
 )
-def test_if_elif(if_cond, elif_cond, expected):
+def test_if_elif(if_cond, elif_cond, expected, backend):
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     statements = [
         IfStmt(
             Literal(if_cond),
-            Block([AssignmentStatement(Token(tt.IDENTIFIER, 2, "a"), Literal(1))]),
+            Block([AssignmentStatement("a", Literal(1))]),
             elif_stmt=ElifStmt(
                 Literal(elif_cond),
-                Block([AssignmentStatement(Token(tt.IDENTIFIER, 2, "a"), Literal(2))]),
+                Block([AssignmentStatement("a", Literal(2))]),
             ),
         )
     ]
@@ -379,16 +396,16 @@ def test_if_elif(if_cond, elif_cond, expected):
 
 
 @pytest.mark.parametrize("if_cond, expected", [(True, 1), (False, 2)])
-def test_if_else(if_cond, expected):
+def test_if_else(if_cond, expected, backend):
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     statements = [
         IfStmt(
             Literal(if_cond),
-            Block([AssignmentStatement(Token(tt.IDENTIFIER, 2, "a"), Literal(1))]),
+            Block([AssignmentStatement("a", Literal(1))]),
             else_block=ElseBlock(
-                [AssignmentStatement(Token(tt.IDENTIFIER, 2, "a"), Literal(2))]
+                [AssignmentStatement("a", Literal(2))]
             ),
         )
     ]
@@ -402,9 +419,9 @@ def test_if_else(if_cond, expected):
     "i, j, expected",
     [(0, 0, 10000), (1, 0, 1000), (-1, 0, 1), (-1, 1, 10), (-1, -1, 100)],
 )
-def test_nested_if_elif_else(i, j, expected):
+def test_nested_if_elif_else(i, j, expected, backend):
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     statements = [
         IfStmt(
@@ -416,7 +433,7 @@ def test_nested_if_elif_else(i, j, expected):
                         Block(
                             [
                                 AssignmentStatement(
-                                    Token(tt.IDENTIFIER, 2, "a"), Literal(1)
+                                    "a", Literal(1)
                                 )
                             ]
                         ),
@@ -425,14 +442,14 @@ def test_nested_if_elif_else(i, j, expected):
                             Block(
                                 [
                                     AssignmentStatement(
-                                        Token(tt.IDENTIFIER, 2, "a"), Literal(10)
+                                        "a", Literal(10)
                                     )
                                 ]
                             ),
                             else_block=ElseBlock(
                                 [
                                     AssignmentStatement(
-                                        Token(tt.IDENTIFIER, 2, "a"), Literal(100)
+                                        "a", Literal(100)
                                     )
                                 ]
                             ),
@@ -443,10 +460,10 @@ def test_nested_if_elif_else(i, j, expected):
             elif_stmt=ElifStmt(
                 Literal(i > 0),
                 Block(
-                    [AssignmentStatement(Token(tt.IDENTIFIER, 2, "a"), Literal(1000))]
+                    [AssignmentStatement("a", Literal(1000))]
                 ),
                 else_block=ElseBlock(
-                    [AssignmentStatement(Token(tt.IDENTIFIER, 2, "a"), Literal(10000))]
+                    [AssignmentStatement("a", Literal(10000))]
                 ),
             ),
         )
@@ -467,11 +484,11 @@ def test_nested_if_elif_else(i, j, expected):
         (0, 1, 0),
     ],
 )
-def test_and(left, right, expected):
+def test_and(left, right, expected, backend):
 
-    expression = Logical(Literal(0), Token(tt.AND, 1, "and"), Literal(1))
+    expression = Logical(Literal(0), tt.AND, Literal(1))
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     assert interpreter.evaluate(expression) == 0
 
@@ -486,32 +503,32 @@ def test_and(left, right, expected):
         (0, 1, 1),
     ],
 )
-def test_or(left, right, expected):
+def test_or(left, right, expected, backend):
 
-    expression = Logical(Literal(left), Token(tt.OR, 1, "or"), Literal(right))
+    expression = Logical(Literal(left), tt.OR, Literal(right))
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     assert interpreter.evaluate(expression) == expected
 
 
-def test_while():
+def test_while(backend):
 
     statements = [
-        AssignmentStatement(Token(tt.IDENTIFIER, 2, "a"), Literal(0)),
+        AssignmentStatement("a", Literal(0)),
         WhileStmt(
             Binary(
-                Variable(Token(tt.IDENTIFIER, 1, "a")),
-                Token(tt.LESSER, 1, "<"),
+                Variable("a"),
+                tt.LESSER,
                 Literal(5),
             ),
             Block(
                 [
                     AssignmentStatement(
-                        Token(tt.IDENTIFIER, 2, "a"),
+                        "a",
                         Binary(
-                            Variable(Token(tt.IDENTIFIER, 2, "a")),
-                            Token(tt.PLUS, 2, "+"),
+                            Variable("a"),
+                            tt.PLUS,
                             Literal(1),
                         ),
                     )
@@ -520,30 +537,30 @@ def test_while():
         ),
     ]
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     interpreter.interpret(statements)
 
     assert interpreter.env["a"] == 5
 
 
-def test_while_else():
+def test_while_else(backend):
 
     statements = [
-        AssignmentStatement(Token(tt.IDENTIFIER, 1, "a"), Literal(0)),
+        AssignmentStatement("a", Literal(0)),
         WhileStmt(
             Binary(
-                Variable(Token(tt.IDENTIFIER, 2, "a")),
-                Token(tt.LESSER, 2, "<"),
+                Variable("a"),
+                tt.LESSER,
                 Literal(5),
             ),
             Block(
                 [
                     AssignmentStatement(
-                        Token(tt.IDENTIFIER, 3, "a"),
+                        "a",
                         Binary(
-                            Variable(Token(tt.IDENTIFIER, 3, "a")),
-                            Token(tt.PLUS, 3, "+"),
+                            Variable("a"),
+                            tt.PLUS,
                             Literal(1),
                         ),
                     )
@@ -552,10 +569,10 @@ def test_while_else():
             else_block=ElseBlock(
                 [
                     AssignmentStatement(
-                        Token(tt.IDENTIFIER, 5, "a"),
+                        "a",
                         Binary(
-                            Variable(Token(tt.IDENTIFIER, 5, "a")),
-                            Token(tt.MINUS, 5, "-"),
+                            Variable("a"),
+                            tt.MINUS,
                             Literal(1),
                         ),
                     )
@@ -564,43 +581,188 @@ def test_while_else():
         ),
     ]
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     interpreter.interpret(statements)
 
     assert interpreter.env["a"] == 4
 
 
-def test_function_return():
+def test_function_return(backend):
     statements = [
         FunctionDefinition(
-            name=Token(tt.IDENTIFIER, 1, "add_one"),
-            params=[Variable(Token(tt.IDENTIFIER, 1, "a"))],
+            name="add_one",
+            params=[Variable("a")],
             block=Block(
                 statements=[
                     ReturnStmt(
-                        keyword=Token(tt.RETURN, 2, "return"),
                         value=Binary(
                             Literal(1),
-                            Token(tt.PLUS, 2, "+"),
-                            Variable(Token(tt.IDENTIFIER, 2, "a")),
+                            tt.PLUS,
+                            Variable("a"),
                         ),
                     )
                 ]
             ),
         ),
         AssignmentStatement(
-            name=Token(tt.IDENTIFIER, 3, "a"),
+            name="a",
             expr=Call(
-                Variable(Token(tt.IDENTIFIER, 3, "add_one")),
-                Token(tt.RPAREN, 3, ")"),
+                Variable("add_one"),
                 CommaExpression([Literal(1)]),
             ),
         ),
     ]
 
-    interpreter = Interpreter()
+    interpreter = backend()
 
     interpreter.interpret(statements)
 
     assert interpreter.env["a"] == 2
+
+
+def test_lazy_function(backend):
+    code = "def f(a):\n    return a * 2\nx = f(21)\n"
+    statements = parse(code, lazy=True)
+    interpreter = backend()
+
+    interpreter.interpret(statements)
+
+    assert interpreter.globals["x"] == 42
+    assert "statements" in statements[0].block.__dict__
+
+
+def test_pipelined_statements(backend):
+    code = "x = 1\nx = x + 1\ny = (\n"
+    parser = Parser(Scanner(code).iter_tokens())
+    interpreter = backend()
+
+    with pytest.raises(ParseException):
+        interpreter.interpret(parser.iter_parse(), keep=False)
+
+    # the statements before the syntax error ran
+    assert interpreter.globals["x"] == 2
+
+
+def test_results_not_kept(backend):
+    statements = parse("1 + 2\n3\n")
+
+    assert backend().interpret(statements) == [3, 3]
+    assert backend().interpret(statements, keep=False) is None
+
+
+def test_shared_nodes(backend):
+    code = "def f(a):\n    return a * 2 + 1\nx = f(1) + f(1)\ny = f(2) + f(1)\n"
+    interpreters = []
+    for share in (False, True):
+        interpreter = backend()
+        interpreter.interpret(Parser(Scanner(code).scan_tokens(), share=share).parse())
+        interpreters.append(interpreter)
+
+    assert [(i.globals["x"], i.globals["y"]) for i in interpreters] == [(6, 8), (6, 8)]
+
+
+def test_environment_sets_own_scope():
+    outer = Environment()
+    env = Environment(enclosing=outer)
+
+    env["a"] = 1
+
+    assert "a" not in outer and env["a"] == 1
+
+
+def test_environment_enclosing_lookup():
+    outermost = Environment()
+    outermost["a"], outermost["b"] = 1, 1
+    env = Environment(enclosing=Environment(enclosing=outermost))
+    env.enclosing["b"] = 2
+
+    assert (env["a"], env["b"]) == (1, 2)
+    assert "a" not in env and env.get("a") is None
+    with pytest.raises(NameNotFoundException, match="name 'c' is not defined"):
+        env["c"]
+
+
+def test_global_env():
+    env = global_env()
+
+    assert env["len"] is len and "len" not in env
+
+    env["len"] = 1
+    assert env["len"] == 1 and env.enclosing["len"] is len
+
+
+def test_locals_not_global(backend):
+    code = "x = 1\ndef f(a):\n    x = a + 1\n    return x\ny = f(5)\n"
+    interpreter = backend()
+
+    interpreter.interpret(parse(code))
+
+    assert interpreter.globals["x"] == 1 and interpreter.globals["y"] == 6
+    assert "a" not in interpreter.globals
+
+
+def test_recursion(backend):
+    code = ("def fib(n):\n    if n < 2:\n        return n\n"
+            "    return fib(n - 1) + fib(n - 2)\nx = fib(10)\n")
+    interpreter = backend()
+
+    interpreter.interpret(parse(code))
+
+    assert interpreter.globals["x"] == 55
+
+
+def test_enclosing_locals(backend):
+    code = (
+        "def outer(a):\n"
+        "    b = a * 2\n"
+        "    def middle():\n"
+        "        def inner(c):\n"
+        "            return a + b + c + g\n"
+        "        return inner\n"
+        "    return middle()\n"
+        "g = 1000\n"
+        "first = outer(1)\n"
+        "second = outer(2)\n"
+        "x = first(10)\n"
+        "y = second(10)\n"
+    )
+    for lazy in (False, True):
+        interpreter = backend()
+
+        interpreter.interpret(Parser(Scanner(code).scan_tokens(), lazy=lazy).parse())
+
+        assert (interpreter.globals["x"], interpreter.globals["y"]) == (1013, 1016)
+
+
+def test_same_names_in_functions(backend):
+    code = "def f(a):\n    return a * 2\ndef g(b, a):\n    return a * 2\nx = f(1) + g(2, 3)\n"
+    interpreter = backend()
+
+    interpreter.interpret(Parser(Scanner(code).scan_tokens(), share=True).parse())
+
+    assert interpreter.globals["x"] == 8
+
+
+def test_unbound_local(backend):
+    code = "x = 1\ndef f():\n    y = x\n    x = 2\nf()\n"
+
+    with pytest.raises(NameNotFoundException, match="name 'x' is not defined"):
+        backend().interpret(parse(code))
+
+
+@pytest.mark.parametrize(
+    ["call", "message"],
+    [
+        ("f()", r"f\(\) takes 1 argument but 0 were given"),
+        ("f(1, 2)", r"f\(\) takes 1 argument but 2 were given"),
+    ],
+)
+def test_wrong_number_of_arguments(call, message, backend):
+    code = f"def f(a):\n    return a\nx = {call}\n"
+
+    with pytest.raises(RuntimeException, match=message) as e:
+        backend().interpret(parse(code))
+
+    assert e.value.token.type == tt.RPAREN
+    assert e.value.token.offset == code.rindex(")")
@@ -0,0 +1,49 @@
+import pytest
+from scanner import Scanner
+from tok import LineTable
+from tok.lines import BLOCK
+
+CODE = "x = 1\n\nif x:\n    y = 'a\nb' + x\n"
+
+
+@pytest.mark.parametrize(
+    "offset, position",
+    [(0, (1, 1)), (4, (1, 5)), (5, (1, 6)), (6, (2, 1)), (7, (3, 1)),
+     (17, (4, 5)), (24, (5, 1)), (len(CODE), (6, 1))],
+)
+def test_position(offset, position):
+
+    assert LineTable(CODE).position(offset) == position
+
+
+def test_position_bytes():
+    code = "é = 1\nb = 'ü' + é"
+
+    assert LineTable(code.encode()).position(len("é = 1\nb = 'ü' ".encode())) == (2, 9)
+
+
+def test_many_lines():
+    code = "".join(f"{'x' * (i % 7)}\n" for i in range(BLOCK * 3 + 5))
+    table = LineTable(code)
+
+    for offset in range(len(code) + 1):
+        line = code.count("\n", 0, offset) + 1
+        assert table.line(offset) == line
+        assert table.position(offset)[1] == offset - code.rfind("\n", 0, offset)
+
+
+def test_empty():
+
+    assert LineTable("").position(0) == (1, 1)
+    assert LineTable(b"").line(0) == 1
+
+
+@pytest.mark.parametrize("engine", Scanner.ENGINES)
+def test_token_offsets(engine):
+    tokens = Scanner(CODE, engine=engine).scan_tokens()
+    table = LineTable(CODE)
+
+    assert [table.position(token.offset) for token in tokens[:4]] == [
+        (1, 1), (1, 3), (1, 5), (1, 6)]
+    assert [token.offset for token in tokens] == [
+        token.offset for token in Scanner(CODE).scan_buffer()]
@@ -54,3 +54,150 @@ def test_main_file_not_found(change_test_dir):
     assert process.wait() == 2
 
     assert process.stderr.read().decode("utf-8") == "file hello.apo was not found\n"
+
+
+def test_main_mmap(change_test_dir):
+
+    process = subprocess.Popen(
+        ["python", "../main.py", "--mmap", "apollo_files/call.apo"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+    assert process.wait() == 0
+
+    assert process.stdout.read().decode("utf-8") == "5\n"
+
+
+def test_main_error_column(change_test_dir):
+
+    process = subprocess.Popen(
+        ["python", "../main.py", "apollo_files/invalid.apo"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+    process.wait()
+
+    assert process.stdout.read().decode("utf-8") == (
+        "[line 1, column 5] Error at end: Expression expected.\n")
+
+
+def test_main_lazy(change_test_dir):
+
+    lazy = subprocess.run(
+        ["python", "../main.py", "--lazy", "apollo_files/unused.apo"], capture_output=True)
+    check = subprocess.run(
+        ["python", "../main.py", "--lazy", "--check", "apollo_files/unused.apo"], capture_output=True)
+
+    assert lazy.stdout.decode("utf-8") == "5\n"
+    assert check.stdout.decode("utf-8").startswith("[line 2, column 14] Error")
+
+
+def test_main_compiled(change_test_dir, tmp_path):
+
+    script = tmp_path / "call.apo"
+    with open("apollo_files/call.apo") as f:
+        script.write_text(f.read())
+    out = tmp_path / "out"
+
+    compile = subprocess.run(
+        ["python", "../main.py", "compile", str(tmp_path), "--out", str(out)], capture_output=True)
+    run = subprocess.run(
+        ["python", "../main.py", "--compiled-dir", str(out), str(script)], capture_output=True)
+
+    assert compile.returncode == 0
+    assert compile.stdout.decode("utf-8") == "compiled 1 file\n"
+    assert len(os.listdir(out)) == 1
+    assert run.stdout.decode("utf-8") == "5\n"
+
+
+def test_main_compiled_error(change_test_dir, tmp_path):
+
+    script = tmp_path / "invalid.apo"
+    with open("apollo_files/invalid.apo") as f:
+        script.write_text(f.read())
+
+    compile = subprocess.run(["python", "../main.py", "compile", str(tmp_path)], capture_output=True)
+    run = subprocess.run(["python", "../main.py", "--compiled", str(script)], capture_output=True)
+
+    assert compile.returncode == 1
+    assert compile.stdout.decode("utf-8") == (
+        f"{script}: [line 1, column 5] Error at end: Expression expected.\ncompiled 0 files\n")
+    assert run.stdout.decode("utf-8") == "[line 1, column 5] Error at end: Expression expected.\n"
+    assert not os.path.exists(tmp_path / "invalid.apoc")
+
+
+def test_main_compile_scanning_errors(change_test_dir, tmp_path):
+
+    (tmp_path / "a.apo").write_text("x = 'ab\n")
+    (tmp_path / "b.apo").write_text("x = 1 $ 2\n")
+    (tmp_path / "c.apo").write_bytes(b"x = '\xff'\n")
+    (tmp_path / "d.apo").write_text("print(1)\n")
+
+    compile = subprocess.run(["python", "../main.py", "compile", str(tmp_path)], capture_output=True)
+    lines = compile.stdout.decode("utf-8").splitlines()
+
+    assert compile.returncode == 1
+    assert [line.split(":")[0] for line in lines[:3]] == [
+        str(tmp_path / name) for name in ("a.apo", "b.apo", "c.apo")]
+    assert all(": Error: " in line for line in lines[:3])
+    assert lines[3] == "compiled 1 file"
+    assert os.path.exists(tmp_path / "d.apoc") and not os.path.exists(tmp_path / "a.apoc")
+
+
+def test_main_check(change_test_dir):
+
+    process = subprocess.run(
+        ["python", "../main.py", "check", "apollo_files", "--jobs", "1"], capture_output=True)
+
+    assert process.returncode == 1
+    assert process.stdout.decode("utf-8").splitlines()[0] == (
+        "apollo_files/invalid.apo: [line 1, column 5] Error at end: Expression expected.")
+    assert process.stderr.decode("utf-8").startswith("checked 6 files")
+
+
+def test_main_pipeline(change_test_dir):
+
+    process = subprocess.run(
+        ["python", "../main.py", "--pipeline", "apollo_files/call.apo"], capture_output=True)
+
+    assert process.stdout.decode("utf-8") == "5\n"
+
+
+def test_main_index(change_test_dir, tmp_path):
+
+    with open("apollo_files/call.apo") as f:
+        (tmp_path / "call.apo").write_text(f.read())
+
+    missing = subprocess.run(["python", "../main.py", "lookup", "f", str(tmp_path)],
+                             capture_output=True)
+    index = subprocess.run(["python", "../main.py", "index", str(tmp_path), "--jobs", "1"],
+                           capture_output=True)
+    lookup = subprocess.run(["python", "../main.py", "lookup", "print", str(tmp_path)],
+                            capture_output=True)
+
+    assert missing.returncode == 2
+    assert index.stdout.decode("utf-8").endswith("files (1 parsed)\n")
+    assert lookup.returncode == 0
+    assert lookup.stdout.decode("utf-8").startswith(f"{tmp_path / 'call.apo'}:")
+
+
+def test_main_backend(change_test_dir):
+
+    process = subprocess.run(
+        ["python", "../main.py", "--backend", "vm", "apollo_files/call.apo"], capture_output=True)
+
+    assert process.stdout.decode("utf-8") == "5\n"
+
+
+def test_main_build(change_test_dir, tmp_path):
+
+    out = tmp_path / "call.py"
+    build = subprocess.run(
+        ["python", "../main.py", "build", "apollo_files/call.apo", "--out", str(out)],
+        capture_output=True)
+    run = subprocess.run(["python", str(out)], capture_output=True)
+
+    assert build.stdout.decode("utf-8") == f"built {out}\n"
+    assert run.stdout.decode("utf-8") == "5\n"
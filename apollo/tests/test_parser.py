@@ -1,4 +1,4 @@
-from parser import Parser
+from parser import Parser, StackParser
 
 import pytest
 from exc import ParseException
@@ -21,10 +21,13 @@ from statement import (
     ExpressionStatement,
     FunctionDefinition,
     IfStmt,
+    LazyBlock,
     ReturnStmt,
     WhileStmt,
+    walk,
 )
-from tok import Token
+from scanner import Scanner
+from tok import LineTable, Token, TokenStream, bitset
 from tok import TokenType as tt
 
 
@@ -33,21 +36,19 @@ def test_ternary_if_else():
     # tt = Mock(spec=tok.TokenType)
 
     tokens = [
-        Token(tt.NUMBER, 1, "1", 1),
-        Token(tt.IF, 1, "if"),
-        Token(tt.TRUE, 1, "True", True),
-        Token(tt.ELSE, 1, "else"),
-        Token(tt.NUMBER, 1, "2", 2),
-        Token(tt.EOF, 1),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True", True),
+        Token(tt.ELSE, "else"),
+        Token(tt.NUMBER, "2", 2),
+        Token(tt.EOF),
     ]
 
     expected = [
         ExpressionStatement(
             expr=Ternary(
                 left=Literal(value=1),
-                if_=Token(type=tt.IF, line=1, lexeme="if", literal=None),
                 condition=Literal(value=True),
-                else_=Token(type=tt.ELSE, line=1, lexeme="else", literal=None),
                 right=Literal(value=2),
             )
         )
@@ -59,12 +60,12 @@ def test_ternary_if_else():
 
 def test_comma_expression():
     tokens = [
-        Token(tt.NUMBER, 1, "1", 1),
-        Token(tt.COMMA, 1, ","),
-        Token(tt.TRUE, 1, "True", True),
-        Token(tt.COMMA, 1, ","),
-        Token(tt.NUMBER, 1, "3", 3),
-        Token(tt.EOF, 1),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.COMMA, ","),
+        Token(tt.TRUE, "True", True),
+        Token(tt.COMMA, ","),
+        Token(tt.NUMBER, "3", 3),
+        Token(tt.EOF),
     ]
     expected = [
         ExpressionStatement(CommaExpression([Literal(1), Literal(True), Literal(3)]))
@@ -74,9 +75,9 @@ def test_comma_expression():
 
 
 def test_unary():
-    tokens = [Token(tt.MINUS, 1, "-"), Token(tt.NUMBER, 1, "1", 1), Token(tt.EOF, 1)]
+    tokens = [Token(tt.MINUS, "-"), Token(tt.NUMBER, "1", 1), Token(tt.EOF)]
     expected = [
-        ExpressionStatement(Unary(Token(tt.MINUS, line=1, lexeme="-"), Literal(1)))
+        ExpressionStatement(Unary(tt.MINUS, Literal(1)))
     ]
     parser = Parser(tokens)
     assert parser.parse() == expected
@@ -84,14 +85,14 @@ def test_unary():
 
 def test_comparison():
     tokens = [
-        Token(tt.TRUE, 1, "True", True),
-        Token(tt.EQUAL, 1, "=="),
-        Token(tt.FALSE, 1, "False", False),
-        Token(tt.EOF, 1),
+        Token(tt.TRUE, "True", True),
+        Token(tt.EQUAL, "=="),
+        Token(tt.FALSE, "False", False),
+        Token(tt.EOF),
     ]
     expected = [
         ExpressionStatement(
-            Binary(Literal(True), Token(tt.EQUAL, line=1, lexeme="=="), Literal(False))
+            Binary(Literal(True), tt.EQUAL, Literal(False))
         )
     ]
     parser = Parser(tokens)
@@ -100,10 +101,10 @@ def test_comparison():
 
 def test_grouping_correct():
     tokens = [
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.STRING, 1, '"hello"', "hello"),
-        Token(tt.RPAREN, 1, ")"),
-        Token(tt.EOF, 1),
+        Token(tt.LPAREN, "("),
+        Token(tt.STRING, '"hello"', "hello"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.EOF),
     ]
     expected = [ExpressionStatement(Grouping(Literal("hello")))]
     parser = Parser(tokens)
@@ -112,9 +113,9 @@ def test_grouping_correct():
 
 def test_grouping_missing_closing():
     tokens = [
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.STRING, 1, '"hello"', "hello"),
-        Token(tt.EOF, 1),
+        Token(tt.LPAREN, "("),
+        Token(tt.STRING, '"hello"', "hello"),
+        Token(tt.EOF),
     ]
     parser = Parser(tokens)
     with pytest.raises(ParseException):
@@ -122,7 +123,7 @@ def test_grouping_missing_closing():
 
 
 def test_incomplete():
-    tokens = [Token(tt.NUMBER, 1, "1", 1), Token(tt.PLUS, 1, "+"), Token(tt.EOF, 1)]
+    tokens = [Token(tt.NUMBER, "1", 1), Token(tt.PLUS, "+"), Token(tt.EOF)]
     parser = Parser(tokens)
     with pytest.raises(ParseException):
         parser.parse()
@@ -130,12 +131,12 @@ def test_incomplete():
 
 def test_invalid():
     tokens = [
-        Token(tt.NUMBER, 1, "1", 1),
-        Token(tt.PLUS, 1, "+"),
-        Token(tt.PLUS, 1, "+"),
-        Token(tt.NUMBER, 1, "+"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.EOF, 1),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.PLUS, "+"),
+        Token(tt.PLUS, "+"),
+        Token(tt.NUMBER, "+"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.EOF),
     ]
     parser = Parser(tokens)
     with pytest.raises(ParseException):
@@ -144,18 +145,18 @@ def test_invalid():
 
 def test_expr_statement():
     tokens = [
-        Token(tt.NUMBER, 1, "1", 1),
-        Token(tt.PLUS, 1, "+"),
-        Token(tt.NUMBER, 1, "1", 1),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.NUMBER, 2, "2", 2),
-        Token(tt.EOF, 2),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.PLUS, "+"),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.NUMBER, "2", 2),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
     expected = [
-        ExpressionStatement(Binary(Literal(1), Token(tt.PLUS, 1, "+"), Literal(1))),
+        ExpressionStatement(Binary(Literal(1), tt.PLUS, Literal(1))),
         ExpressionStatement(Literal(2)),
     ]
 
@@ -164,22 +165,22 @@ def test_expr_statement():
 
 def test_assignment():
     tokens = [
-        Token(tt.IDENTIFIER, 1, "a"),
-        Token(tt.ASSIGN, 1, "="),
-        Token(tt.NUMBER, 1, "1", 1),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.EOF, 2),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.ASSIGN, "="),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
-    expected = [AssignmentStatement(name=Token(tt.IDENTIFIER, 1, "a"), expr=Literal(1))]
+    expected = [AssignmentStatement(name="a", expr=Literal(1))]
 
     assert parser.parse() == expected
 
 
 def test_none():
-    tokens = [Token(tt.NONE, 1, "None"), Token(tt.NEWLINE, 1, "\n"), Token(tt.EOF, 2)]
+    tokens = [Token(tt.NONE, "None"), Token(tt.NEWLINE, "\n"), Token(tt.EOF)]
 
     parser = Parser(tokens)
 
@@ -190,29 +191,29 @@ def test_none():
 
 def test_identifier():
     tokens = [
-        Token(tt.IDENTIFIER, 1, "a"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.EOF, 2),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
-    expected = [ExpressionStatement(expr=Variable(Token(tt.IDENTIFIER, 1, "a")))]
+    expected = [ExpressionStatement(expr=Variable("a"))]
 
     assert parser.parse() == expected
 
 
 def test_simple_if_stmt():
     tokens = [
-        Token(tt.IF, 2, "if"),
-        Token(tt.TRUE, 2, "True"),
-        Token(tt.COLON, 2, ":"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.INDENT, 3, "    "),
-        Token(tt.NUMBER, 3, "1", 1),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.DEDENT, 3),
-        Token(tt.EOF, 3),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -224,17 +225,17 @@ def test_simple_if_stmt():
 
 def test_if_stmt_multiple_stmt_block():
     tokens = [
-        Token(tt.IF, 2, "if"),
-        Token(tt.TRUE, 2, "True"),
-        Token(tt.COLON, 2, ":"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.INDENT, 3, "    "),
-        Token(tt.NUMBER, 3, "1", 1),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.NUMBER, 4, "1", 1),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.DEDENT, 4),
-        Token(tt.EOF, 4),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -251,23 +252,23 @@ def test_if_stmt_multiple_stmt_block():
 
 def test_elif():
     tokens = [
-        Token(tt.IF, 1, "if"),
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.NUMBER, 2, "1", 1),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.DEDENT, 3),
-        Token(tt.ELIF, 3, "elif"),
-        Token(tt.FALSE, 3, "False"),
-        Token(tt.COLON, 3, ":"),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.INDENT, 4, "    "),
-        Token(tt.NUMBER, 4, "1", 2),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.DEDENT, 5),
-        Token(tt.EOF, 5),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.ELIF, "elif"),
+        Token(tt.FALSE, "False"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.NUMBER, "1", 2),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -287,22 +288,22 @@ def test_elif():
 
 def test_else():
     tokens = [
-        Token(tt.IF, 1, "if"),
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.NUMBER, 2, "1", 1),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.DEDENT, 3),
-        Token(tt.ELSE, 3, "else"),
-        Token(tt.COLON, 3, ":"),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.INDENT, 4, "    "),
-        Token(tt.NUMBER, 4, "1", 2),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.DEDENT, 5),
-        Token(tt.EOF, 5),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.ELSE, "else"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.NUMBER, "1", 2),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -320,23 +321,23 @@ def test_else():
 
 def test_nested_if():
     tokens = [
-        Token(tt.IF, 1, "if"),
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.IF, 2, "if"),
-        Token(tt.TRUE, 2, "True"),
-        Token(tt.COLON, 2, ":"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.INDENT, 3, "        "),
-        Token(tt.NUMBER, 3, "1", 1),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.NUMBER, 4, "1", 1),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.DEDENT, 4),
-        Token(tt.DEDENT, 4),
-        Token(tt.EOF, 4),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "        "),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -365,37 +366,37 @@ def test_nested_if():
 
 def test_nested_if_else():
     tokens = [
-        Token(tt.IF, 1, "if"),
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.IF, 2, "if"),
-        Token(tt.TRUE, 2, "True"),
-        Token(tt.COLON, 2, ":"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.INDENT, 3, "        "),
-        Token(tt.NUMBER, 3, "1", 1),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.NUMBER, 4, "1", 1),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.DEDENT, 4),
-        Token(tt.ELSE, 4, "else"),
-        Token(tt.COLON, 4, ":"),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.INDENT, 5, "        "),
-        Token(tt.NUMBER, 5, "2", 2),
-        Token(tt.NEWLINE, 5, "\n"),
-        Token(tt.DEDENT, 6),
-        Token(tt.DEDENT, 6),
-        Token(tt.ELSE, 6, "else"),
-        Token(tt.COLON, 6, ":"),
-        Token(tt.NEWLINE, 6, "\n"),
-        Token(tt.INDENT, 7, "    "),
-        Token(tt.NUMBER, 7, "3", 3),
-        Token(tt.NEWLINE, 7, "\n"),
-        Token(tt.DEDENT, 7),
-        Token(tt.EOF, 7),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "        "),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.ELSE, "else"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "        "),
+        Token(tt.NUMBER, "2", 2),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.DEDENT),
+        Token(tt.ELSE, "else"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.NUMBER, "3", 3),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -426,39 +427,39 @@ def test_nested_if_else():
 
 def test_nested_if_elif():
     tokens = [
-        Token(tt.IF, 1, "if"),
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.IF, 2, "if"),
-        Token(tt.TRUE, 2, "True"),
-        Token(tt.COLON, 2, ":"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.INDENT, 3, "        "),
-        Token(tt.NUMBER, 3, "1", 1),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.NUMBER, 4, "1", 1),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.DEDENT, 4),
-        Token(tt.ELIF, 4, "else"),
-        Token(tt.FALSE, 4, "False"),
-        Token(tt.COLON, 4, ":"),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.INDENT, 5, "        "),
-        Token(tt.NUMBER, 5, "2", 2),
-        Token(tt.NEWLINE, 5, "\n"),
-        Token(tt.DEDENT, 6),
-        Token(tt.DEDENT, 6),
-        Token(tt.ELIF, 6, "elif"),
-        Token(tt.TRUE, 6, "True"),
-        Token(tt.COLON, 6, ":"),
-        Token(tt.NEWLINE, 6, "\n"),
-        Token(tt.INDENT, 7, "    "),
-        Token(tt.NUMBER, 7, "3", 3),
-        Token(tt.NEWLINE, 7, "\n"),
-        Token(tt.DEDENT, 7),
-        Token(tt.EOF, 7),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "        "),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.ELIF, "else"),
+        Token(tt.FALSE, "False"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "        "),
+        Token(tt.NUMBER, "2", 2),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.DEDENT),
+        Token(tt.ELIF, "elif"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.NUMBER, "3", 3),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -491,17 +492,17 @@ def test_nested_if_elif():
 
 def test_and():
     tokens = [
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.AND, 1, "and"),
-        Token(tt.FALSE, 1, "False"),
-        Token(tt.EOF, 1),
+        Token(tt.TRUE, "True"),
+        Token(tt.AND, "and"),
+        Token(tt.FALSE, "False"),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
     expected = [
         ExpressionStatement(
-            Logical(Literal(True), Token(tt.AND, 1, "and"), Literal(False))
+            Logical(Literal(True), tt.AND, Literal(False))
         )
     ]
 
@@ -510,17 +511,17 @@ def test_and():
 
 def test_or():
     tokens = [
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.OR, 1, "or"),
-        Token(tt.FALSE, 1, "False"),
-        Token(tt.EOF, 1),
+        Token(tt.TRUE, "True"),
+        Token(tt.OR, "or"),
+        Token(tt.FALSE, "False"),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
     expected = [
         ExpressionStatement(
-            Logical(Literal(True), Token(tt.OR, 1, "or"), Literal(False))
+            Logical(Literal(True), tt.OR, Literal(False))
         )
     ]
 
@@ -529,12 +530,12 @@ def test_or():
 
 def test_multiple_ands():
     tokens = [
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.AND, 1, "and"),
-        Token(tt.FALSE, 1, "False"),
-        Token(tt.AND, 1, "and"),
-        Token(tt.FALSE, 1, "False"),
-        Token(tt.EOF, 1),
+        Token(tt.TRUE, "True"),
+        Token(tt.AND, "and"),
+        Token(tt.FALSE, "False"),
+        Token(tt.AND, "and"),
+        Token(tt.FALSE, "False"),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -542,8 +543,8 @@ def test_multiple_ands():
     expected = [
         ExpressionStatement(
             Logical(
-                Logical(Literal(True), Token(tt.AND, 1, "and"), Literal(False)),
-                Token(tt.AND, 1, "and"),
+                Logical(Literal(True), tt.AND, Literal(False)),
+                tt.AND,
                 Literal(False),
             )
         )
@@ -554,22 +555,22 @@ def test_multiple_ands():
 
 def test_while():
     tokens = [
-        Token(tt.WHILE, 1, "while"),
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.FALSE, 2, "False"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.DEDENT, 3),
-        Token(tt.ELSE, 3, "else"),
-        Token(tt.COLON, 3, ":"),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.INDENT, 4, "    "),
-        Token(tt.TRUE, 4, "True"),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.DEDENT, 5),
-        Token(tt.EOF, 5),
+        Token(tt.WHILE, "while"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.FALSE, "False"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.ELSE, "else"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.TRUE, "True"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
@@ -587,50 +588,42 @@ def test_while():
 
 def test_call_no_args():
     tokens = [
-        Token(tt.IDENTIFIER, 1, "f"),
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.RPAREN, 1, ")"),
-        Token(tt.EOF, 1),
+        Token(tt.IDENTIFIER, "f"),
+        Token(tt.LPAREN, "("),
+        Token(tt.RPAREN, ")"),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
-    expected = [
-        ExpressionStatement(
-            Call(
-                Variable(Token(tt.IDENTIFIER, 1, "f")),
-                paren=Token(tt.RPAREN, 1, ")"),
-            )
-        )
-    ]
+    expected = [ExpressionStatement(Call(Variable("f")))]
 
     assert parser.parse() == expected
 
 
 def test_call_args():
     tokens = [
-        Token(tt.IDENTIFIER, 1, "f"),
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.IDENTIFIER, 1, "a"),
-        Token(tt.COMMA, 1, ","),
-        Token(tt.IDENTIFIER, 1, "b"),
-        Token(tt.COMMA, 1, ","),
-        Token(tt.IDENTIFIER, 1, "c"),
-        Token(tt.RPAREN, 1, ")"),
-        Token(tt.EOF, 1),
+        Token(tt.IDENTIFIER, "f"),
+        Token(tt.LPAREN, "("),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.COMMA, ","),
+        Token(tt.IDENTIFIER, "b"),
+        Token(tt.COMMA, ","),
+        Token(tt.IDENTIFIER, "c"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
     expected = ExpressionStatement(
         Call(
-            Variable(Token(tt.IDENTIFIER, 1, "f")),
-            paren=Token(tt.RPAREN, 1, ")"),
+            Variable("f"),
             arguments=CommaExpression(
                 [
-                    Variable(Token(tt.IDENTIFIER, 1, "a")),
-                    Variable(Token(tt.IDENTIFIER, 1, "b")),
-                    Variable(Token(tt.IDENTIFIER, 1, "c")),
+                    Variable("a"),
+                    Variable("b"),
+                    Variable("c"),
                 ]
             ),
         )
@@ -641,56 +634,46 @@ def test_call_args():
 
 def test_end_of_file_block_without_newline():
     tokens = [
-        Token(type=tt.IDENTIFIER, line=1, lexeme="i", literal=None),
-        Token(type=tt.ASSIGN, line=1, lexeme="=", literal=None),
-        Token(type=tt.NUMBER, line=1, lexeme="0", literal=0),
-        Token(type=tt.NEWLINE, line=1, lexeme="\n", literal=None),
-        Token(type=tt.WHILE, line=2, lexeme="while", literal=None),
-        Token(type=tt.IDENTIFIER, line=2, lexeme="i", literal=None),
-        Token(type=tt.LESSER, line=2, lexeme="<", literal=None),
-        Token(type=tt.NUMBER, line=2, lexeme="5", literal=5),
-        Token(type=tt.COLON, line=2, lexeme=":", literal=None),
-        Token(type=tt.NEWLINE, line=2, lexeme="\n", literal=None),
-        Token(type=tt.INDENT, line=3, lexeme="    ", literal=None),
-        Token(type=tt.IDENTIFIER, line=3, lexeme="i", literal=None),
-        Token(type=tt.ASSIGN, line=3, lexeme="=", literal=None),
-        Token(type=tt.IDENTIFIER, line=3, lexeme="i", literal=None),
-        Token(type=tt.PLUS, line=3, lexeme="+", literal=None),
-        Token(type=tt.NUMBER, line=3, lexeme="1", literal=1),
-        Token(type=tt.DEDENT, line=3, lexeme=None, literal=None),
-        Token(type=tt.EOF, line=3, lexeme=None, literal=None),
+        Token(type=tt.IDENTIFIER, lexeme="i", literal=None),
+        Token(type=tt.ASSIGN, lexeme="=", literal=None),
+        Token(type=tt.NUMBER, lexeme="0", literal=0),
+        Token(type=tt.NEWLINE, lexeme="\n", literal=None),
+        Token(type=tt.WHILE, lexeme="while", literal=None),
+        Token(type=tt.IDENTIFIER, lexeme="i", literal=None),
+        Token(type=tt.LESSER, lexeme="<", literal=None),
+        Token(type=tt.NUMBER, lexeme="5", literal=5),
+        Token(type=tt.COLON, lexeme=":", literal=None),
+        Token(type=tt.NEWLINE, lexeme="\n", literal=None),
+        Token(type=tt.INDENT, lexeme="    ", literal=None),
+        Token(type=tt.IDENTIFIER, lexeme="i", literal=None),
+        Token(type=tt.ASSIGN, lexeme="=", literal=None),
+        Token(type=tt.IDENTIFIER, lexeme="i", literal=None),
+        Token(type=tt.PLUS, lexeme="+", literal=None),
+        Token(type=tt.NUMBER, lexeme="1", literal=1),
+        Token(type=tt.DEDENT, lexeme=None, literal=None),
+        Token(type=tt.EOF, lexeme=None, literal=None),
     ]
 
     parser = Parser(tokens)
 
     expected = [
         AssignmentStatement(
-            name=Token(type=tt.IDENTIFIER, line=1, lexeme="i", literal=None),
+            name="i",
             expr=Literal(value=0),
         ),
         WhileStmt(
             condition=Binary(
-                left=Variable(
-                    name=Token(type=tt.IDENTIFIER, line=2, lexeme="i", literal=None)
-                ),
-                operator=Token(type=tt.LESSER, line=2, lexeme="<", literal=None),
+                left=Variable(name="i"),
+                operator=tt.LESSER,
                 right=Literal(value=5),
             ),
             block=Block(
                 statements=[
                     AssignmentStatement(
-                        name=Token(
-                            type=tt.IDENTIFIER, line=3, lexeme="i", literal=None
-                        ),
+                        name="i",
                         expr=Binary(
-                            left=Variable(
-                                name=Token(
-                                    type=tt.IDENTIFIER, line=3, lexeme="i", literal=None
-                                )
-                            ),
-                            operator=Token(
-                                type=tt.PLUS, line=3, lexeme="+", literal=None
-                            ),
+                            left=Variable(name="i"),
+                            operator=tt.PLUS,
                             right=Literal(value=1),
                         ),
                     )
@@ -705,37 +688,37 @@ def test_end_of_file_block_without_newline():
 
 def test_function_def():
     tokens = [
-        Token(tt.DEF, 1, "def"),
-        Token(tt.IDENTIFIER, 1, "f"),
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.IDENTIFIER, 1, "a"),
-        Token(tt.COMMA, 1, ","),
-        Token(tt.IDENTIFIER, 1, "b"),
-        Token(tt.RPAREN, 1, ")"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.IDENTIFIER, 2, "a"),
-        Token(tt.ASSIGN, 2, "="),
-        Token(tt.IDENTIFIER, 2, "b"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.DEDENT, 3),
-        Token(tt.EOF, 3),
+        Token(tt.DEF, "def"),
+        Token(tt.IDENTIFIER, "f"),
+        Token(tt.LPAREN, "("),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.COMMA, ","),
+        Token(tt.IDENTIFIER, "b"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.ASSIGN, "="),
+        Token(tt.IDENTIFIER, "b"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
     expected = FunctionDefinition(
-        name=Token(tt.IDENTIFIER, 1, "f"),
+        name="f",
         params=[
-            Variable(Token(tt.IDENTIFIER, 1, "a")),
-            Variable(Token(tt.IDENTIFIER, 1, "b")),
+            Variable("a"),
+            Variable("b"),
         ],
         block=Block(
             statements=[
                 AssignmentStatement(
-                    name=Token(tt.IDENTIFIER, 2, "a"),
-                    expr=Variable(Token(tt.IDENTIFIER, 2, "b")),
+                    name="a",
+                    expr=Variable("b"),
                 )
             ]
         ),
@@ -746,41 +729,40 @@ def test_function_def():
 
 def test_function_return():
     tokens = [
-        Token(tt.DEF, 1, "def"),
-        Token(tt.IDENTIFIER, 1, "f"),
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.IDENTIFIER, 1, "a"),
-        Token(tt.COMMA, 1, ","),
-        Token(tt.IDENTIFIER, 1, "b"),
-        Token(tt.RPAREN, 1, ")"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.RETURN, 2, "return"),
-        Token(tt.IDENTIFIER, 2, "a"),
-        Token(tt.PLUS, 2, "+"),
-        Token(tt.IDENTIFIER, 2, "b"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.DEDENT, 3),
-        Token(tt.EOF, 3),
+        Token(tt.DEF, "def"),
+        Token(tt.IDENTIFIER, "f"),
+        Token(tt.LPAREN, "("),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.COMMA, ","),
+        Token(tt.IDENTIFIER, "b"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.RETURN, "return"),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.PLUS, "+"),
+        Token(tt.IDENTIFIER, "b"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
     expected = FunctionDefinition(
-        name=Token(tt.IDENTIFIER, 1, "f"),
+        name="f",
         params=[
-            Variable(Token(tt.IDENTIFIER, 1, "a")),
-            Variable(Token(tt.IDENTIFIER, 1, "b")),
+            Variable("a"),
+            Variable("b"),
         ],
         block=Block(
             statements=[
                 ReturnStmt(
-                    keyword=Token(tt.RETURN, 2, "return"),
                     value=Binary(
-                        Variable(Token(tt.IDENTIFIER, 2, "a")),
-                        Token(tt.PLUS, 2, "+"),
-                        Variable(Token(tt.IDENTIFIER, 2, "b")),
+                        Variable("a"),
+                        tt.PLUS,
+                        Variable("b"),
                     ),
                 )
             ]
@@ -792,31 +774,297 @@ def test_function_return():
 
 def test_function_return_no_value():
     tokens = [
-        Token(tt.DEF, 1, "def"),
-        Token(tt.IDENTIFIER, 1, "f"),
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.RPAREN, 1, ")"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.RETURN, 2, "return"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.DEDENT, 3),
-        Token(tt.EOF, 3),
+        Token(tt.DEF, "def"),
+        Token(tt.IDENTIFIER, "f"),
+        Token(tt.LPAREN, "("),
+        Token(tt.RPAREN, ")"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.RETURN, "return"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     parser = Parser(tokens)
 
     expected = FunctionDefinition(
-        name=Token(tt.IDENTIFIER, 1, "f"),
+        name="f",
         params=[],
         block=Block(
             statements=[
-                ReturnStmt(
-                    keyword=Token(tt.RETURN, 2, "return"),
-                )
+                ReturnStmt()
             ]
         ),
     )
 
     assert parser.parse()[0] == expected
+
+
+def test_token_stream():
+    code = "def f(a):\n    if a:\n        return a\nx = f(1) + 2\nf(x)\n" * 50
+
+    scanner = Scanner(code, engine="regex")
+    parser = Parser(scanner.iter_tokens())
+
+    assert parser.parse() == Parser(Scanner(code).scan_tokens()).parse()
+    assert len(parser.tokens.buffer) <= parser.tokens.buffer.maxlen
+
+
+def test_token_stream_window():
+    stream = TokenStream(Token(tt.NUMBER, str(i), i) for i in range(10))
+
+    assert stream[1].literal == 1
+    assert stream[5].literal == 5
+
+    with pytest.raises(IndexError):
+        stream[0]
+
+    with pytest.raises(IndexError):
+        stream[10]
+
+
+def test_token_buffer():
+    code = "def f(a):\n    if a:\n        return a\nx = f(1.5) + 2\nf('x')\n" * 5
+
+    expected = Parser(Scanner(code).scan_tokens()).parse()
+
+    assert Parser(Scanner(code).scan_buffer()).parse() == expected
+
+
+def test_match_any():
+    parser = Parser([Token(tt.STAR, "*"), Token(tt.EOF)])
+
+    assert not parser.match_any(bitset(tt.PLUS, tt.SLASH))
+    assert parser.match_any(bitset(tt.SLASH, tt.STAR))
+    assert parser.current == 1
+
+
+def test_token_type_format():
+    assert str(tt.NUMBER) == f"{tt.NUMBER}" == "TokenType.NUMBER"
+    assert 1 << tt.NUMBER & bitset(tt.NUMBER, tt.STRING)
+
+
+def test_precedence():
+    tokens = Scanner("-a * b + 1 == c and d, e or f\n").scan_tokens()
+    a, b, c, d, e, f = (Variable(t.lexeme) for t in tokens if t.type == tt.IDENTIFIER)
+    minus, star, plus, equal, and_, comma, or_ = (
+        t.type for t in tokens if t.type not in (tt.IDENTIFIER, tt.NUMBER, tt.NEWLINE, tt.EOF))
+
+    expected = ExpressionStatement(
+        Logical(
+            Logical(
+                Binary(Binary(Binary(Unary(minus, a), star, b), plus, Literal(1)), equal, c),
+                and_,
+                CommaExpression([d, e]),
+            ),
+            or_,
+            f,
+        )
+    )
+
+    assert Parser(tokens).parse() == [expected]
+
+
+@pytest.mark.parametrize(
+    "code, expected",
+    [
+        ("a if b\n", "a"),
+        ("a if b, c\n", "CommaExpression([a, c])"),
+        ("a, b if c else d\n", "CommaExpression([a, Ternary(b, c, d)])"),
+        ("a == b if c else d\n", "Ternary(Binary(a, b), c, d)"),
+        ("f(a)\n", "Call(f, a)"),
+    ],
+)
+def test_ternary_and_comma(code, expected):
+    def show(expr):
+        match expr:
+            case Variable(name): return name
+            case Binary(left, _, right): return f"Binary({show(left)}, {show(right)})"
+            case Ternary(left, condition, right):
+                return f"Ternary({show(left)}, {show(condition)}, {show(right)})"
+            case CommaExpression(exprs): return f"CommaExpression([{', '.join(map(show, exprs))}])"
+            case Call(callee, args): return f"Call({show(callee)}, {show(args)})"
+
+    [statement] = Parser(Scanner(code).scan_tokens()).parse()
+
+    assert show(statement.expr) == expected
+
+
+@pytest.mark.parametrize("code", ["a if b else c if d else e\n", "f(a)(b)\n"])
+def test_ternary_and_call_once(code):
+
+    with pytest.raises(ParseException):
+        Parser(Scanner(code).scan_tokens()).parse()
+
+
+def test_stack_parser():
+    code = "def f(a):\n    if a:\n        return -a\n    elif a == 2:\n        return (a, 1)\n" \
+           "    else:\n        while a:\n            a = a - 1\n        else:\n" \
+           "            return f(a) if a else 0\nx = f(1) + 2\nx and f(x) or !x\n"
+    tokens = Scanner(code).scan_tokens()
+
+    assert StackParser(tokens).parse() == Parser(tokens).parse()
+
+
+def test_stack_parser_error():
+    tokens = Scanner("x = (1 +\n").scan_tokens()
+
+    with pytest.raises(ParseException) as error:
+        StackParser(tokens).parse()
+
+    assert error.value.token is tokens[-2]
+
+
+@pytest.mark.parametrize("kind, depth", [("parentheses", 100_000), ("elif", 10_000)])
+def test_stack_parser_depth(kind, depth):
+
+    if kind == "parentheses":
+        code = "(" * depth + "1" + ")" * depth + "\n"
+    else:
+        code = "if a:\n    b\n" + "elif a:\n    b\n" * depth
+    tokens = Scanner(code, engine="regex").scan_tokens()
+
+    with pytest.raises(RecursionError):
+        Parser(tokens).parse()
+
+    [node] = StackParser(tokens).parse()
+
+    nesting = 0
+    node = node.expr if kind == "parentheses" else node.elif_stmt
+    while isinstance(node, (Grouping, IfStmt)):
+        node = node.expression if kind == "parentheses" else node.elif_stmt
+        nesting += 1
+
+    assert nesting == depth
+    assert node == (Literal(1) if kind == "parentheses" else None)
+
+
+def test_stack_parser_nested_blocks():
+    depth = 2000
+    code = "".join(" " * i + "if a:\n" for i in range(depth)) + " " * depth + "b\n"
+
+    [node] = StackParser(Scanner(code, engine="regex").scan_tokens()).parse()
+
+    for _ in range(depth - 1):
+        [node] = node.block.statements
+    assert node.block.statements == [ExpressionStatement(Variable("b"))]
+    assert node.block.statements[0].expr.offset == len(code) - 2
+
+
+LIBRARY = "def f(a):\n    def g(b):\n        return b + 1\n    return g(a)\n" \
+          "def broken():\n    return (1\nx = 1\n"
+
+
+@pytest.mark.parametrize("parser", [Parser, StackParser])
+def test_lazy_bodies(parser):
+    code = LIBRARY.replace("(1\n", "1\n")
+    tokens = Scanner(code).scan_tokens()
+
+    statements = parser(tokens, lazy=True).parse()
+
+    f = statements[0].block
+    assert isinstance(f, LazyBlock) and "statements" not in f.__dict__
+    assert statements == parser(tokens).parse()
+    assert isinstance(f.statements[0].block, LazyBlock)
+
+
+@pytest.mark.parametrize("parser", [Parser, StackParser])
+def test_lazy_bodies_errors(parser):
+    tokens = Scanner(LIBRARY).scan_buffer()
+    lazy = parser(tokens, lazy=True)
+
+    statements = lazy.parse()
+
+    assert statements[-1] == AssignmentStatement("x", Literal(1))
+    with pytest.raises(ParseException):
+        lazy.parse_bodies(statements)
+    with pytest.raises(ParseException):
+        parser(tokens).parse()
+
+
+@pytest.mark.parametrize("parser", [Parser, StackParser])
+def test_recover(parser):
+    code = "x = = 1\ndef f(a):\n    y = (2\n    z = 3\nw = 4\nif x:\n    print(\n"
+    recovering = parser(Scanner(code).scan_tokens(), recover=True)
+
+    statements = recovering.parse()
+
+    lines = LineTable(code)
+    assert [(lines.line(e.token.offset), str(e)) for e in recovering.errors] == [
+        (1, "Expression expected."),
+        (3, "Expect ')' after expression."),
+        (7, "Expression expected."),
+    ]
+    assert statements == [
+        None,
+        None,
+        AssignmentStatement("z", Literal(3)),
+        AssignmentStatement("w", Literal(4)),
+        None,
+    ]
+    with pytest.raises(ParseException):
+        parser(Scanner(code).scan_tokens()).parse()
+
+
+@pytest.mark.parametrize("parser", [Parser, StackParser])
+def test_iter_parse(parser):
+    code = "x = 1\ndef f(a):\n    return a\ny = (\n"
+    statements = parser(Scanner(code).iter_tokens()).iter_parse()
+
+    assert next(statements) == AssignmentStatement("x", Literal(1))
+    assert isinstance(next(statements), FunctionDefinition)
+    with pytest.raises(ParseException):
+        next(statements)
+
+
+def test_constant_pool():
+    code = "x = 1\ny = 1\nz = 1.0\nw = True\nv = 'a' if True else 'a'\n"
+
+    x, y, z, w, v = Parser(Scanner(code).scan_tokens()).parse()
+
+    assert x.expr is y.expr and x.expr is not z.expr and x.expr is not w.expr
+    assert v.expr.left is v.expr.right and v.expr.condition is w.expr
+
+
+@pytest.mark.parametrize("parser", [Parser, StackParser])
+def test_share(parser):
+    code = "a = -(b * 2 + f(c, 1))\nd = -(b * 2 + f(c, 1))\ne = b * 2 + f(c, 2)\n"
+
+    shared = parser(Scanner(code).scan_tokens(), share=True).parse()
+    a, d, e = shared
+
+    assert shared == parser(Scanner(code).scan_tokens()).parse()
+    assert a.expr is d.expr
+    assert e.expr.left is a.expr.right.expression.left
+    assert e.expr is not a.expr.right.expression
+    # a shared node is where it first appeared
+    assert d.expr.offset == 4
+
+
+def sharing(statements):
+    """The index of the first node that each node is, in walk order"""
+    first = {}
+    return [first.setdefault(id(node), len(first))
+            for statement in statements for node in walk(statement)]
+
+
+def test_stack_parser_parity():
+    code = ("x = b * 2\n"
+            "def f(a):\n"
+            "    y = b * 2\n"
+            "    z = (b * 2\n"
+            "w = b * 2\n"
+            "def g():\n"
+            "    return b * 2 if x else (\n"
+            "v = b * 2 + x\n")
+    tokens = Scanner(code).scan_tokens()
+
+    parsers = [cls(tokens, recover=True, share=True) for cls in (Parser, StackParser)]
+    (parsed, errors), (stacked, stacked_errors) = [(p.parse(), p.errors) for p in parsers]
+
+    assert stacked == parsed
+    assert [str(e) for e in stacked_errors] == [str(e) for e in errors]
+    assert sharing(stacked) == sharing(parsed)
+    assert parsed[-1].expr.left is parsed[0].expr
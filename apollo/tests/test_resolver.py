@@ -0,0 +1,55 @@
+from resolver import Scope, resolve, stored
+from statement import walk
+from tests import parse
+
+
+
+def test_stored_in_source_order():
+    definition = parse("def f(a):\n    if a:\n        c = 1\n    b = 2\n    def g():\n        d = 3\n")[0]
+
+    assert stored(definition.block) == ["c", "b", "g"]
+
+
+def test_scope_lookup():
+    outer = Scope(["a", "b"])
+    inner = Scope(["c", "a"], outer)
+
+    assert inner.lookup("a") == (0, 1)
+    assert inner.lookup("b") == (1, 1)
+    assert inner.lookup("x") is None
+
+
+def test_resolve():
+    code = "def f(a):\n    b = a + x\n    def g(c):\n        return a + c\n    return g\n"
+    definition = parse(code)[0]
+
+    scope = resolve(definition)
+
+    assert scope.names == ["a", "b", "g"] and resolve(definition) is scope
+    assign, nested, _ = definition.block.statements
+    read_a, read_x = assign.expr.left, assign.expr.right
+    assert (assign.slot, nested.slot) == (1, 2)
+    assert (read_a.depth, read_a.slot) == (0, 0) and read_x.slot is None
+    assert nested.enclosing is scope and nested.scope is None
+
+    resolve(nested)
+    read_a, read_c = nested.block.statements[0].value.left, nested.block.statements[0].value.right
+    assert (read_a.depth, read_a.slot) == (1, 0) and (read_c.depth, read_c.slot) == (0, 0)
+
+
+def test_toplevel_not_resolved():
+    statements = parse("x = 1\ndef f():\n    return x\ny = f\n")
+
+    resolve(statements[1])
+
+    assert all(getattr(node, "slot", None) is None for node in walk(statements[0]))
+    assert statements[1].slot is None and statements[2].expr.slot is None
+
+
+def test_nested_lazy_body_left_unparsed():
+    definition = parse("def f():\n    def g():\n        return 1\n    return g\n", lazy=True)[0]
+
+    resolve(definition)
+
+    nested = definition.block.statements[0]
+    assert nested.slot == 0 and "statements" not in nested.block.__dict__
@@ -1,17 +1,20 @@
+import mmap
+import sys
+
 import pytest
 from exc import UnexpectedCharacter, UnterminatedString
-from scanner import Scanner
-from tok import Token
+from scanner import Scanner, split_lines
+from tok import LazyToken, Token
 from tok import TokenType as tt
 
 
 def test_scanner_hello_world():
     expected = [
-        Token(tt.IDENTIFIER, 1, "print"),
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.STRING, 1, '"hello, world!"', "hello, world!"),
-        Token(tt.RPAREN, 1, ")"),
-        Token(tt.EOF, 1),
+        Token(tt.IDENTIFIER, "print"),
+        Token(tt.LPAREN, "("),
+        Token(tt.STRING, '"hello, world!"', "hello, world!"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.EOF),
     ]
 
     scanner = Scanner('print("hello, world!")')
@@ -23,36 +26,36 @@ def test_scanner_hello_world():
 def test_symbols():
 
     expected = [
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.LPAREN, 2, "("),
-        Token(tt.LBRACE, 2, "{"),
-        Token(tt.LBRACK, 2, "["),
-        Token(tt.LESSER, 2, "<"),
-        Token(tt.GREATER, 2, ">"),
-        Token(tt.RBRACK, 2, "]"),
-        Token(tt.RBRACE, 2, "}"),
-        Token(tt.RPAREN, 2, ")"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.NEWLINE, 5, "\n"),
-        Token(tt.PLUS, 6, "+"),
-        Token(tt.MINUS, 6, "-"),
-        Token(tt.STAR, 6, "*"),
-        Token(tt.SLASH, 6, "/"),
-        Token(tt.PERCENT, 6, "%"),
-        Token(tt.DOT, 6, "."),
-        Token(tt.COMMA, 6, ","),
-        Token(tt.SCOLON, 6, ";"),
-        Token(tt.COLON, 6, ":"),
-        Token(tt.NEQUAL, 6, "!="),
-        Token(tt.ASSIGN, 6, "="),
-        Token(tt.BANG, 6, "!"),
-        Token(tt.EQUAL, 6, "=="),
-        Token(tt.LEQUAL, 6, "<="),
-        Token(tt.GEQUAL, 6, ">="),
-        Token(tt.NEWLINE, 6, "\n"),
-        Token(tt.EOF, 7),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.LPAREN, "("),
+        Token(tt.LBRACE, "{"),
+        Token(tt.LBRACK, "["),
+        Token(tt.LESSER, "<"),
+        Token(tt.GREATER, ">"),
+        Token(tt.RBRACK, "]"),
+        Token(tt.RBRACE, "}"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.PLUS, "+"),
+        Token(tt.MINUS, "-"),
+        Token(tt.STAR, "*"),
+        Token(tt.SLASH, "/"),
+        Token(tt.PERCENT, "%"),
+        Token(tt.DOT, "."),
+        Token(tt.COMMA, ","),
+        Token(tt.SCOLON, ";"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEQUAL, "!="),
+        Token(tt.ASSIGN, "="),
+        Token(tt.BANG, "!"),
+        Token(tt.EQUAL, "=="),
+        Token(tt.LEQUAL, "<="),
+        Token(tt.GEQUAL, ">="),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.EOF),
     ]
 
     scanner = Scanner("\n({[<>]})\n\n\n\n+-*/%.,;:!==! ==<=>=\n")
@@ -65,24 +68,24 @@ def test_symbols():
 def test_keywords():
 
     expected = [
-        Token(tt.IF, 1, "if"),
-        Token(tt.ELIF, 1, "elif"),
-        Token(tt.ELSE, 1, "else"),
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.FALSE, 1, "False"),
-        Token(tt.NONE, 1, "None"),
-        Token(tt.OR, 1, "or"),
-        Token(tt.AND, 1, "and"),
-        Token(tt.NOT, 1, "not"),
-        Token(tt.CLASS, 1, "class"),
-        Token(tt.SELF, 1, "self"),
-        Token(tt.RETURN, 1, "return"),
-        Token(tt.DEF, 1, "def"),
-        Token(tt.IMPORT, 1, "import"),
-        Token(tt.FOR, 1, "for"),
-        Token(tt.WHILE, 1, "while"),
-        Token(tt.DO, 1, "do"),
-        Token(tt.EOF, 1),
+        Token(tt.IF, "if"),
+        Token(tt.ELIF, "elif"),
+        Token(tt.ELSE, "else"),
+        Token(tt.TRUE, "True"),
+        Token(tt.FALSE, "False"),
+        Token(tt.NONE, "None"),
+        Token(tt.OR, "or"),
+        Token(tt.AND, "and"),
+        Token(tt.NOT, "not"),
+        Token(tt.CLASS, "class"),
+        Token(tt.SELF, "self"),
+        Token(tt.RETURN, "return"),
+        Token(tt.DEF, "def"),
+        Token(tt.IMPORT, "import"),
+        Token(tt.FOR, "for"),
+        Token(tt.WHILE, "while"),
+        Token(tt.DO, "do"),
+        Token(tt.EOF),
     ]
 
     scanner = Scanner(
@@ -104,7 +107,7 @@ def test_unexpected_char():
 
 def test_identifier():
 
-    expected = [Token(tt.IDENTIFIER, 1, "a"), Token(tt.EOF, 1)]
+    expected = [Token(tt.IDENTIFIER, "a"), Token(tt.EOF)]
 
     scanner = Scanner("a")
     tokens = scanner.scan_tokens()
@@ -114,7 +117,7 @@ def test_identifier():
 
 def test_comment():
 
-    expected = [Token(tt.EOF, 1)]
+    expected = [Token(tt.EOF)]
 
     scanner = Scanner("""# hello, world!""")
 
@@ -126,7 +129,7 @@ def test_comment():
 @pytest.mark.parametrize("string", ["'hello'", '"hello"'])
 def test_string(string):
 
-    expected = [Token(tt.STRING, 1, string, string[1:-1]), Token(tt.EOF, 1)]
+    expected = [Token(tt.STRING, string, string[1:-1]), Token(tt.EOF)]
 
     scanner = Scanner(string)
     tokens = scanner.scan_tokens()
@@ -146,8 +149,8 @@ def test_unterminated_string():
 def test_number(num):
 
     expected = [
-        Token(tt.NUMBER, 1, num, float(num) if "." in num else int(num)),
-        Token(tt.EOF, 1),
+        Token(tt.NUMBER, num, float(num) if "." in num else int(num)),
+        Token(tt.EOF),
     ]
 
     scanner = Scanner(num)
@@ -159,10 +162,10 @@ def test_number(num):
 def test_assignment():
 
     expected = [
-        Token(tt.IDENTIFIER, 1, "hello"),
-        Token(tt.ASSIGN, 1, "="),
-        Token(tt.NUMBER, 1, "1234", 1234),
-        Token(tt.EOF, 1),
+        Token(tt.IDENTIFIER, "hello"),
+        Token(tt.ASSIGN, "="),
+        Token(tt.NUMBER, "1234", 1234),
+        Token(tt.EOF),
     ]
 
     scanner = Scanner("hello = 1234")
@@ -174,18 +177,18 @@ def test_assignment():
 def test_indent():
 
     expected = [
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.IF, 2, "if"),
-        Token(tt.TRUE, 2, "True"),
-        Token(tt.COLON, 2, ":"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.INDENT, 3, "    "),
-        Token(tt.IDENTIFIER, 3, "print"),
-        Token(tt.LPAREN, 3, "("),
-        Token(tt.STRING, 3, '"hello"', "hello"),
-        Token(tt.RPAREN, 3, ")"),
-        Token(tt.DEDENT, 3),
-        Token(tt.EOF, 3),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.IDENTIFIER, "print"),
+        Token(tt.LPAREN, "("),
+        Token(tt.STRING, '"hello"', "hello"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     text = """
@@ -200,34 +203,34 @@ if True:
 def test_dedent():
 
     expected = [
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.FOR, 2, "for"),
-        Token(tt.IDENTIFIER, 2, "i"),
-        Token(tt.IN, 2, "in"),
-        Token(tt.IDENTIFIER, 2, "range"),
-        Token(tt.LPAREN, 2, "("),
-        Token(tt.NUMBER, 2, "10", 10),
-        Token(tt.RPAREN, 2, ")"),
-        Token(tt.COLON, 2, ":"),
-        Token(tt.NEWLINE, 2, "\n"),
-        Token(tt.INDENT, 3, "    "),
-        Token(tt.IF, 3, "if"),
-        Token(tt.TRUE, 3, "True"),
-        Token(tt.COLON, 3, ":"),
-        Token(tt.NEWLINE, 3, "\n"),
-        Token(tt.INDENT, 4, "        "),
-        Token(tt.IDENTIFIER, 4, "print"),
-        Token(tt.LPAREN, 4, "("),
-        Token(tt.STRING, 4, '"hello"', "hello"),
-        Token(tt.RPAREN, 4, ")"),
-        Token(tt.NEWLINE, 4, "\n"),
-        Token(tt.DEDENT, 5),
-        Token(tt.DEDENT, 5),
-        Token(tt.NUMBER, 5, "1", 1),
-        Token(tt.PLUS, 5, "+"),
-        Token(tt.NUMBER, 5, "1", 1),
-        Token(tt.NEWLINE, 5, "\n"),
-        Token(tt.EOF, 6),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.FOR, "for"),
+        Token(tt.IDENTIFIER, "i"),
+        Token(tt.IN, "in"),
+        Token(tt.IDENTIFIER, "range"),
+        Token(tt.LPAREN, "("),
+        Token(tt.NUMBER, "10", 10),
+        Token(tt.RPAREN, ")"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.IF, "if"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "        "),
+        Token(tt.IDENTIFIER, "print"),
+        Token(tt.LPAREN, "("),
+        Token(tt.STRING, '"hello"', "hello"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.DEDENT),
+        Token(tt.DEDENT),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.PLUS, "+"),
+        Token(tt.NUMBER, "1", 1),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.EOF),
     ]
 
     text = """
@@ -245,17 +248,17 @@ for i in range(10):
 def test_while():
 
     expected = [
-        Token(tt.WHILE, 1, "while"),
-        Token(tt.TRUE, 1, "True"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.IDENTIFIER, 2, "print"),
-        Token(tt.LPAREN, 2, "("),
-        Token(tt.STRING, 2, '"hello"', "hello"),
-        Token(tt.RPAREN, 2, ")"),
-        Token(tt.DEDENT, 2),
-        Token(tt.EOF, 2),
+        Token(tt.WHILE, "while"),
+        Token(tt.TRUE, "True"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.IDENTIFIER, "print"),
+        Token(tt.LPAREN, "("),
+        Token(tt.STRING, '"hello"', "hello"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     text = """while True:
@@ -269,28 +272,28 @@ def test_while():
 def test_function_def():
 
     expected = [
-        Token(tt.DEF, 1, "def"),
-        Token(tt.IDENTIFIER, 1, "foo"),
-        Token(tt.LPAREN, 1, "("),
-        Token(tt.IDENTIFIER, 1, "a"),
-        Token(tt.COMMA, 1, ","),
-        Token(tt.IDENTIFIER, 1, "b"),
-        Token(tt.COMMA, 1, ","),
-        Token(tt.IDENTIFIER, 1, "c"),
-        Token(tt.RPAREN, 1, ")"),
-        Token(tt.COLON, 1, ":"),
-        Token(tt.NEWLINE, 1, "\n"),
-        Token(tt.INDENT, 2, "    "),
-        Token(tt.IDENTIFIER, 2, "print"),
-        Token(tt.LPAREN, 2, "("),
-        Token(tt.IDENTIFIER, 2, "a"),
-        Token(tt.COMMA, 2, ","),
-        Token(tt.IDENTIFIER, 2, "b"),
-        Token(tt.COMMA, 2, ","),
-        Token(tt.IDENTIFIER, 2, "c"),
-        Token(tt.RPAREN, 2, ")"),
-        Token(tt.DEDENT, 2),
-        Token(tt.EOF, 2),
+        Token(tt.DEF, "def"),
+        Token(tt.IDENTIFIER, "foo"),
+        Token(tt.LPAREN, "("),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.COMMA, ","),
+        Token(tt.IDENTIFIER, "b"),
+        Token(tt.COMMA, ","),
+        Token(tt.IDENTIFIER, "c"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.COLON, ":"),
+        Token(tt.NEWLINE, "\n"),
+        Token(tt.INDENT, "    "),
+        Token(tt.IDENTIFIER, "print"),
+        Token(tt.LPAREN, "("),
+        Token(tt.IDENTIFIER, "a"),
+        Token(tt.COMMA, ","),
+        Token(tt.IDENTIFIER, "b"),
+        Token(tt.COMMA, ","),
+        Token(tt.IDENTIFIER, "c"),
+        Token(tt.RPAREN, ")"),
+        Token(tt.DEDENT),
+        Token(tt.EOF),
     ]
 
     text = """def foo(a, b, c):
@@ -299,3 +302,150 @@ def test_function_def():
     scanner = Scanner(text)
 
     assert scanner.scan_tokens() == expected
+
+
+PROGRAMS = [
+    "",
+    "  x = 1\n",
+    "if a >= 1.5:\n    b = 'two\nlines'\n\n    c\nd # trailing\nignored",
+    "def f(a, b):\n    while a != b:\n        a = a + 1\n    return a\nf(1, 5)\n",
+    "1.\n\t \r(x)!\n",
+]
+
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_regex_engine_matches_char_engine(code):
+
+    expected = Scanner(code).scan_tokens()
+
+    tokens = Scanner(code, engine="regex").scan_tokens()
+
+    assert tokens == expected
+    assert [token.offset for token in tokens] == [token.offset for token in expected]
+
+
+@pytest.mark.parametrize(
+    "code, exception",
+    [("x = _", UnexpectedCharacter), ("x = 'a\n\nb", UnterminatedString),
+     ("x = 'a\nb'\ny = _", UnexpectedCharacter), ("x = 1\n'a\n\nb", UnterminatedString),
+     ("if a:\n    b = 'c\nd'\n  e = 1\n", IndentationError)],
+)
+def test_regex_engine_errors(code, exception):
+
+    with pytest.raises(exception) as char_error:
+        Scanner(code).scan_tokens()
+
+    with pytest.raises(exception) as regex_error:
+        Scanner(code, engine="regex").scan_tokens()
+
+    assert str(regex_error.value) == str(char_error.value)
+
+
+@pytest.mark.parametrize("engine", Scanner.ENGINES)
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_iter_tokens(engine, code):
+
+    expected = Scanner(code).scan_tokens()
+
+    scanner = Scanner(code, engine=engine)
+
+    assert list(scanner.iter_tokens()) == expected
+    assert len(scanner.tokens) <= 1
+
+
+@pytest.mark.parametrize("code", PROGRAMS + ["é = 'ünïcode'\n"])
+def test_bytes(code):
+
+    expected = Scanner(code).scan_tokens()
+
+    tokens = Scanner(code.encode(), engine="regex").scan_tokens()
+
+    assert tokens == expected
+    assert all(isinstance(token, LazyToken) for token in tokens)
+
+
+@pytest.mark.parametrize("code", ["a… = 1\n", "x = …\n", "ab·c = 1\n", "a = b\n€ = 1\n"])
+def test_bytes_identifier_errors(code):
+
+    with pytest.raises(UnexpectedCharacter) as char_error:
+        Scanner(code).scan_tokens()
+
+    with pytest.raises(UnexpectedCharacter) as bytes_error:
+        Scanner(code.encode(), engine="regex").scan_tokens()
+
+    assert str(bytes_error.value) == str(char_error.value)
+
+
+@pytest.mark.parametrize("code", ["x = ²\n", "½ = 1\n", "a = 1\n¼b = a\n"])
+def test_numeric_identifier_start(tmp_path, code):
+
+    path = tmp_path / "numeric.apo"
+    path.write_text(code, encoding="utf-8")
+
+    with pytest.raises(UnexpectedCharacter) as char_error:
+        Scanner(code).scan_tokens()
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        sources = [code, code.encode(), mapped]
+        for source in sources:
+            with pytest.raises(UnexpectedCharacter) as error:
+                Scanner(source, engine="regex").scan_tokens()
+            assert str(error.value) == str(char_error.value)
+
+    assert Scanner("a² = 1\n", engine="regex").scan_tokens() == Scanner("a² = 1\n").scan_tokens()
+
+
+def test_bytes_char_engine():
+
+    with pytest.raises(ValueError):
+        Scanner(b"1 + 1", engine="char")
+
+
+def test_lazy_token():
+
+    token = LazyToken(tt.STRING, b'x = "hello"', 4, 11)
+
+    assert "lexeme" not in token.__dict__
+    assert token.literal == "hello"
+    assert token.lexeme == '"hello"'
+    assert token == Token(tt.STRING, '"hello"', "hello")
+
+
+@pytest.mark.parametrize("engine", Scanner.ENGINES)
+@pytest.mark.parametrize("code", ["total = total + 1", b"total = total + 1"])
+def test_identifiers_interned(code, engine):
+    if engine == "char" and isinstance(code, bytes):
+        pytest.skip("the char engine only scans str")
+
+    tokens = Scanner(code, engine=engine).scan_tokens()
+
+    assert tokens[0].lexeme is tokens[2].lexeme is sys.intern("".join(["to", "tal"]))
+
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_scan_buffer(code):
+
+    expected = Scanner(code).scan_tokens()
+
+    buffer = Scanner(code).scan_buffer()
+
+    assert len(buffer) == len(expected)
+    assert list(buffer) == expected
+    assert buffer[-1] == expected[-1]
+    assert buffer.nbytes == 9 * len(buffer)
+
+
+@pytest.mark.parametrize("code", PROGRAMS + ["if a:\n  b\n  if c:\n    d\n" * 20])
+def test_scan_parallel(code):
+
+    expected = Scanner(code).scan_tokens()
+
+    assert list(Scanner(code).scan_parallel(workers=2, chunk_size=1)) == expected
+    assert list(Scanner(code.encode()).scan_parallel(workers=2, chunk_size=1)) == expected
+
+
+def test_split_lines():
+
+    code = "a\n'b\nc'\nd # e\nf\ng\n"
+
+    assert split_lines(code, len(code)) == [0, 2, 8]
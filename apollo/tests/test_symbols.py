@@ -0,0 +1,118 @@
+import os
+
+from symbols import INDEX_NAME, Symbol, SymbolIndex, collect
+
+SOURCE = """def outer(a, b):
+    def inner(c):
+        return c
+    total = inner(a) + b
+    return total
+x = outer(1, 2)
+print(outer(x, = 3)
+y = x
+"""
+
+
+def test_collect():
+
+    assert collect(SOURCE) == [
+        (0, "outer", 1, 5, None),
+        (1, "a", 1, 11, "outer"),
+        (1, "b", 1, 14, "outer"),
+        (0, "inner", 2, 9, "outer"),
+        (1, "c", 2, 15, "outer.inner"),
+        (2, "total", 4, 5, "outer"),
+        (3, "inner", 4, 13, "outer"),
+        (2, "x", 6, 1, None),
+        (3, "outer", 6, 5, None),
+        # the syntax error on line 7 is skipped
+        (2, "y", 8, 1, None),
+    ]
+
+
+def test_unscannable_scripts(tmp_path):
+
+    (tmp_path / "a.apo").write_text("if a:\n    b = 1\n  c = 2\n")
+    (tmp_path / "b.apo").write_bytes(b"d = '\xff'\n")
+    (tmp_path / "c.apo").write_text("def f():\n    return 1\n")
+    index = SymbolIndex(str(tmp_path))
+
+    assert index.update() == 3
+    assert [source.symbols for source in index.sources.values()][:2] == [[], []]
+    assert index.lookup("b") == index.lookup("d") == []
+    assert index.definitions("f") == [Symbol("function", "f", str(tmp_path / "c.apo"), 1, 5, None)]
+
+
+def test_lookup(tmp_path):
+
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.apo").write_text(SOURCE)
+    (tmp_path / "b.apo").write_text("outer(2, 3)\n")
+
+    assert SymbolIndex(str(tmp_path)).update() == 2
+    index = SymbolIndex(str(tmp_path))
+
+    assert len(index) == 11
+    assert index.lookup("outer") == [
+        Symbol("call", "outer", str(tmp_path / "b.apo"), 1, 1, None),
+        Symbol("function", "outer", str(tmp_path / "sub" / "a.apo"), 1, 5, None),
+        Symbol("call", "outer", str(tmp_path / "sub" / "a.apo"), 6, 5, None),
+    ]
+    assert [symbol.line for symbol in index.calls("outer")] == [1, 6]
+    assert index.definitions("inner") == [
+        Symbol("function", "inner", str(tmp_path / "sub" / "a.apo"), 2, 9, "outer")]
+    assert index.lookup("c", "parameter")[0].scope == "outer.inner"
+    assert index.lookup("missing") == []
+    assert index.lookup("outer.inner") == []
+
+
+def test_update(tmp_path):
+
+    a, b = tmp_path / "a.apo", tmp_path / "b.apo"
+    a.write_text("def f(n):\n    return n\n")
+    b.write_text("f(1)\n")
+    index = SymbolIndex(str(tmp_path))
+    assert index.update() == 2
+    assert index.update() == 0
+
+    # touched but unchanged files are not parsed again
+    os.utime(a, ns=(0, 0))
+    assert index.update() == 0
+    assert index.sources["a.apo"].mtime == 0
+
+    b.write_text("f(2)\ng = f\n")
+    os.remove(a)
+    assert index.update() == 1
+
+    index = SymbolIndex(str(tmp_path))
+    assert index.files == ["b.apo"]
+    assert index.lookup("f") == [Symbol("call", "f", str(b), 1, 1, None)]
+    assert index.lookup("g")[0].kind == "assignment"
+
+
+def test_hash_validation(tmp_path):
+
+    script = tmp_path / "a.apo"
+    script.write_text("x = 1\n")
+    SymbolIndex(str(tmp_path)).update()
+
+    # same size and mtime, different content
+    stat = os.stat(script)
+    script.write_text("y = 1\n")
+    os.utime(script, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert SymbolIndex(str(tmp_path)).update() == 0
+    index = SymbolIndex(str(tmp_path), validation="hash")
+    assert index.update() == 1
+    assert index.lookup("y")[0].kind == "assignment" and index.lookup("x") == []
+
+
+def test_unreadable_index(tmp_path):
+
+    (tmp_path / "a.apo").write_text("x = 1\n")
+    (tmp_path / INDEX_NAME).write_bytes(b"APSX\x01garbage")
+
+    index = SymbolIndex(str(tmp_path))
+    assert len(index) == 0
+    assert index.update() == 1
+    assert len(SymbolIndex(str(tmp_path))) == 1
@@ -0,0 +1,140 @@
+import importlib
+import sys
+
+import pytest
+from exc import NameNotFoundException, ReturnException, RuntimeException
+from interpreter import Interpreter
+from tests import parse
+from tok import TokenType as tt
+from transpiler import PythonInterpreter, build
+
+PROGRAM = (
+    "def add(a, b):\n"
+    "    total = a + b\n"
+    "    return total\n"
+    "def none():\n"
+    "    x = 1\n"
+    "x = add(1, 2)\n"
+    "y = none()\n"
+    "z = len('abc')\n"
+    "i = 0\n"
+    "while i < 3:\n"
+    "    i = i + 1\n"
+    "else:\n"
+    "    i = -i if i > 2 else i\n"
+    "x, y, z, i\n"
+)
+
+
+
+def test_same_results():
+    statements = parse(PROGRAM)
+
+    assert PythonInterpreter().interpret(statements) == Interpreter().interpret(statements)
+
+
+def test_too_many_arguments():
+    code = "def f(a):\n    return a\nx = 1 + f(1, 2)\n"
+
+    with pytest.raises(RuntimeException, match=r"f\(\) takes 1 argument but 2 were given") as e:
+        PythonInterpreter().interpret(parse(code))
+
+    assert e.value.token.type == tt.RPAREN and e.value.token.offset == code.rindex(")")
+
+
+def test_unbound_local():
+    code = "x = 1\ndef f():\n    y = x\n    x = 2\nf()\n"
+
+    with pytest.raises(NameNotFoundException, match="name 'x' is not defined"):
+        PythonInterpreter().interpret(parse(code))
+
+
+def test_runtime_error_offset():
+    code = "def f(a):\n    return a * 2 - 'x'\nf(1)\n"
+
+    with pytest.raises(RuntimeException) as e:
+        PythonInterpreter().interpret(parse(code))
+
+    assert e.value.token.type == tt.MINUS
+    assert e.value.token.offset == code.index("-")
+
+
+def test_comparison_error_offset():
+    code = "x = 1\ny = x <= 'a'\n"
+
+    with pytest.raises(RuntimeException) as e:
+        PythonInterpreter().interpret(parse(code))
+
+    assert e.value.token.type == tt.LEQUAL and e.value.token.offset == code.index("<=")
+
+
+def test_builtin_error():
+
+    with pytest.raises(TypeError):
+        PythonInterpreter().interpret(parse("x = len(1) + 1\n"))
+
+
+def test_name_not_found():
+
+    with pytest.raises(NameNotFoundException, match="name 'missing' is not defined"):
+        PythonInterpreter().interpret(parse("def f():\n    return missing\nf()\n"))
+
+
+def test_toplevel_return():
+
+    with pytest.raises(ReturnException) as e:
+        PythonInterpreter().interpret(parse("return 2\n"))
+
+    assert e.value.value == 2
+
+
+def test_build(tmp_path, monkeypatch, capsys):
+    (tmp_path / "built.py").write_text(build(parse(PROGRAM + "print(x)\n"), "built.apo"))
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    module = importlib.import_module("built")
+    del sys.modules["built"]
+
+    assert capsys.readouterr().out == "3\n"
+    assert (module.x, module.y, module.z, module.i) == (3, None, None, -3)
+    assert module.__doc__ == "Built from built.apo by apollo build"
+
+
+def test_build_python_keywords(tmp_path, monkeypatch):
+    code = ("lambda = 1\n"
+            "lambda_ = 2\n"
+            "def pass(is, yield):\n"
+            "    global = is + yield\n"
+            "    return global\n"
+            "x = pass(lambda, lambda_)\n")
+    (tmp_path / "keywords.py").write_text(build(parse(code)))
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    module = importlib.import_module("keywords")
+    del sys.modules["keywords"]
+
+    assert (module.lambda_, module.lambda__, module.x) == (1, 2, 3)
+    assert PythonInterpreter().interpret(parse(code + "x\n"))[-1] == 3
+
+
+def test_python_keyword_not_defined():
+
+    with pytest.raises(NameNotFoundException, match="name 'try' is not defined"):
+        PythonInterpreter().interpret(parse("try\n"))
+
+
+def test_errors_of_separate_sources():
+    interpreter = PythonInterpreter()
+    interpreter.interpret(parse("def f(a):\n    return a + 1\n"))
+    interpreter.interpret(parse("def g(b):\n    return b < 1\n"))
+
+    with pytest.raises(RuntimeException) as e:
+        interpreter.interpret(parse("f('s')\n"))
+
+    assert e.value.token.type == tt.PLUS and e.value.token.offset == 23
+    with pytest.raises(RuntimeException) as e:
+        interpreter.interpret(parse("g('s')\n"))
+    assert e.value.token.type == tt.LESSER and e.value.token.offset == 23
+    with pytest.raises(RuntimeException) as e:
+        interpreter.interpret(parse("x = 1\nf(1, 2)\n"))
+    assert e.value.token.offset == 12
@@ -0,0 +1,121 @@
+import pytest
+from bytecode import (ADD, CALL, JUMP, LOAD_CONST, LOAD_LOCAL, LOAD_NAME, LOAD_OUTER,
+                      POP_JUMP_IF_FALSE, RETURN, STORE_LOCAL, STORE_NAME, Prototype,
+                      compile_statement, disassemble)
+from exc import ReturnException, RuntimeException
+from interpreter import Interpreter
+from parser import Parser
+from scanner import Scanner
+from tests import parse
+from tok import TokenType as tt
+from vm import VM
+
+
+
+def test_compile_while():
+
+    code = compile_statement(parse("while x:\n    x = f(x, 1)\n")[0])
+
+    assert code.instructions == [
+        LOAD_NAME, 0,
+        POP_JUMP_IF_FALSE, 16,
+        LOAD_NAME, 1,
+        LOAD_NAME, 0,
+        LOAD_CONST, 0,
+        CALL, 2,
+        STORE_NAME, 0,
+        JUMP, 0,
+        LOAD_CONST, 1,
+        RETURN, 0,
+    ]
+    assert code.names == ["x", "f"] and code.constants == [1, None]
+    assert disassemble(code).splitlines()[4] == "   8 LOAD_CONST           0 (1)"
+
+
+def test_compile_locals():
+    outer = parse("def f(a):\n    b = a\n    def g():\n        return b + x\n")[0]
+
+    code = Prototype(outer).code
+    assert code.locals == ["a", "b", "g"]
+    assert code.instructions[:4] == [LOAD_LOCAL, 0, STORE_LOCAL, 1]
+
+    inner = Prototype(outer.block.statements[1]).code
+    assert inner.instructions[:6] == [LOAD_OUTER, 0, LOAD_NAME, 0, ADD, 0]
+    assert inner.outers == [(1, 1, "b")] and inner.names == ["x"]
+    assert disassemble(inner).splitlines()[0] == "   0 LOAD_OUTER           0 (b)"
+
+
+def test_constants_by_type():
+
+    code = compile_statement(parse("1, 1.0, True, 1\n")[0])
+
+    assert code.constants == [1, 1.0, True]
+
+
+def test_same_results():
+    code = (
+        "def fib(n):\n"
+        "    if n < 2:\n"
+        "        return n\n"
+        "    return fib(n - 1) + fib(n - 2)\n"
+        "x = fib(10)\n"
+        "y = x if x > 3 else -x\n"
+        "i = 0\n"
+        "while i < 3:\n"
+        "    i = i + 1\n"
+        "else:\n"
+        "    i = i * 10\n"
+        "x, y, i, len('abc')\n"
+        "0 and 1\n"
+        "0 or 5\n"
+    )
+    statements = parse(code)
+
+    assert VM().interpret(statements) == Interpreter().interpret(statements)
+
+
+def test_deep_recursion():
+    code = "def down(n):\n    if n > 0:\n        return down(n - 1)\n    return 'done'\nx = down(5000)\n"
+    vm = VM()
+
+    vm.interpret(parse(code))
+
+    assert vm.globals["x"] == "done"
+
+
+def test_runtime_error_offset():
+    code = "def f(a):\n    return a * 2 - 'x'\nf(1)\n"
+    vm = VM()
+
+    with pytest.raises(RuntimeException) as e:
+        vm.interpret(parse(code))
+
+    assert e.value.token.type == tt.MINUS
+    assert e.value.token.offset == code.index("-")
+
+
+def test_builtin_error():
+
+    with pytest.raises(TypeError):
+        VM().interpret(parse("len(1)\n"))
+
+
+def test_toplevel_return():
+
+    with pytest.raises(ReturnException) as e:
+        VM().interpret(parse("return 1 + 1\n"))
+
+    assert e.value.value == 2
+
+
+def test_lazy_body_compiled_once():
+    statements = Parser(Scanner("def f(a):\n    return a\nf(1)\nf(2)\n").scan_tokens(),
+                        lazy=True).parse()
+    vm = VM()
+
+    vm.interpret(statements[:1])
+    function = vm.globals["f"]
+    assert "statements" not in statements[0].block.__dict__
+
+    vm.interpret(statements[1:])
+    assert function.prototype._code is not None and "a" not in vm.globals
@@ -1,3 +1,5 @@
-
-from .tok import Token
-from .type import TokenType
+from .buffer import TokenBuffer
+from .lines import LineTable
+from .stream import TokenStream
+from .tok import LazyToken, Token
+from .type import TokenType, bitset
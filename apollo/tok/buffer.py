@@ -0,0 +1,66 @@
+from array import array
+from collections.abc import Sequence
+from typing import Iterable
+
+from .tok import LazyToken
+from .type import TokenType
+
+TYPES = {int(type): type for type in TokenType}
+
+
+class TokenBuffer(Sequence):
+    """
+    A compact list of tokens stored column-wise in arrays: one byte for the
+    type, and the start and end offsets of each token. Lines are not stored,
+    they are looked up in a LineTable of the source when a position is
+    needed, e.g. to report an error.
+
+    Indexing returns a LazyToken view that decodes its lexeme and literal from
+    the source only when they are read. The last few views are cached since
+    the Parser keeps looking at the same handful of tokens.
+    """
+
+    def __init__(self, source, types: array = None, starts: array = None,
+                 ends: array = None) -> None:
+        offset = "I" if len(source) < 2**32 else "Q"
+        self.source = source
+        self.types = array("B") if types is None else types
+        self.starts = array(offset) if starts is None else starts
+        self.ends = array(offset) if ends is None else ends
+        self.views: dict[int, LazyToken] = {}
+
+    def extend(self, tokens: Iterable[tuple[TokenType, int, int]]) -> None:
+        """Appends (type, start, end) tuples, as yielded by tokenize"""
+        types, starts, ends = self.types.append, self.starts.append, self.ends.append
+
+        for type, start, end in tokens:
+            types(type)
+            starts(start)
+            ends(end)
+
+    def extend_columns(self, types: array, starts: array, ends: array) -> None:
+        """Appends tokens that are already stored column-wise"""
+        self.types.extend(types)
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __getitem__(self, index: int) -> LazyToken:
+        view = self.views.get(index)
+        if view is None:
+            if index < 0:
+                index += len(self.types)
+            view = LazyToken(
+                TYPES[self.types[index]], self.source, self.starts[index], self.ends[index])
+            if len(self.views) >= 8:
+                self.views.clear()
+            self.views[index] = view
+        return view
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the columns, not counting the source"""
+        return sum(column.itemsize * len(column)
+                   for column in (self.types, self.starts, self.ends))
@@ -0,0 +1,76 @@
+from array import array
+from bisect import bisect_right
+
+# Number of lines between two absolute offsets in a LineTable
+BLOCK = 64
+
+
+class LineTable:
+    """
+    Turns offsets in a source into lines and columns.
+
+    The table is built the first time it is asked for a position, so that
+    scanning does not pay for it. It stores the length of every line in the
+    smallest array type that fits, and the absolute start offset of every
+    BLOCK-th line. A lookup is a binary search among the block starts followed
+    by a walk of at most BLOCK line lengths.
+    """
+
+    def __init__(self, source) -> None:
+        self.source = source
+        self.lengths: array | None = None
+        self.blocks: array | None = None
+
+    def build(self) -> None:
+        source = self.source
+        eol = "\n" if isinstance(source, str) else b"\n"
+
+        starts = [0]
+        start = source.find(eol)
+        while start >= 0:
+            starts.append(start + 1)
+            start = source.find(eol, start + 1)
+
+        lengths = [end - start for start, end in zip(starts, starts[1:])]
+        longest = max(lengths, default=0)
+        typecode = "B" if longest < 2**8 else "H" if longest < 2**16 else "I" if longest < 2**32 else "Q"
+
+        self.lengths = array(typecode, lengths)
+        self.blocks = array("I" if len(source) < 2**32 else "Q", starts[::BLOCK])
+
+    def line(self, offset: int) -> int:
+        """Returns the line of offset, starting from 1"""
+        return self.locate(offset)[0] + 1
+
+    def position(self, offset: int) -> tuple[int, int]:
+        """Returns the line and column of offset, both starting from 1"""
+        index, start = self.locate(offset)
+        before = self.source[start:offset]
+        if not isinstance(before, str):
+            # columns count characters, not bytes
+            before = before.decode(errors="replace")
+        return index + 1, len(before) + 1
+
+    def locate(self, offset: int) -> tuple[int, int]:
+        """Returns the index and the start offset of the line of offset"""
+        if self.lengths is None:
+            self.build()
+
+        block = bisect_right(self.blocks, offset) - 1
+        index, start = block * BLOCK, self.blocks[block]
+        lengths = self.lengths
+
+        # the line after the last newline has no length, and ends the walk
+        end = min(index + BLOCK, len(lengths))
+        while index < end and start + lengths[index] <= offset:
+            start += lengths[index]
+            index += 1
+
+        return index, start
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the table, not counting the source"""
+        if self.lengths is None:
+            return 0
+        return self.lengths.itemsize * len(self.lengths) + self.blocks.itemsize * len(self.blocks)
@@ -0,0 +1,39 @@
+from collections import deque
+from typing import Iterable
+
+from .tok import Token
+
+
+class TokenStream:
+    """
+    A sliding window over an iterator of tokens that can be indexed like the
+    list it replaces.
+
+    Tokens are pulled from the iterator only when an index past the window is
+    requested, and only the last `size` tokens are kept, so memory stays flat
+    however long the source is. Indexing a token that has already left the
+    window raises IndexError.
+    """
+
+    def __init__(self, tokens: Iterable[Token], size: int = 4) -> None:
+        self.tokens = iter(tokens)
+        self.buffer: deque[Token] = deque(maxlen=size)
+        self.offset = 0  # index of buffer[0] in the whole stream
+
+    def __getitem__(self, index: int) -> Token:
+        buffer = self.buffer
+
+        while index >= self.offset + len(buffer):
+            try:
+                token = next(self.tokens)
+            except StopIteration:
+                raise IndexError("token stream is exhausted") from None
+
+            if len(buffer) == buffer.maxlen:
+                self.offset += 1
+            buffer.append(token)
+
+        if index < self.offset:
+            raise IndexError(f"token {index} is no longer buffered")
+
+        return buffer[index - self.offset]
@@ -1,12 +1,64 @@
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
+from functools import cached_property
 from typing import Any, Optional
 
 from .type import TokenType
 
 
-@dataclass
+@dataclass(slots=True)
 class Token:
     type: TokenType
-    line: int
     lexeme: Optional[str] = None
     literal: Optional[Any] = None
+    # where the token starts in the source, the only position a token has:
+    # lines and columns are looked up in a LineTable, and only for errors
+    offset: Optional[int] = field(default=None, compare=False)
+
+
+class LazyToken(Token):
+    """
+    A Token that only remembers where its lexeme is in the source, and slices
+    the lexeme and the literal out the first time they are read. The source is
+    a str or a UTF-8 bytes buffer, such as an mmap of the source file.
+    """
+
+    def __init__(self, type: TokenType, source, start: int, end: int) -> None:
+        self.type = type
+        self.source = source
+        self.start = start
+        self.end = end
+
+    @property
+    def offset(self) -> int:
+        return self.start
+
+    @cached_property
+    def lexeme(self) -> Optional[str]:
+        if self.type is TokenType.INDENT:
+            return " " * (self.end - self.start)
+        if self.start == self.end:
+            return None
+        if self.type is TokenType.IDENTIFIER:
+            return sys.intern(self.text(self.start, self.end))
+        return self.text(self.start, self.end)
+
+    @cached_property
+    def literal(self) -> Optional[Any]:
+        if self.type is TokenType.STRING:
+            # only the contents are copied out of the buffer
+            return self.text(self.start + 1, self.end - 1)
+        if self.type is TokenType.NUMBER:
+            text = self.source[self.start:self.end]
+            return int(text) if text.isdigit() else float(text)
+        return None
+
+    def text(self, start: int, end: int) -> str:
+        text = self.source[start:end]
+        return text if isinstance(text, str) else text.decode()
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Token):
+            return NotImplemented
+        return (self.type, self.lexeme, self.literal) == (
+            other.type, other.lexeme, other.literal)
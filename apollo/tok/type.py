@@ -1,7 +1,15 @@
-from enum import Enum, auto
+from enum import Enum, IntEnum, auto
 
 
-class TokenType(Enum):
+class TokenType(IntEnum):
+    """
+    Token types are small integers, so they compare and hash as ints, index
+    tables and can be tested against bitsets of types, see bitset().
+    """
+
+    # Enum formatting, so that messages read TokenType.NAME rather than a number
+    __str__ = Enum.__str__
+    __format__ = Enum.__format__
 
     NEWLINE = auto()
     INDENT = auto()
@@ -81,3 +89,13 @@ class TokenType(Enum):
     # Space and misc
     EOL = auto()
     EOF = auto()
+
+
+def bitset(*types: TokenType) -> int:
+    """
+    Returns a bitset of types, where `1 << type & bits` tells whether type is in it.
+    """
+    bits = 0
+    for type in types:
+        bits |= 1 << type
+    return bits
@@ -0,0 +1,320 @@
+import ast
+import keyword
+from typing import Any, Iterable
+
+from exc import NameNotFoundException, ReturnException, RuntimeException
+from expression import (Binary, Call, CommaExpression, Expression, Grouping, Literal, Logical,
+                        Ternary, Unary, Variable)
+from interpreter import LEXEMES, Backend
+from statement import (AssignmentStatement, Block, ExpressionStatement, FunctionDefinition,
+                       IfStmt, ReturnStmt, Statement, WhileStmt)
+from tok import Token
+from tok.type import TokenType as tt
+
+# File name of the code compiled from apollo, numbered by PythonInterpreter
+# to find the frames of each compiled unit in tracebacks
+FILENAME = "<apollo {}>"
+
+# Runs first in the namespace of the Python code, whether a module or the
+# globals of a PythonInterpreter. Every builtin is wrapped so that calling it
+# evaluates to None, as only calls to apollo functions have a value. Past this
+# point any builtin is wrapped, so the helpers only go through __builtins.
+PRELUDE = '''\
+import builtins as __builtins
+
+
+def __discard(function):
+    def call(*args):
+        function(*args)
+    return call
+
+
+class __ArityError(__builtins.Exception):
+    """A call to a function with a wrong number of arguments"""
+
+
+def __arity(name, expected, args):
+    given = __builtins.len(args)
+    raise __ArityError(
+        f"{name}() takes {expected} argument{'s' if expected != 1 else ''} "
+        f"but {given} {'were' if given != 1 else 'was'} given")
+
+
+class __Return(__builtins.Exception):
+    """A return statement outside of any function"""
+
+
+def __return(value):
+    # set out of the class, where __builtins would be mangled
+    error = __Return("Return value")
+    error.value = value
+    raise error
+
+
+__namespace = __builtins.globals()
+__namespace.update(
+    (name, __discard(value) if __builtins.callable(value) else value)
+    for name, value in __builtins.vars(__builtins).items()
+    if not name.startswith("__"))
+'''
+
+BINARY = {tt.PLUS: ast.Add, tt.MINUS: ast.Sub, tt.STAR: ast.Mult, tt.SLASH: ast.Div}
+COMPARE = {
+    tt.LESSER: ast.Lt, tt.LEQUAL: ast.LtE, tt.GREATER: ast.Gt, tt.GEQUAL: ast.GtE,
+    tt.EQUAL: ast.Eq, tt.NEQUAL: ast.NotEq,
+}
+UNARY = {tt.MINUS: ast.USub, tt.NOT: ast.Not}
+
+# The line of nodes that are not located, see Transpiler.locate
+UNLOCATED = (None, None)
+
+# Names that apollo allows but that Python cannot bind
+RESERVED = frozenset(keyword.kwlist) | {"__debug__"}
+
+
+def identifier(name: str) -> str:
+    """
+    The Python name of an apollo name. A reserved name gets a trailing
+    underscore, and so does a reserved name that already has some, so that
+    lambda_ does not clash with lambda.
+    """
+    return name + "_" if name.rstrip("_") in RESERVED else name
+
+
+def apollo_name(name: str) -> str:
+    """The apollo name of a Python name, the inverse of identifier"""
+    return name[:-1] if name.endswith("_") and name.rstrip("_") in RESERVED else name
+
+
+class Transpiler:
+    """
+    Lowers apollo statements to a Python AST, to be compiled by CPython.
+
+    Apollo scopes names like Python does: names of the top level are
+    globals, and the names a function assigns are its locals, which the
+    functions nested in it can read. Functions take their arguments as
+    *__args, so that a wrong number of them raises an error of apollo's.
+    Calls to builtins evaluate to None, see PRELUDE, and a return statement
+    outside of a function raises.
+
+    Names that are Python keywords, such as lambda or pass, are renamed by
+    identifier().
+
+    Every node with an apollo offset is put on a line of its own, and lines
+    records the operator, if any, and the offset of each line, which maps an
+    instruction back to its node through the line numbers of tracebacks.
+    Binary and comparison operators are recorded, so that a TypeError or
+    ZeroDivisionError of the Python code can be reported at the apollo
+    operator that raised it. take_lines() starts the lines of a new unit.
+    """
+
+    def __init__(self) -> None:
+        # operator type, or None, and apollo offset of line i + 1. Line 1 is
+        # left to the nodes without an offset of their own
+        self.lines: list[tuple[tt | None, int | None]] = [UNLOCATED]
+        self.function = 0  # depth of functions being lowered
+
+    def take_lines(self) -> list[tuple[tt | None, int | None]]:
+        """The lines of the code lowered so far, after which lines start over"""
+        lines, self.lines = self.lines, [UNLOCATED]
+        return lines
+
+    def module(self, statements: Iterable[Statement]) -> ast.Module:
+        module = ast.Module([self.statement(stmt) for stmt in statements], [])
+        return ast.fix_missing_locations(module)
+
+    def expression_code(self, expr: Expression) -> ast.Expression:
+        return ast.fix_missing_locations(ast.Expression(self.expression(expr)))
+
+    def locate(self, node: ast.AST, offset: int | None, operator: tt = None) -> ast.AST:
+        self.lines.append((operator, offset))
+        node.lineno = node.end_lineno = len(self.lines)
+        node.col_offset = node.end_col_offset = 0
+        return node
+
+    def operator(self, node: ast.AST, expr: Binary) -> ast.AST:
+        """Locates the node of an operator on a line of its own, recording the operator"""
+        return self.locate(node, expr.offset, expr.operator)
+
+    def statement(self, stmt: Statement) -> ast.stmt:
+
+        match stmt:
+            case ExpressionStatement(expr):
+                return ast.Expr(self.expression(expr))
+            case AssignmentStatement(name, expr):
+                node = ast.Assign([ast.Name(identifier(name), ast.Store())], self.expression(expr))
+                return self.locate(node, stmt.offset)
+            case IfStmt(condition, block, elif_stmt, else_block):
+                other = elif_stmt or else_block
+                return ast.If(self.expression(condition), self.block(block),
+                              self.block(other) if other else [])
+            case Block():
+                return ast.If(ast.Constant(True), self.block(stmt), [])
+            case WhileStmt(condition, block, else_block):
+                return ast.While(self.expression(condition), self.block(block),
+                                 self.block(else_block) if else_block else [])
+            case FunctionDefinition(name, params, block):
+                return self.locate(self.function_def(name, [p.name for p in params], block),
+                                   stmt.offset)
+            case ReturnStmt(value):
+                value = self.expression(value) if value else ast.Constant(None)
+                if self.function:
+                    return self.locate(ast.Return(value), stmt.offset)
+                call = ast.Call(ast.Name("__return", ast.Load()), [value], [])
+                return self.locate(ast.Expr(call), stmt.offset)
+
+        raise TypeError(f"cannot transpile {stmt!r}")
+
+    def block(self, block: Block) -> list[ast.stmt]:
+        # elif branches are if statements
+        if not isinstance(block, Block):
+            return [self.statement(block)]
+        return [self.statement(stmt) for stmt in block.statements] or [ast.Pass()]
+
+    def function_def(self, name: str, params: list[str], block: Block) -> ast.FunctionDef:
+        args = ast.Name("__args", ast.Load())
+        arity = ast.Expr(ast.Call(ast.Name("__arity", ast.Load()),
+                                  [ast.Constant(name), ast.Constant(len(params)), args], []))
+        if params:
+            # unpacking fails for any other number of arguments than parameters
+            targets = ast.Tuple([ast.Name(identifier(param), ast.Store()) for param in params], ast.Store())
+            error = ast.Attribute(ast.Name("__builtins", ast.Load()), "ValueError", ast.Load())
+            binding = ast.Try([ast.Assign([targets], args)],
+                              [ast.ExceptHandler(error, None, [arity])], [], [])
+        else:
+            binding = ast.If(args, [arity], [])
+
+        self.function += 1
+        try:
+            body = self.block(block)
+        finally:
+            self.function -= 1
+
+        arguments = ast.arguments([], [], ast.arg("__args"), [], [], None, [])
+        return ast.FunctionDef(identifier(name), arguments, [binding] + body, [], None)
+
+    def expression(self, expr: Expression | CommaExpression) -> ast.expr:
+
+        match expr:
+            case Literal(value):
+                return ast.Constant(value)
+            case Variable(name):
+                return self.locate(ast.Name(identifier(name), ast.Load()), expr.offset)
+            case Binary(left, operator, right):
+                left, right = self.expression(left), self.expression(right)
+                if operator in BINARY:
+                    return self.operator(ast.BinOp(left, BINARY[operator](), right), expr)
+                if operator in COMPARE:
+                    return self.operator(ast.Compare(left, [COMPARE[operator]()], [right]), expr)
+                return self.last([left, right, ast.Constant(None)])
+            case Logical(left, operator, right):
+                left, right = self.expression(left), self.expression(right)
+                if operator == tt.AND:
+                    return ast.BoolOp(ast.And(), [left, right])
+                if operator == tt.OR:
+                    return ast.BoolOp(ast.Or(), [left, right])
+                return self.last([left, right])
+            case Unary(operator, right):
+                right = self.expression(right)
+                if operator in UNARY:
+                    return self.locate(ast.UnaryOp(UNARY[operator](), right), expr.offset)
+                return self.last([right, ast.Constant(None)])
+            case Grouping(inner):
+                return self.expression(inner)
+            case Ternary(left, condition, right):
+                return self.locate(ast.IfExp(self.expression(condition), self.expression(left),
+                                             self.expression(right)), expr.offset)
+            case CommaExpression(expressions):
+                return ast.List([self.expression(e) for e in expressions], ast.Load())
+            case Call(callee, args):
+                if args is None:
+                    arguments = []
+                elif isinstance(args, CommaExpression):
+                    arguments = [self.expression(arg) for arg in args.expressions]
+                else:
+                    arguments = [self.expression(args)]
+                return self.locate(ast.Call(self.expression(callee), arguments, []), expr.offset)
+
+        raise TypeError(f"cannot transpile {expr!r}")
+
+    def last(self, values: list[ast.expr]) -> ast.expr:
+        """Evaluates values in order, to the last one"""
+        return ast.Subscript(ast.Tuple(values, ast.Load()), ast.Constant(-1), ast.Load())
+
+
+def build(statements: list[Statement], source: str = None) -> str:
+    """The source of a Python module that runs statements when imported"""
+    module = Transpiler().module(statements)
+    header = f'"""Built from {source} by apollo build"""\n' if source else ""
+    return f"{header}{PRELUDE}\n\n{ast.unparse(module)}\n"
+
+
+class PythonInterpreter(Backend):
+    """
+    Runs statements by lowering them to Python code, compiled and run by
+    CPython, as an alternative to Interpreter with the same behavior and
+    interface.
+
+    Each top-level statement is compiled on its own, as a unit with a file
+    name of its own, and functions are compiled with the statement that
+    defines them, lazy bodies included. units holds the lines of every unit
+    by file name, see Transpiler, as a function may be called long after
+    the unit that defined it.
+    """
+
+    def __init__(self) -> None:
+        # CPython only looks names up quickly in globals that are a dict, and
+        # not a subclass such as an Environment. The builtins are added by
+        # PRELUDE, which also defines its helpers there.
+        self.globals = {}
+        self.env = self.globals
+        self.transpiler = Transpiler()
+        self.units: dict[str, list[tuple[tt | None, int | None]]] = {}
+        exec(compile(PRELUDE, "<apollo prelude>", "exec"), self.globals)
+
+    def execute(self, stmt: Statement):
+        if isinstance(stmt, ExpressionStatement):
+            return self.evaluate(stmt.expr)
+
+        module = ast.fix_missing_locations(ast.Module([self.transpiler.statement(stmt)], []))
+        self.run(self.compile(module, "exec"))
+
+    def evaluate(self, expr: Expression) -> Any:
+        return self.run(self.compile(self.transpiler.expression_code(expr), "eval"))
+
+    def compile(self, tree: ast.AST, mode: str):
+        """Compiles the code lowered last as a new unit"""
+        filename = FILENAME.format(len(self.units))
+        self.units[filename] = self.transpiler.take_lines()
+        return compile(tree, filename, mode)
+
+    def run(self, code) -> Any:
+        try:
+            return eval(code, self.globals)
+        except NameError as e:
+            # locals read before they are assigned have no name
+            name = e.name if e.name is not None else str(e).split("'")[1]
+            raise NameNotFoundException(f"name '{apollo_name(name)}' is not defined") from None
+        except self.globals["__Return"] as e:
+            raise ReturnException("Return value", None, e.value) from None
+        except self.globals["__ArityError"] as e:
+            # raised in the function called, by the call of the frame out of it
+            lines = self.lines(e.__traceback__)
+            offset = lines[-2][1] if len(lines) > 1 else None
+            raise RuntimeException(str(e), Token(tt.RPAREN, ")", None, offset)) from None
+        except (TypeError, ZeroDivisionError) as e:
+            lines = self.lines(e.__traceback__)
+            operator, offset = lines[-1] if lines else (None, None)
+            if operator is None:
+                raise
+            raise RuntimeException(str(e), Token(operator, LEXEMES[operator], None, offset))
+
+    def lines(self, traceback) -> list[tuple[tt | None, int | None]]:
+        """The line, as recorded by Transpiler, of every apollo frame of traceback, innermost last"""
+        lines = []
+        while traceback is not None:
+            unit = self.units.get(traceback.tb_frame.f_code.co_filename)
+            if unit is not None:
+                lines.append(unit[traceback.tb_lineno - 1])
+            traceback = traceback.tb_next
+        return lines
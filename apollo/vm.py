@@ -0,0 +1,198 @@
+from typing import Any
+
+from bytecode import (ADD, BUILD_LIST, CALL, DIVIDE, EQUAL, GREATER, GREATER_EQUAL, JUMP,
+                      JUMP_IF_FALSE_OR_POP, JUMP_IF_TRUE_OR_POP, LESS, LESS_EQUAL, LOAD_CONST,
+                      LOAD_LOCAL, LOAD_NAME, LOAD_OUTER, MAKE_FUNCTION, MULTIPLY, NEGATIVE, NOT,
+                      NOT_EQUAL, POP_JUMP_IF_FALSE, POP_TOP, RAISE_RETURN, RETURN, STORE_LOCAL,
+                      STORE_NAME, SUBTRACT, Code, Prototype, compile_expression,
+                      compile_statement)
+from environment import UNSET, Frame, global_env
+from exc import NameNotFoundException, ReturnException, RuntimeException
+from expression import Expression
+from interpreter import LEXEMES, Backend
+from resolver import arity_error
+from statement import ExpressionStatement, Statement
+from tok import Token
+
+MISSING = object()
+
+
+class Function:
+    """An apollo function made by MAKE_FUNCTION, and the frame it was defined in"""
+
+    __slots__ = ("prototype", "closure")
+
+    def __init__(self, prototype: Prototype, closure: Frame | None) -> None:
+        self.prototype = prototype
+        self.closure = closure
+
+    def __repr__(self) -> str:
+        return f"<function {self.prototype.definition.name}>"
+
+
+class VM(Backend):
+    """
+    Runs statements compiled to bytecode, as an alternative to Interpreter
+    with the same behavior and interface.
+
+    Every top-level statement is compiled on its own, so that statements can
+    still run as they are parsed, and function bodies are compiled the first
+    time they are called. Calls between apollo functions do not recurse in
+    Python: the caller's code, position and Frame are pushed on a list of
+    frames, and all frames share a single value stack.
+
+    Like in the tree walker, locals are read and written by their slot in
+    the Frame of the call, globals by name, and only calls to apollo
+    functions evaluate to a value.
+    """
+
+    def __init__(self) -> None:
+        self.globals = global_env()
+        # the names of the top level are the globals
+        self.env = self.globals
+
+    def execute(self, statement: Statement):
+        result = self.run(compile_statement(statement))
+        return result if isinstance(statement, ExpressionStatement) else None
+
+    def evaluate(self, expr: Expression) -> Any:
+        return self.run(compile_expression(expr))
+
+    def run(self, code: Code) -> Any:
+        names = self.globals
+        get, builtin = names.get, names.enclosing.get
+        frame, slots = None, None
+        frames = []
+        stack = []
+        push, pop = stack.append, stack.pop
+        instructions, constants, symbols = code.instructions, code.constants, code.names
+        pc = 0
+
+        try:
+            while True:
+                op = instructions[pc]
+                arg = instructions[pc + 1]
+                pc += 2
+
+                if op == LOAD_LOCAL:
+                    value = slots[arg]
+                    if value is UNSET:
+                        raise NameNotFoundException(f"name '{code.locals[arg]}' is not defined")
+                    push(value)
+                elif op == LOAD_CONST:
+                    push(constants[arg])
+                elif op == STORE_LOCAL:
+                    slots[arg] = pop()
+                elif op == LOAD_NAME:
+                    value = get(symbols[arg], MISSING)
+                    if value is MISSING:
+                        value = builtin(symbols[arg], MISSING)
+                        if value is MISSING:
+                            raise NameNotFoundException(f"name '{symbols[arg]}' is not defined")
+                    push(value)
+                elif op == STORE_NAME:
+                    names[symbols[arg]] = pop()
+                elif op == POP_JUMP_IF_FALSE:
+                    if not pop():
+                        pc = arg
+                elif op == JUMP:
+                    pc = arg
+                elif op == ADD:
+                    right = pop()
+                    stack[-1] = stack[-1] + right
+                elif op == SUBTRACT:
+                    right = pop()
+                    stack[-1] = stack[-1] - right
+                elif op == LESS:
+                    right = pop()
+                    stack[-1] = stack[-1] < right
+                elif op == MULTIPLY:
+                    right = pop()
+                    stack[-1] = stack[-1] * right
+                elif op == CALL:
+                    callee = stack[-arg - 1]
+                    args = stack[len(stack) - arg:]
+                    del stack[-arg - 1:]
+                    if type(callee) is Function:
+                        prototype = callee.prototype
+                        if len(args) != len(prototype.definition.params):
+                            raise arity_error(prototype.definition, len(args), code.calls[pc - 2])
+                        frames.append((code, pc, frame))
+                        code = prototype.code
+                        slots = [UNSET] * len(code.locals)
+                        slots[:len(args)] = args
+                        frame = Frame(slots, callee.closure, names)
+                        instructions, constants, symbols = (code.instructions, code.constants,
+                                                             code.names)
+                        pc = 0
+                    else:
+                        callee(*args)
+                        push(None)
+                elif op == RETURN:
+                    if not frames:
+                        return pop()
+                    code, pc, frame = frames.pop()
+                    slots = frame.slots if frame is not None else None
+                    instructions, constants, symbols = (code.instructions, code.constants,
+                                                         code.names)
+                elif op == POP_TOP:
+                    pop()
+                elif op == DIVIDE:
+                    right = pop()
+                    stack[-1] = stack[-1] / right
+                elif op == LESS_EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] <= right
+                elif op == GREATER:
+                    right = pop()
+                    stack[-1] = stack[-1] > right
+                elif op == GREATER_EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] >= right
+                elif op == EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] == right
+                elif op == NOT_EQUAL:
+                    right = pop()
+                    stack[-1] = stack[-1] != right
+                elif op == JUMP_IF_FALSE_OR_POP:
+                    if not stack[-1]:
+                        pc = arg
+                    else:
+                        pop()
+                elif op == JUMP_IF_TRUE_OR_POP:
+                    if stack[-1]:
+                        pc = arg
+                    else:
+                        pop()
+                elif op == NEGATIVE:
+                    stack[-1] = -stack[-1]
+                elif op == NOT:
+                    stack[-1] = not stack[-1]
+                elif op == BUILD_LIST:
+                    values = stack[len(stack) - arg:]
+                    del stack[len(stack) - arg:]
+                    push(values)
+                elif op == LOAD_OUTER:
+                    depth, slot, name = code.outers[arg]
+                    outer = frame
+                    for _ in range(depth):
+                        outer = outer.enclosing
+                    value = outer.slots[slot]
+                    if value is UNSET:
+                        raise NameNotFoundException(f"name '{name}' is not defined")
+                    push(value)
+                elif op == MAKE_FUNCTION:
+                    push(Function(constants[arg], frame))
+                elif op == RAISE_RETURN:
+                    raise ReturnException("Return value", None, pop())
+                else:
+                    raise ValueError(f"unknown opcode {op}")
+
+        except (TypeError, ZeroDivisionError) as e:
+            # only errors of binary operators are reported at their operator
+            operator = code.operators.get(pc - 2)
+            if operator is None:
+                raise
+            operator, offset = operator
+            raise RuntimeException(str(e), Token(operator, LEXEMES[operator], None, offset))